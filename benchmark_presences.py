@@ -0,0 +1,53 @@
+import os
+
+# Base SQLite en mémoire : le script ne touche jamais la vraie base
+os.environ['DATABASE_URL'] = 'sqlite://'
+
+import time
+from datetime import date, timedelta
+from sqlalchemy import event
+from mon_atelier import app, db
+from mon_atelier.routes import Employe
+
+# Mesure du coût d'une réservation de présence/congé selon la longueur de la période :
+# le nombre de requêtes SQL doit rester le même d'une semaine à une année.
+
+DUREES = [7, 31, 365]
+REPETITIONS = 5
+
+def reserver(client_http, employe_id, type_, debut, nb_jours):
+    """Envoie une réservation et renvoie (nombre de requêtes SQL, durée en ms)"""
+    requetes = []
+    def enregistrer(conn, cursor, statement, parameters, context, executemany):
+        requetes.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', enregistrer)
+    debut_chrono = time.perf_counter()
+    try:
+        reponse = client_http.post('/ajouter_presence_conge', data={
+            'employe_id': employe_id,
+            'type': type_,
+            'date_debut': debut.isoformat(),
+            'date_fin': (debut + timedelta(days=nb_jours - 1)).isoformat(),
+            'motif': 'Vacances',
+        })
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', enregistrer)
+    duree = (time.perf_counter() - debut_chrono) * 1000
+    assert reponse.get_json()['success'], reponse.get_json()
+    return len(requetes), duree
+
+if __name__ == '__main__':
+    with app.app_context():
+        db.create_all()
+        employe = Employe(nom="Benchmark", role="Couturière")
+        db.session.add(employe)
+        db.session.commit()
+        client_http = app.test_client()
+        debut = date(date.today().year, 1, 1)
+        print(f"{'type':<10}{'jours':>8}{'requêtes SQL':>15}{'ms (moyenne)':>15}")
+        for type_ in ('presence', 'conge'):
+            for nb_jours in DUREES:
+                mesures = [reserver(client_http, employe.id, type_, debut, nb_jours) for _ in range(REPETITIONS)]
+                nb_requetes = max(m[0] for m in mesures)
+                moyenne = sum(m[1] for m in mesures) / len(mesures)
+                print(f"{type_:<10}{nb_jours:>8}{nb_requetes:>15}{moyenne:>15.1f}")
@@ -0,0 +1,49 @@
+import os
+
+# Base SQLite en mémoire : le script ne touche jamais la vraie base
+os.environ['DATABASE_URL'] = 'sqlite://'
+
+import time
+from sqlalchemy import event
+from mon_atelier import app, db
+from mon_atelier.routes import Categorie, SousCategorie, DetailRetouche, charger_catalogue, reviser_prix
+
+# Mesure d'une révision de prix groupée selon la taille du catalogue :
+# une requête UPDATE par catégorie, quel que soit le nombre de prestations.
+
+CATEGORIES = 20
+TAILLES = [1000, 5000, 20000]
+
+def remplir_catalogue(nb_prestations):
+    """Catalogue de CATEGORIES catégories, chacune avec une sous-catégorie, prestations réparties"""
+    db.drop_all()
+    db.create_all()
+    categories = [Categorie(nom=f"Catégorie {i}") for i in range(CATEGORIES)]
+    sous_categories = [SousCategorie(nom='Toutes', categorie=c) for c in categories]
+    db.session.add_all(sous_categories)
+    db.session.flush()
+    db.session.execute(db.insert(DetailRetouche), [
+        {'nom': f"Prestation {n}", 'prix': 5 + n % 50, 'sous_categorie_id': sous_categories[n % CATEGORIES].id}
+        for n in range(nb_prestations)
+    ])
+    db.session.commit()
+    return [c.id for c in categories]
+
+if __name__ == '__main__':
+    with app.app_context():
+        print(f"{'prestations':>12}{'requêtes SQL':>15}{'ms':>10}")
+        for nb_prestations in TAILLES:
+            categorie_ids = remplir_catalogue(nb_prestations)
+            requetes = []
+            def enregistrer(conn, cursor, statement, parameters, context, executemany):
+                requetes.append(statement)
+            event.listen(db.engine, 'before_cursor_execute', enregistrer)
+            debut = time.perf_counter()
+            try:
+                reviser_prix(f"benchmark-{nb_prestations}", {c: 1.03 for c in categorie_ids})
+                db.session.commit()
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', enregistrer)
+            duree = (time.perf_counter() - debut) * 1000
+            assert charger_catalogue()['details'], "catalogue vide après la révision"
+            print(f"{nb_prestations:>12}{len(requetes):>15}{duree:>10.1f}")
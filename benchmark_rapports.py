@@ -0,0 +1,79 @@
+import os
+
+# Base SQLite en mémoire : le script ne touche jamais la vraie base
+os.environ['DATABASE_URL'] = 'sqlite://'
+
+import random
+import time
+from datetime import date, datetime, timedelta
+from mon_atelier import app, db
+from mon_atelier.routes import (Categorie, SousCategorie, DetailRetouche, Client, Ticket, Retouche,
+                                RapportPeriode, synchroniser_totaux_tickets)
+
+# Mesure du tableau de bord /api/rapports sur plusieurs années d'activité :
+# premier affichage (toutes les périodes calculées en GROUP BY), puis affichages suivants
+# (périodes closes relues dans RapportPeriode, seule la période en cours est recalculée).
+
+ANNEES = 3
+TICKETS_PAR_JOUR = 40
+OBJECTIF_MS = 200
+
+def remplir(annees):
+    """Tickets répartis sur les derniers jours, 1 à 3 retouches chacun, terminées en 1 à 12 jours (2 % oubliées)"""
+    db.drop_all()
+    db.create_all()
+    categories = [Categorie(nom=f"Catégorie {i}") for i in range(8)]
+    sous_categories = [SousCategorie(nom='Toutes', categorie=c) for c in categories]
+    details = [DetailRetouche(nom=f"Prestation {n}", prix=5 + n % 40, sous_categorie=sous_categories[n % 8])
+               for n in range(60)]
+    client = Client(nom='Client benchmark', numero_telephone='0600000000')
+    db.session.add_all(details + [client])
+    db.session.flush()
+    maintenant = datetime.utcnow()
+    jours = 365 * annees
+    db.session.execute(db.insert(Ticket), [{
+        'client_id': client.id,
+        'date_creation': maintenant - timedelta(days=jours * n / (jours * TICKETS_PAR_JOUR)),
+        'date_echeance': (maintenant - timedelta(days=jours * n / (jours * TICKETS_PAR_JOUR) - 7)).date(),
+        'paye': random.random() < 0.7,
+    } for n in range(jours * TICKETS_PAR_JOUR)])
+    lignes = []
+    for ticket_id, creation in db.session.query(Ticket.id, Ticket.date_creation):
+        for _ in range(random.randint(1, 3)):
+            detail = random.choice(details)
+            fin = creation + timedelta(days=random.uniform(1, 12))
+            terminee = fin < maintenant and random.random() < 0.98
+            lignes.append({'client_id': client.id, 'ticket_id': ticket_id, 'prix': detail.prix,
+                           'detail_retouche_id': detail.id, 'statut': 'Terminée' if terminee else 'En cours',
+                           'date_terminee': fin if terminee else None})
+    db.session.execute(db.insert(Retouche), lignes)
+    synchroniser_totaux_tickets(set(db.session.scalars(db.select(Ticket.id))))
+    db.session.commit()
+    return len(lignes)
+
+def mesurer(client_http, url):
+    debut = time.perf_counter()
+    reponse = client_http.get(url)
+    assert reponse.status_code == 200, f"{url} a répondu {reponse.status_code}"
+    return (time.perf_counter() - debut) * 1000
+
+if __name__ == '__main__':
+    random.seed(0)
+    with app.app_context():
+        nb_retouches = remplir(ANNEES)
+        print(f"{ANNEES} ans : {Ticket.query.count()} tickets, {nb_retouches} retouches")
+        client_http = app.test_client()
+        debut = date(date.today().year - ANNEES, 1, 1)
+        print(f"{'granularité':>12}{'1er affichage ms':>20}{'suivants ms':>15}")
+        pire = 0
+        for granularite in ('mois', 'semaine'):
+            url = f"/api/rapports?granularite={granularite}&debut={debut.isoformat()}"
+            premier = mesurer(client_http, url)
+            suivants = max(mesurer(client_http, url) for _ in range(5))
+            pire = max(pire, suivants)
+            print(f"{granularite:>12}{premier:>20.1f}{suivants:>15.1f}")
+        print(f"{RapportPeriode.query.count()} périodes closes en cache")
+        if pire > OBJECTIF_MS:
+            print(f"❌ Plus de {OBJECTIF_MS} ms avec le cache.")
+            raise SystemExit(1)
+        print(f"✅ Tableau de bord sous {OBJECTIF_MS} ms une fois les périodes closes en cache.")
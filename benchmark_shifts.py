@@ -0,0 +1,64 @@
+import os
+
+# Base SQLite en mémoire : le script ne touche jamais la vraie base
+os.environ['DATABASE_URL'] = 'sqlite://'
+
+import time
+from datetime import date, timedelta, time as heure
+from sqlalchemy import event
+from mon_atelier import app, db
+from mon_atelier.routes import Employe, PlanningShift
+
+# Mesure du flux /api/shifts_events de l'accueil selon la taille de l'historique :
+# pour une semaine affichée, la latence et le nombre de requêtes doivent rester stables.
+
+HISTORIQUES = [1000, 10000, 50000]
+SHIFTS_PAR_JOUR = 10
+REPETITIONS = 5
+
+def remplir_historique(employes, nb_shifts):
+    """Complète l'historique jusqu'à nb_shifts shifts, en remontant jour par jour avant aujourd'hui"""
+    deja = PlanningShift.query.count()
+    lignes = []
+    for n in range(deja, nb_shifts):
+        lignes.append({
+            'date': date.today() - timedelta(days=n // SHIFTS_PAR_JOUR),
+            'heure_debut': heure(9 + n % 8),
+            'heure_fin': heure(10 + n % 8),
+            'tache': 'Atelier',
+            'employe_id': employes[n % len(employes)].id,
+        })
+    if lignes:
+        db.session.execute(db.insert(PlanningShift), lignes)
+        db.session.commit()
+
+def mesurer(client_http, url):
+    """Renvoie (nombre de requêtes SQL, durée en ms, nombre d'événements) pour un appel"""
+    requetes = []
+    def enregistrer(conn, cursor, statement, parameters, context, executemany):
+        requetes.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', enregistrer)
+    debut = time.perf_counter()
+    try:
+        reponse = client_http.get(url)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', enregistrer)
+    duree = (time.perf_counter() - debut) * 1000
+    assert reponse.status_code == 200, f"{url} a répondu {reponse.status_code}"
+    return len(requetes), duree, len(reponse.get_json())
+
+if __name__ == '__main__':
+    with app.app_context():
+        db.create_all()
+        employes = [Employe(nom=f"Employé {i}", couleur='#a18aff') for i in range(5)]
+        db.session.add_all(employes)
+        db.session.commit()
+        client_http = app.test_client()
+        lundi = date.today() - timedelta(days=date.today().weekday())
+        url = f"/api/shifts_events?start={lundi.isoformat()}&end={(lundi + timedelta(days=7)).isoformat()}"
+        print(f"{'historique':>12}{'événements':>12}{'requêtes SQL':>15}{'ms (moyenne)':>15}")
+        for nb_shifts in HISTORIQUES:
+            remplir_historique(employes, nb_shifts)
+            mesures = [mesurer(client_http, url) for _ in range(REPETITIONS)]
+            moyenne = sum(m[1] for m in mesures) / len(mesures)
+            print(f"{nb_shifts:>12}{mesures[0][2]:>12}{max(m[0] for m in mesures):>15}{moyenne:>15.1f}")
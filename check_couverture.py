@@ -0,0 +1,128 @@
+import random
+import time
+from datetime import date, datetime, timedelta, time as heure
+from mon_atelier.couverture import Couverture
+
+# Script de vérification du moteur de couverture du planning : sur un planning généré
+# de plusieurs années, chaque réponse est comparée à un calcul naïf et chronométrée.
+
+ANNEES = 3
+EMPLOYES = [1, 2, 3, 4, 5]
+JOURS_OUVERTURE = (1, 2, 3, 4, 5)  # Mardi à samedi
+OUVERTURE, FERMETURE = heure(9, 0), heure(19, 0)
+NB_QUESTIONS = 2000
+
+def generer_planning(graine=42):
+    """Planning aléatoire : 2 à 4 shifts par jour ouvert, quelques présences et congés par employé"""
+    hasard = random.Random(graine)
+    premier_jour = date(2024, 1, 1)
+    shifts, presences, conges = [], [], []
+    for n in range(365 * ANNEES):
+        jour = premier_jour + timedelta(days=n)
+        if jour.weekday() not in JOURS_OUVERTURE:
+            continue
+        for _ in range(hasard.randint(2, 4)):
+            debut = datetime.combine(jour, heure(hasard.randint(8, 17), hasard.choice((0, 30))))
+            fin = debut + timedelta(minutes=hasard.choice((60, 120, 180, 240)))
+            tache = hasard.choice(('Accueil', 'Accueil', 'Atelier', 'Caisse'))
+            shifts.append((len(shifts) + 1, hasard.choice(EMPLOYES), debut, fin, tache))
+    for employe_id in EMPLOYES:
+        for _ in range(12 * ANNEES):
+            debut = premier_jour + timedelta(days=hasard.randrange(365 * ANNEES))
+            presences.append((employe_id, debut, debut + timedelta(days=hasard.randint(0, 10))))
+        for _ in range(3 * ANNEES):
+            debut = premier_jour + timedelta(days=hasard.randrange(365 * ANNEES))
+            conges.append((len(conges) + 1, employe_id, debut, debut + timedelta(days=hasard.randint(0, 14))))
+    return premier_jour, shifts, presences, conges
+
+# --- Calculs naïfs de référence ---
+
+def jours_en_datetime(debut, fin):
+    return datetime.combine(debut, heure()), datetime.combine(fin + timedelta(days=1), heure())
+
+def disponibles_naif(shifts, presences, conges, moment):
+    en_conge = {c[1] for c in conges if jours_en_datetime(c[2], c[3])[0] <= moment < jours_en_datetime(c[2], c[3])[1]}
+    sur_place = {s[1] for s in shifts if s[2] <= moment < s[3]}
+    sur_place |= {p[0] for p in presences if jours_en_datetime(p[1], p[2])[0] <= moment < jours_en_datetime(p[1], p[2])[1]}
+    return sorted(sur_place - en_conge)
+
+def conflits_naif(shifts, conges, debut, fin):
+    dans_plage = [s for s in shifts if s[2] < fin and s[3] > debut]
+    resultat = set()
+    for s in dans_plage:
+        for autre in shifts:
+            if autre[1] == s[1] and autre[0] > s[0] and autre[2] < s[3] and autre[3] > s[2]:
+                resultat.add(('chevauchement', s[0], autre[0]))
+        for c in conges:
+            c_debut, c_fin = jours_en_datetime(c[2], c[3])
+            if c[1] == s[1] and c_debut < s[3] and c_fin > s[2]:
+                resultat.add(('conge', s[0], c[0]))
+    return resultat
+
+def non_couverts_naif(shifts, conges, debut, fin):
+    # Demi-heure par demi-heure : couverte si un shift d'accueil, hors congé de l'employé, la contient
+    def en_conge(s):
+        return any(c[1] == s[1] and jours_en_datetime(c[2], c[3])[0] < s[3] and jours_en_datetime(c[2], c[3])[1] > s[2]
+                   for c in conges)
+    accueil = [s for s in shifts if s[4] == 'Accueil' and not en_conge(s)]
+    creneaux, ouvert = [], None
+    minute = debut
+    while minute < fin:
+        heure_ouverte = minute.weekday() in JOURS_OUVERTURE and OUVERTURE <= minute.time() < FERMETURE
+        manque = heure_ouverte and not any(s[2] <= minute < s[3] for s in accueil)
+        if manque and ouvert is None:
+            ouvert = minute
+        if not manque and ouvert is not None:
+            creneaux.append((ouvert, minute))
+            ouvert = None
+        minute += timedelta(minutes=30)
+    if ouvert is not None:
+        creneaux.append((ouvert, fin))
+    return creneaux
+
+def verifier_couverture():
+    premier_jour, shifts, presences, conges = generer_planning()
+    debut_chrono = time.perf_counter()
+    couverture = Couverture(shifts, presences, conges)
+    construction = (time.perf_counter() - debut_chrono) * 1000
+    print(f"{len(shifts)} shifts, {len(presences)} présences, {len(conges)} congés sur {ANNEES} ans "
+          f"(construction : {construction:.0f} ms)")
+
+    hasard = random.Random(7)
+    premier = datetime.combine(premier_jour, heure())
+    echecs = 0
+    durees = {'disponibles': 0.0, 'conflits': 0.0, 'creneaux_non_couverts': 0.0}
+    for n in range(NB_QUESTIONS):
+        moment = premier + timedelta(minutes=30 * hasard.randrange(2 * 24 * 365 * ANNEES))
+        debut_chrono = time.perf_counter()
+        reponse = couverture.disponibles(moment)
+        durees['disponibles'] += time.perf_counter() - debut_chrono
+        echecs += reponse != disponibles_naif(shifts, presences, conges, moment)
+
+        # Une semaine au hasard, alignée sur la demi-heure comme les shifts générés
+        debut = moment.replace(hour=0, minute=0)
+        fin = debut + timedelta(days=7)
+        debut_chrono = time.perf_counter()
+        reponse = couverture.conflits(debut, fin)
+        durees['conflits'] += time.perf_counter() - debut_chrono
+        obtenus = {('conge', c['shift_id'], c['conge_id']) if c['type'] == 'conge' else
+                   ('chevauchement', min(c['shift_id'], c['autre_shift_id']), max(c['shift_id'], c['autre_shift_id']))
+                   for c in reponse}
+        echecs += obtenus != conflits_naif(shifts, conges, debut, fin)
+
+        if n % 20 == 0:
+            debut_chrono = time.perf_counter()
+            reponse = couverture.creneaux_non_couverts(debut, fin, JOURS_OUVERTURE, OUVERTURE, FERMETURE)
+            durees['creneaux_non_couverts'] += (time.perf_counter() - debut_chrono) * 20
+            echecs += reponse != non_couverts_naif(shifts, conges, debut, fin)
+
+    for question, total in durees.items():
+        print(f"- {question} : {total / NB_QUESTIONS * 1000:.3f} ms par question")
+    return echecs
+
+if __name__ == '__main__':
+    echecs = verifier_couverture()
+    if echecs:
+        print(f"❌ {echecs} réponse(s) différente(s) du calcul naïf.")
+        raise SystemExit(1)
+    print("✅ Toutes les réponses correspondent au calcul naïf.")
@@ -0,0 +1,82 @@
+from datetime import date, datetime, timedelta
+from mon_atelier import app, db
+from mon_atelier.routes import (Ticket, Retouche, Client, PlanningShift, PresenceEmploye,
+                                CongeEmploye, ChargeJournaliere, filtre_prefixe)
+
+# Script de vérification des index : chaque requête des vues passe par EXPLAIN
+# (SQLite ou PostgreSQL selon DATABASE_URL) et doit utiliser l'index attendu.
+
+def requetes_a_verifier():
+    lundi = date.today()
+    samedi = lundi + timedelta(days=5)
+    return [
+        ("planning / aujourdhui : tickets de la période", 'ix_ticket_date_echeance',
+         Ticket.query.filter(Ticket.date_echeance >= lundi, Ticket.date_echeance <= samedi)),
+        ("tickets d'un client", 'ix_ticket_client_id',
+         Ticket.query.filter(Ticket.client_id == 1)),
+        ("retouches d'un ticket", 'ix_retouche_ticket_statut',
+         Retouche.query.filter(Retouche.ticket_id == 1)),
+        ("retouches en cours d'un ticket", 'ix_retouche_ticket_statut',
+         Retouche.query.filter(Retouche.ticket_id == 1, Retouche.statut == 'En cours')),
+        ("ajouter_retouche : client par téléphone", 'ix_client_telephone_normalise',
+         Client.query.filter(Client.telephone_normalise == '+33600000000')),
+        ("api_recherche_clients : préfixe du nom", 'ix_client_nom_recherche',
+         Client.query.filter(filtre_prefixe(Client.nom_recherche, 'dup'))),
+        ("api_recherche_clients : préfixe du téléphone", 'ix_client_telephone_normalise',
+         Client.query.filter(filtre_prefixe(Client.telephone_normalise, '+33612'))),
+        ("index : shifts de la semaine", 'ix_planning_shift_date_employe',
+         PlanningShift.query.filter(PlanningShift.date >= lundi, PlanningShift.date <= samedi)),
+        ("calendrier_annuel : shifts d'un employé", 'ix_planning_shift_employe_date',
+         PlanningShift.query.filter(PlanningShift.employe_id == 1)),
+        ("calendrier_mensuel : présences d'un employé", 'ix_presence_employe_employe_dates',
+         PresenceEmploye.query.filter(PresenceEmploye.employe_id == 1,
+                                      PresenceEmploye.date_fin >= lundi, PresenceEmploye.date_debut <= samedi)),
+        ("calendrier_mensuel : congés d'un employé", 'ix_conge_employe_employe_dates',
+         CongeEmploye.query.filter(CongeEmploye.employe_id == 1,
+                                   CongeEmploye.date_fin >= lundi, CongeEmploye.date_debut <= samedi)),
+        ("index : congés de la semaine", 'ix_conge_employe_dates',
+         CongeEmploye.query.filter(CongeEmploye.date_debut <= samedi, CongeEmploye.date_fin >= lundi)),
+        ("api_retouche_events : résumé de la période",
+         ('uq_charge_journaliere_date_client', 'sqlite_autoindex_charge_journaliere_1'),
+         ChargeJournaliere.query.filter(ChargeJournaliere.date >= lundi, ChargeJournaliere.date < samedi)),
+        ("rapports : tickets de la période", 'ix_ticket_date_creation',
+         Ticket.query.filter(Ticket.date_creation >= datetime(lundi.year, 1, 1), Ticket.date_creation < datetime.now())),
+        ("rapports : retouches terminées dans la période", 'ix_retouche_date_terminee',
+         Retouche.query.filter(Retouche.date_terminee >= datetime(lundi.year, 1, 1), Retouche.date_terminee < datetime.now())),
+    ]
+
+def plan_execution(requete):
+    """Renvoie le plan d'exécution de la requête sous forme de texte"""
+    dialecte = db.engine.dialect
+    sql = str(requete.statement.compile(dialect=dialecte, compile_kwargs={'literal_binds': True}))
+    if dialecte.name == 'sqlite':
+        lignes = db.session.execute(db.text('EXPLAIN QUERY PLAN ' + sql)).all()
+        return '\n'.join(str(ligne[-1]) for ligne in lignes)
+    lignes = db.session.execute(db.text('EXPLAIN ' + sql)).all()
+    return '\n'.join(ligne[0] for ligne in lignes)
+
+def verifier_index():
+    if db.engine.dialect.name == 'postgresql':
+        # Sur une petite table, PostgreSQL préfère un parcours séquentiel : on vérifie que l'index est utilisable
+        db.session.execute(db.text('SET LOCAL enable_seqscan = off'))
+    echecs = 0
+    for description, index_attendu, requete in requetes_a_verifier():
+        # La contrainte d'unicité du résumé crée un index dont le nom dépend du moteur
+        noms = index_attendu if isinstance(index_attendu, tuple) else (index_attendu,)
+        plan = plan_execution(requete)
+        ok = any(nom in plan for nom in noms)
+        echecs += not ok
+        print(f"{'✅' if ok else '❌'} {description} -> {noms[0]}")
+        if not ok:
+            print('   ' + plan.replace('\n', '\n   '))
+    db.session.rollback()
+    return echecs
+
+if __name__ == '__main__':
+    with app.app_context():
+        print(f"Vérification des index sur {db.engine.dialect.name}...")
+        echecs = verifier_index()
+        if echecs:
+            print(f"{echecs} requête(s) n'utilisent pas l'index attendu.")
+            raise SystemExit(1)
+        print("Toutes les requêtes utilisent leur index.")
@@ -1,7 +1,8 @@
 from mon_atelier import app, db
-from mon_atelier.routes import Fourniture
+from mon_atelier.routes import Fourniture, MouvementStock
 
-# Script de vérification de l'inventaire
+# Script de vérification de l'inventaire : les quantités sont lues dans Fourniture.quantite,
+# puis comparées au solde du journal des mouvements (une seule requête groupée).
 if __name__ == '__main__':
     with app.app_context():
         fournitures = Fourniture.query.all()
@@ -11,3 +12,12 @@ if __name__ == '__main__':
             print(f"{len(fournitures)} fournitures trouvées :")
             for f in fournitures:
                 print(f"- {f.reference if hasattr(f, 'reference') else ''} | {f.nom} | Quantité : {f.quantite}")
+
+            soldes = dict(db.session.query(MouvementStock.fourniture_id, db.func.sum(MouvementStock.delta))
+                          .group_by(MouvementStock.fourniture_id).all())
+            ecarts = [f for f in fournitures if (f.quantite or 0) != (soldes.get(f.id) or 0)]
+            for f in ecarts:
+                print(f"❌ {f.nom} : quantité {f.quantite}, solde du journal {soldes.get(f.id) or 0}")
+            if ecarts:
+                raise SystemExit(1)
+            print("✅ Toutes les quantités correspondent au journal des mouvements.")
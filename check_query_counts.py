@@ -0,0 +1,91 @@
+import os
+
+# Base SQLite en mémoire : le script ne touche jamais la vraie base
+os.environ['DATABASE_URL'] = 'sqlite://'
+
+from datetime import date, timedelta, time
+from sqlalchemy import event
+from mon_atelier import app, db
+from mon_atelier.routes import (Client, Ticket, Retouche, Employe, PresenceEmploye, CongeEmploye,
+                                ModeleShift, seed_data)
+
+# Script de vérification du nombre de requêtes SQL par page :
+# le nombre doit rester le même quel que soit le volume de retouches affiché.
+
+# Pages vérifiées et nombre maximal de requêtes SQL par appel
+PAGES = {
+    '/aujourdhui': 2,
+    '/planning': 3,
+    '/api/retouche_events': 3,
+    '/api/shifts_events': 3,
+    '/api/modifier_planning_employe/events': 2,
+    '/api/planning_employe/events': 2,
+}
+
+def creer_tickets(nb_clients, retouches_par_ticket):
+    """Crée nb_clients tickets pour aujourd'hui et demain, avec des prestations variées"""
+    aujourd_hui = date.today()
+    deja_crees = Client.query.count()
+    for i in range(deja_crees, deja_crees + nb_clients):
+        client = Client(nom=f"Client {i}", numero_telephone=f"06{i:08d}")
+        db.session.add(client)
+        db.session.flush()
+        ticket = Ticket(client_id=client.id, date_echeance=aujourd_hui + timedelta(days=i % 2))
+        db.session.add(ticket)
+        db.session.flush()
+        db.session.add_all([
+            Retouche(client_id=client.id, ticket_id=ticket.id, prix=10.0, detail_retouche_id=1 + (j % 40))
+            for j in range(retouches_par_ticket)
+        ])
+    db.session.commit()
+
+def creer_presences(nb_employes):
+    """Crée nb_employes employés, chacun avec une présence, un congé et un shift récurrent autour d'aujourd'hui"""
+    aujourd_hui = date.today()
+    for i in range(nb_employes):
+        employe = Employe(nom=f"Employé {Employe.query.count()}", couleur='#a18aff')
+        db.session.add(employe)
+        db.session.flush()
+        db.session.add_all([
+            PresenceEmploye(employe_id=employe.id, date_debut=aujourd_hui - timedelta(days=3), date_fin=aujourd_hui),
+            CongeEmploye(employe_id=employe.id, date_debut=aujourd_hui + timedelta(days=1),
+                         date_fin=aujourd_hui + timedelta(days=2), motif="Repos"),
+            ModeleShift(employe_id=employe.id, jours_semaine='12345', heure_debut=time(9), heure_fin=time(12),
+                        tache="Atelier", date_debut=aujourd_hui - timedelta(days=30)),
+        ])
+    db.session.commit()
+
+def compter_requetes(client_http, url):
+    requetes = []
+    def enregistrer(conn, cursor, statement, parameters, context, executemany):
+        requetes.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', enregistrer)
+    try:
+        reponse = client_http.get(url)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', enregistrer)
+    assert reponse.status_code == 200, f"{url} a répondu {reponse.status_code}"
+    return len(requetes)
+
+def verifier_nombre_requetes():
+    client_http = app.test_client()
+    echecs = 0
+    for nb_clients, retouches_par_ticket in [(2, 1), (40, 10)]:
+        creer_tickets(nb_clients, retouches_par_ticket)
+        creer_presences(nb_clients // 4 or 1)
+        for url, maximum in PAGES.items():
+            compter_requetes(client_http, url)  # Premier appel : remplit le cache du catalogue
+            nb = compter_requetes(client_http, url)
+            ok = nb <= maximum
+            echecs += not ok
+            print(f"{'✅' if ok else '❌'} {url} ({nb_clients} tickets x {retouches_par_ticket}) : {nb} requête(s), maximum {maximum}")
+    return echecs
+
+if __name__ == '__main__':
+    with app.app_context():
+        db.create_all()
+        seed_data()
+        echecs = verifier_nombre_requetes()
+        if echecs:
+            raise SystemExit(1)
+        print("Nombre de requêtes constant sur toutes les pages vérifiées.")
@@ -0,0 +1,92 @@
+import os
+import sys
+import tempfile
+
+# Base jetable : fichier SQLite temporaire, ou l'URL d'une base de test passée en argument
+# (ex: postgresql://localhost/atelier_test). Le script ne touche jamais la vraie base.
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        os.environ['DATABASE_URL'] = sys.argv[1]
+    else:
+        fichier = os.path.join(tempfile.mkdtemp(), 'stock.db')
+        os.environ['DATABASE_URL'] = f"sqlite:///{fichier}?timeout=60"
+
+import multiprocessing
+import time
+from datetime import date
+from mon_atelier import app, db
+from mon_atelier.routes import Categorie, SousCategorie, DetailRetouche, Fourniture, MouvementStock, Retouche
+
+# Vérification du stock sous concurrence : plusieurs processus (comme les workers gunicorn)
+# enregistrent des tickets en même temps via /ajouter, puis on compare le stock final au calcul exact.
+
+PROCESSUS = 4
+TICKETS_PAR_PROCESSUS = 50
+STOCK_INITIAL = 10000
+
+def preparer():
+    """Deux prestations qui consomment des fournitures en partie communes"""
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        fil, bouton, zip_ = (Fourniture(nom=nom, quantite=STOCK_INITIAL) for nom in ('Fil', 'Bouton', 'Fermeture'))
+        db.session.add_all([fil, bouton, zip_])
+        db.session.flush()
+        db.session.add_all(MouvementStock(fourniture_id=f.id, type='ajustement', delta=STOCK_INITIAL) for f in (fil, bouton, zip_))
+        categorie = Categorie(nom='Test')
+        sous_categorie = SousCategorie(nom='Test', categorie=categorie)
+        ourlet = DetailRetouche(nom='Ourlet', prix=12.0, sous_categorie=sous_categorie, fournitures=[fil])
+        veste = DetailRetouche(nom='Veste', prix=30.0, sous_categorie=sous_categorie, fournitures=[fil, bouton, zip_])
+        db.session.add_all([ourlet, veste])
+        db.session.commit()
+        return [ourlet.id, veste.id]
+
+def vendre(numero, details_ids, depart):
+    """Un worker : chaque ticket contient une ligne par prestation, en quantité 1 et 2"""
+    client_http = app.test_client()
+    depart.wait()
+    for n in range(TICKETS_PAR_PROCESSUS):
+        reponse = client_http.post('/ajouter', data={
+            'date_echeance': date.today().isoformat(),
+            'nom_client': f"Client {numero}-{n}",
+            'detail_retouche_id[]': details_ids,
+            'prix[]': ['', ''],
+            'description[]': ['', ''],
+            'quantite[]': ['1', '2'],
+        })
+        assert reponse.status_code == 200, f"/ajouter a répondu {reponse.status_code}"
+
+if __name__ == '__main__':
+    details_ids = preparer()
+    contexte = multiprocessing.get_context('spawn')
+    depart = contexte.Event()
+    processus = [contexte.Process(target=vendre, args=(n, details_ids, depart)) for n in range(PROCESSUS)]
+    for p in processus:
+        p.start()
+    debut = time.perf_counter()
+    depart.set()
+    for p in processus:
+        p.join()
+    duree = time.perf_counter() - debut
+    if any(p.exitcode for p in processus):
+        print("❌ Un processus a échoué.")
+        raise SystemExit(1)
+
+    with app.app_context():
+        tickets = PROCESSUS * TICKETS_PAR_PROCESSUS
+        # Par ticket : Ourlet x1 et Veste x2 -> Fil 3, Bouton 2, Fermeture 2
+        attendus = {'Fil': STOCK_INITIAL - 3 * tickets, 'Bouton': STOCK_INITIAL - 2 * tickets,
+                    'Fermeture': STOCK_INITIAL - 2 * tickets}
+        obtenus = dict(db.session.query(Fourniture.nom, Fourniture.quantite).all())
+        journal = dict(db.session.query(Fourniture.nom, db.func.sum(MouvementStock.delta))
+                       .join(MouvementStock.fourniture).group_by(Fourniture.nom).all())
+        print(f"{PROCESSUS} processus, {tickets} tickets, {Retouche.query.count()} retouches en {duree:.1f} s")
+        erreurs = 0
+        for nom, attendu in attendus.items():
+            ok = obtenus[nom] == attendu == journal[nom]
+            erreurs += not ok
+            print(f"{'✅' if ok else '❌'} {nom} : {obtenus[nom]} (attendu {attendu}, journal {journal[nom]})")
+    if erreurs:
+        print(f"❌ {erreurs} quantité(s) fausse(s) : des mises à jour du stock ont été perdues.")
+        raise SystemExit(1)
+    print("✅ Stock exact après les ventes concurrentes.")
@@ -1,9 +1,12 @@
+import sys
 from mon_atelier import app, db
-from mon_atelier.routes import DetailRetouche
+from mon_atelier.routes import Categorie, reviser_prix
 
-def convert_prices():
+def convert_prices(simulation=False):
     """
     Script pour convertir tous les prix des prestations de TTC à HT.
+    La conversion est enregistrée comme révision 'ttc-vers-ht' : une seconde exécution est refusée.
+    Usage : python convert_prices_to_ht.py [--simulation]
     """
     with app.app_context():
         tva_rate = app.config.get('TVA_RATE', 0.20)
@@ -11,23 +14,25 @@ def convert_prices():
             print("ERREUR : Le taux de TVA n'est pas défini dans la configuration.")
             return
 
-        prestations = DetailRetouche.query.all()
-        if not prestations:
+        categorie_ids = [c.id for c in Categorie.query.all()]
+        if not categorie_ids:
             print("Aucune prestation à convertir.")
             return
 
-        print(f"Début de la conversion de {len(prestations)} prix (TTC vers HT) avec un taux de TVA de {tva_rate * 100}%...")
+        print(f"Début de la conversion des prix (TTC vers HT) avec un taux de TVA de {tva_rate * 100}%...")
+        try:
+            resume = reviser_prix('ttc-vers-ht', {c: 1 / (1 + tva_rate) for c in categorie_ids},
+                                  description=f"TTC vers HT, TVA {tva_rate * 100:g} %", simulation=simulation)
+        except ValueError as erreur:
+            print(f"❌ {erreur}")
+            return
 
-        count = 0
-        for pres in prestations:
-            if pres.prix is not None and pres.prix > 0:
-                prix_ttc = pres.prix
-                prix_ht = prix_ttc / (1 + tva_rate)
-                pres.prix = round(prix_ht, 2) # On arrondit à 2 décimales
-                count += 1
-        
+        count = sum(nb for nb, _, _ in resume.values())
+        if simulation:
+            print(f"Simulation : {count} prix seraient mis à jour en HT.")
+            return
         db.session.commit()
         print(f"✅ Conversion terminée. {count} prix ont été mis à jour en HT.")
 
 if __name__ == '__main__':
-    convert_prices()
+    convert_prices(simulation='--simulation' in sys.argv)
@@ -0,0 +1,20 @@
+import sys
+from mon_atelier import app, db
+from mon_atelier.routes import fusionner_clients_doublons
+
+# Script de fusion des clients en double (même numéro de téléphone normalisé).
+# À lancer avant la migration qui rend Client.telephone_normalise unique.
+# Usage : python dedup_clients.py [--simulation]
+if __name__ == '__main__':
+    simulation = '--simulation' in sys.argv
+    with app.app_context():
+        fusions = fusionner_clients_doublons(simulation=simulation)
+        if not fusions:
+            print("Aucun client en double.")
+        for conserve, anciens in fusions:
+            print(f"- Client {conserve} conservé, fusion de : {', '.join(str(a) for a in anciens)}")
+        if fusions:
+            if simulation:
+                print(f"Simulation : {len(fusions)} groupe(s) seraient fusionnés.")
+            else:
+                print(f"✅ {len(fusions)} groupe(s) de clients fusionnés.")
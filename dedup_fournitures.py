@@ -0,0 +1,20 @@
+import sys
+from mon_atelier import app, db
+from mon_atelier.routes import fusionner_fournitures_doublons
+
+# Script de fusion des fournitures en double (même référence), laissées par les anciens imports.
+# À lancer avant la migration qui rend Fourniture.reference unique.
+# Usage : python dedup_fournitures.py [--simulation]
+if __name__ == '__main__':
+    simulation = '--simulation' in sys.argv
+    with app.app_context():
+        fusions = fusionner_fournitures_doublons(simulation=simulation)
+        if not fusions:
+            print("Aucune fourniture en double.")
+        for conserve, anciens in fusions:
+            print(f"- Fourniture {conserve} conservée, fusion de : {', '.join(str(a) for a in anciens)}")
+        if fusions:
+            if simulation:
+                print(f"Simulation : {len(fusions)} groupe(s) seraient fusionnés.")
+            else:
+                print(f"✅ {len(fusions)} groupe(s) de fournitures fusionnés.")
@@ -0,0 +1,48 @@
+import argparse
+import sys
+from datetime import date, timedelta
+from mon_atelier import app, db
+from mon_atelier.routes import FORMATS_EXPORT, export_comptable_csv
+
+# Export comptable : tous les tickets d'une période avec leurs lignes (HT, TVA, TTC), en CSV.
+# Même contenu que /export/comptable ; les lignes sont lues par paquets et écrites au fil de l'eau,
+# la mémoire reste constante même pour plusieurs années. Les textes qui commencent comme une formule
+# (=, +, -, @) sont précédés d'une apostrophe, comme dans l'export web.
+#
+# Usage : python export_accounting.py [--annee 2025 | --debut 2023-01-01 --fin 2025-12-31]
+#                                     [--format excel|csv] [--sortie export.csv]
+
+def lire_date(valeur):
+    try:
+        return date.fromisoformat(valeur)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"date invalide : {valeur!r} (format AAAA-MM-JJ)")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Exporte les tickets et leurs lignes pour la comptabilité.")
+    parser.add_argument('--annee', type=int, help="année civile à exporter (l'an dernier par défaut)")
+    parser.add_argument('--debut', type=lire_date, help="premier jour exporté (AAAA-MM-JJ)")
+    parser.add_argument('--fin', type=lire_date, help="dernier jour exporté, inclus (AAAA-MM-JJ)")
+    parser.add_argument('--format', choices=FORMATS_EXPORT, default='excel',
+                        help="excel : ';' et virgule décimale (par défaut) ; csv : ',' et point décimal")
+    parser.add_argument('--sortie', help="fichier à écrire (export-comptable-<debut>-<fin>.csv par défaut, - pour la sortie standard)")
+    arguments = parser.parse_args()
+
+    annee = arguments.annee or date.today().year - 1
+    debut = arguments.debut or date(annee, 1, 1)
+    fin = arguments.fin or date(annee, 12, 31)
+    if fin < debut:
+        parser.error("la date de fin précède la date de début")
+    sortie = arguments.sortie or f"export-comptable-{debut.isoformat()}-{fin.isoformat()}.csv"
+
+    with app.app_context():
+        fichier = sys.stdout if sortie == '-' else open(sortie, 'w', newline='', encoding='utf-8')
+        try:
+            for morceau in export_comptable_csv(debut, fin + timedelta(days=1), arguments.format):
+                fichier.write(morceau)
+        finally:
+            if fichier is not sys.stdout:
+                fichier.close()
+        db.session.rollback()
+    if sortie != '-':
+        print(f"✅ Export du {debut.strftime('%d/%m/%Y')} au {fin.strftime('%d/%m/%Y')} écrit dans {sortie}", file=sys.stderr)
@@ -0,0 +1,15 @@
+from mon_atelier import app, db
+from mon_atelier.routes import calculer_previsions_stock, fournitures_avec_previsions
+
+# Script de calcul des prévisions de rupture de stock (table prevision_stock), à planifier chaque nuit.
+# Les pages inventaire et paramètres lisent ce résultat sans refaire le calcul.
+if __name__ == '__main__':
+    with app.app_context():
+        print(f"Consommation observée sur les {app.config['PREVISION_FENETRE_JOURS']} derniers jours...")
+        nb_consommees = calculer_previsions_stock()
+        db.session.commit()
+        print(f"✅ Prévisions recalculées, {nb_consommees} fourniture(s) consommée(s) sur la période.")
+        for f in fournitures_avec_previsions():
+            if f.en_alerte:
+                print(f"- {f.nom} : {f.quantite} en stock, rupture vers le {f.date_rupture:%d/%m/%Y}, "
+                      f"commander {f.quantite_a_commander}")
@@ -1,34 +1,140 @@
+import argparse
 import csv
+import itertools
+import sys
 from mon_atelier import app, db
-from mon_atelier.routes import Fourniture
-
-with app.app_context():
-    db.create_all()
-    with open('inventaire.csv', newline='', encoding='utf-8') as csvfile:
-        reader = csv.reader(csvfile, delimiter=';')
-        headers = next(reader, None)
-        for row in reader:
-            # Ignore les colonnes vides à la fin
-            row = [cell for cell in row if cell.strip() != '']
-            print(f"Ligne lue : {row}")
-            if len(row) < 4:
-                print("Ligne ignorée (pas assez de colonnes)")
+from mon_atelier.routes import Fourniture, fournitures_par_reference, importer_fournitures
+
+# Import de l'inventaire (ou d'un catalogue fournisseur) depuis un CSV : reference;nom;couleur;quantite
+# Le fichier est lu ligne à ligne et envoyé par lots : la mémoire reste constante quelle que soit sa taille.
+# Chaque lot est un INSERT ... ON CONFLICT sur la référence, validé aussitôt : relancer l'import
+# ne crée pas de doublons, et une erreur en cours de route ne perd que le lot en cours.
+# Les changements de quantité passent par le journal des mouvements (type 'import') ; une quantité
+# vide ou une colonne quantite absente (catalogue fournisseur) laisse le stock tel quel.
+#
+# Usage : python import_inventory.py [inventaire.csv] [--simulation] [--lot 1000] [--rejets rejets.csv]
+
+COLONNES = ('reference', 'nom', 'couleur', 'quantite')
+LONGUEUR_REFERENCE = Fourniture.__table__.c.reference.type.length
+REJETS_AFFICHES = 20
+
+def lire_lignes(fichier, separateur):
+    """Produit (numéro de ligne, dictionnaire ou None, motif du rejet) pour chaque ligne de données"""
+    with open(fichier, newline='', encoding='utf-8-sig') as csvfile:
+        reader = csv.reader(csvfile, delimiter=separateur)
+        premiere = next(reader, [])
+        entetes = [cellule.strip().lower() for cellule in premiere]
+        if any(c in entetes for c in COLONNES):
+            # Colonnes repérées par l'en-tête ; une colonne absente reste vide (jamais lue ailleurs)
+            positions = {c: entetes.index(c) for c in COLONNES if c in entetes}
+            lignes = reader
+        else:
+            # Pas d'en-tête reconnu : colonnes dans l'ordre attendu, la première ligne est une donnée
+            positions = {c: n for n, c in enumerate(COLONNES)}
+            lignes = itertools.chain([premiere], reader)
+        for cellules in lignes:
+            numero = reader.line_num
+            if not any(cellule.strip() for cellule in cellules):
                 continue
-            try:
-                reference, nom, couleur, quantite = row[:4]
-                mapping = {
-                    'reference': reference,
-                    'nom': nom,
-                    'couleur': couleur,
-                    'quantite': quantite
-                }
-                print(f"Mapping utilisé pour insertion : {mapping}")
-                fourniture = Fourniture(reference=reference, nom=nom, couleur=couleur, quantite=int(quantite))
-                db.session.add(fourniture)
-            except Exception as e:
-                print(f"Erreur lors de l'insertion de la ligne {row} : {e}")
-        try:
+            valeurs = {c: cellules[positions[c]].strip() if positions.get(c, len(cellules)) < len(cellules) else ''
+                       for c in COLONNES}
+            if not valeurs['reference']:
+                yield numero, None, "référence manquante"
+            elif len(valeurs['reference']) > LONGUEUR_REFERENCE:
+                # Tronquée, elle pourrait se confondre avec une autre référence de même début
+                yield numero, None, f"référence trop longue ({len(valeurs['reference'])} caractères, {LONGUEUR_REFERENCE} au maximum)"
+            elif not valeurs['nom']:
+                yield numero, None, "nom manquant"
+            else:
+                # Quantité vide ou colonne absente (catalogue fournisseur) : le stock n'est pas touché
+                try:
+                    quantite = int(valeurs['quantite']) if valeurs['quantite'] else None
+                except ValueError:
+                    yield numero, None, f"quantité invalide : {valeurs['quantite']!r}"
+                    continue
+                if quantite is not None and quantite < 0:
+                    yield numero, None, f"quantité négative : {quantite}"
+                    continue
+                yield numero, {'reference': valeurs['reference'], 'nom': valeurs['nom'][:100],
+                               'couleur': valeurs['couleur'][:50] or None, 'quantite': quantite}, None
+
+def comparer_lot(lot):
+    """Simulation : affiche les différences du lot avec la base et renvoie (nouvelles, modifiées)"""
+    existantes = fournitures_par_reference(lot)
+    nouvelles = modifiees = 0
+    for reference, ligne in lot.items():
+        avant = existantes.get(reference)
+        if avant is None:
+            nouvelles += 1
+            print(f"+ {reference} | {ligne['nom']} | {ligne['couleur'] or ''} | {ligne['quantite'] or 0}")
+            continue
+        changements = [f"{champ} : {getattr(avant, champ)!r} -> {ligne[champ]!r}" for champ in ('nom', 'couleur')
+                       if getattr(avant, champ) != ligne[champ]]
+        if ligne['quantite'] is not None and (avant.quantite or 0) != ligne['quantite']:
+            changements.append(f"quantite : {avant.quantite} -> {ligne['quantite']}")
+        if changements:
+            modifiees += 1
+            print(f"~ {reference} | {', '.join(changements)}")
+    return nouvelles, modifiees
+
+def importer(fichier, simulation=False, taille_lot=1000, separateur=';', fichier_rejets=None):
+    lues = valides = references = nouvelles = modifiees = rejetees = 0
+    sortie_rejets = open(fichier_rejets, 'w', newline='', encoding='utf-8') if fichier_rejets else None
+    rejets = csv.writer(sortie_rejets, delimiter=separateur) if sortie_rejets else None
+    if rejets:
+        rejets.writerow(('ligne', 'motif'))
+    lot = {}
+
+    def envoyer_lot():
+        nonlocal references, nouvelles, modifiees
+        references += len(lot)
+        if simulation:
+            n, m = comparer_lot(lot)
+            nouvelles += n
+            modifiees += m
+            db.session.rollback()
+        else:
+            importer_fournitures(lot.values(), commentaire=f"Import {fichier}")
             db.session.commit()
-            print("Commit réussi.")
-        except Exception as e:
-            print(f"Erreur lors du commit : {e}")
\ No newline at end of file
+        lot.clear()
+        print(f"... {lues} lignes lues, {valides} valides, {rejetees} rejetées", file=sys.stderr)
+
+    for numero, ligne, motif in lire_lignes(fichier, separateur):
+        lues += 1
+        if ligne is None:
+            rejetees += 1
+            if rejetees <= REJETS_AFFICHES:
+                print(f"Ligne {numero} rejetée : {motif}", file=sys.stderr)
+            if rejets:
+                rejets.writerow((numero, motif))
+            continue
+        valides += 1
+        # Une même référence répétée dans le lot : la dernière ligne l'emporte
+        lot[ligne['reference']] = ligne
+        if len(lot) >= taille_lot:
+            envoyer_lot()
+    if lot:
+        envoyer_lot()
+    if sortie_rejets:
+        sortie_rejets.close()
+
+    if rejetees > REJETS_AFFICHES:
+        print(f"... et {rejetees - REJETS_AFFICHES} autre(s) ligne(s) rejetée(s)"
+              + (f", voir {fichier_rejets}" if fichier_rejets else ""), file=sys.stderr)
+    if simulation:
+        print(f"Simulation : {nouvelles} nouvelle(s) fourniture(s), {modifiees} modifiée(s), "
+              f"{references - nouvelles - modifiees} inchangée(s), {rejetees} ligne(s) rejetée(s). Rien n'a été écrit.")
+    else:
+        print(f"✅ Import terminé : {valides} ligne(s) importée(s), {rejetees} ligne(s) rejetée(s).")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Importe les fournitures d'un CSV (upsert par référence).")
+    parser.add_argument('fichier', nargs='?', default='inventaire.csv')
+    parser.add_argument('--simulation', action='store_true', help="affiche les différences sans rien écrire")
+    parser.add_argument('--lot', type=int, default=1000, help="nombre de lignes par requête (1000 par défaut)")
+    parser.add_argument('--separateur', default=';')
+    parser.add_argument('--rejets', help="fichier CSV où écrire toutes les lignes rejetées")
+    arguments = parser.parse_args()
+    with app.app_context():
+        db.create_all()
+        importer(arguments.fichier, arguments.simulation, arguments.lot, arguments.separateur, arguments.rejets)
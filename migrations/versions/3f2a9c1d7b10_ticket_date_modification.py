@@ -0,0 +1,28 @@
+"""Ajout de ticket.date_modification pour le flux incrémental du calendrier
+
+Revision ID: 3f2a9c1d7b10
+Revises: 
+Create Date: 2026-10-18 09:12:41.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f2a9c1d7b10'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('ticket', sa.Column('date_modification', sa.DateTime(), nullable=True))
+    op.execute("UPDATE ticket SET date_modification = date_creation")
+    op.create_index('ix_ticket_date_modification', 'ticket', ['date_modification'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_ticket_date_modification', table_name='ticket')
+    with op.batch_alter_table('ticket') as batch_op:
+        batch_op.drop_column('date_modification')
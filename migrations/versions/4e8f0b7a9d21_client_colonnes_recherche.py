@@ -0,0 +1,79 @@
+"""Colonnes de recherche client (nom sans accents, téléphone normalisé)
+
+Revision ID: 4e8f0b7a9d21
+Revises: c7d19a4e2f68
+Create Date: 2026-10-18 11:20:48.664310
+
+"""
+import unicodedata
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4e8f0b7a9d21'
+down_revision = 'c7d19a4e2f68'
+branch_labels = None
+depends_on = None
+
+
+# Copies figées de normaliser_nom / normaliser_telephone (mon_atelier/routes.py)
+def normaliser_nom(nom):
+    if not nom:
+        return None
+    sans_accents = unicodedata.normalize('NFKD', nom).encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(sans_accents.lower().split())
+
+
+def normaliser_telephone(numero_telephone):
+    if not numero_telephone:
+        return None
+    chiffres = ''.join(filter(str.isdigit, numero_telephone))
+    if not chiffres:
+        return None
+    if numero_telephone.strip().startswith('+'):
+        return '+' + chiffres
+    if chiffres.startswith('00'):
+        return '+' + chiffres[2:]
+    if chiffres.startswith('33'):
+        return '+' + chiffres
+    if chiffres.startswith('0'):
+        return '+33' + chiffres[1:]
+    return chiffres
+
+
+def upgrade():
+    op.add_column('client', sa.Column('nom_recherche', sa.String(length=100), nullable=True))
+    op.add_column('client', sa.Column('telephone_normalise', sa.String(length=20), nullable=True))
+
+    client = sa.table('client',
+        sa.column('id', sa.Integer),
+        sa.column('nom', sa.String),
+        sa.column('numero_telephone', sa.String),
+        sa.column('nom_recherche', sa.String),
+        sa.column('telephone_normalise', sa.String),
+    )
+    connection = op.get_bind()
+    lignes = connection.execute(sa.select(client.c.id, client.c.nom, client.c.numero_telephone)).all()
+    if lignes:
+        connection.execute(
+            client.update().where(client.c.id == sa.bindparam('client_id')).values(
+                nom_recherche=sa.bindparam('nom_recherche'),
+                telephone_normalise=sa.bindparam('telephone_normalise')),
+            [{'client_id': client_id,
+              'nom_recherche': normaliser_nom(nom),
+              'telephone_normalise': normaliser_telephone(numero_telephone)}
+             for client_id, nom, numero_telephone in lignes]
+        )
+
+    op.create_index('ix_client_nom_recherche', 'client', ['nom_recherche'], unique=False)
+    op.create_index('ix_client_telephone_normalise', 'client', ['telephone_normalise'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_client_telephone_normalise', table_name='client')
+    op.drop_index('ix_client_nom_recherche', table_name='client')
+    with op.batch_alter_table('client') as batch_op:
+        batch_op.drop_column('telephone_normalise')
+        batch_op.drop_column('nom_recherche')
@@ -0,0 +1,63 @@
+"""Table charge_journaliere : résumé matérialisé du calendrier des retouches
+
+Revision ID: 8b41e6d2c5a3
+Revises: 3f2a9c1d7b10
+Create Date: 2026-10-18 10:03:17.552940
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b41e6d2c5a3'
+down_revision = '3f2a9c1d7b10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('charge_journaliere',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('client_id', sa.Integer(), nullable=False),
+    sa.Column('ticket_id', sa.Integer(), nullable=True),
+    sa.Column('nb_retouches', sa.Integer(), nullable=False),
+    sa.Column('nb_en_cours', sa.Integer(), nullable=False),
+    sa.Column('prestations', sa.Text(), nullable=True),
+    sa.Column('date_modification', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['client_id'], ['client.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('date', 'client_id', name='uq_charge_journaliere_date_client')
+    )
+    op.create_index('ix_charge_journaliere_date_modification', 'charge_journaliere', ['date_modification'], unique=False)
+
+    # Remplissage initial, même agrégation que reconstruire_charges : une ligne par (échéance, client),
+    # prestations en JSON {detail_retouche_id: quantité} construit par la base
+    connexion = op.get_bind()
+    agreger = 'string_agg' if connexion.dialect.name == 'postgresql' else 'group_concat'
+    connexion.execute(sa.text(f"""
+        INSERT INTO charge_journaliere
+            (date, client_id, ticket_id, nb_retouches, nb_en_cours, prestations, date_modification)
+        SELECT date_echeance, client_id, min(ticket_id), sum(quantite), sum(en_cours),
+               '{{' || coalesce({agreger}(
+                   CASE WHEN detail_retouche_id IS NOT NULL
+                   THEN '"' || CAST(detail_retouche_id AS TEXT) || '": ' || CAST(quantite AS TEXT) END, ', '
+               ), '') || '}}',
+               :maintenant
+        FROM (
+            SELECT ticket.date_echeance, ticket.client_id, retouche.detail_retouche_id,
+                   min(ticket.id) AS ticket_id, count(retouche.id) AS quantite,
+                   sum(CASE WHEN retouche.statut = 'Terminée' THEN 0 ELSE 1 END) AS en_cours
+            FROM ticket JOIN retouche ON retouche.ticket_id = ticket.id
+            WHERE ticket.date_echeance IS NOT NULL
+            GROUP BY ticket.date_echeance, ticket.client_id, retouche.detail_retouche_id
+        ) AS lignes
+        GROUP BY date_echeance, client_id
+    """), {'maintenant': datetime.utcnow()})
+
+
+def downgrade():
+    op.drop_index('ix_charge_journaliere_date_modification', table_name='charge_journaliere')
+    op.drop_table('charge_journaliere')
@@ -0,0 +1,40 @@
+"""Téléphone normalisé unique par client
+
+Revision ID: 9a6c3e15b7f4
+Revises: 4e8f0b7a9d21
+Create Date: 2026-10-18 11:58:02.931557
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9a6c3e15b7f4'
+down_revision = '4e8f0b7a9d21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    doublons = op.get_bind().execute(sa.text(
+        "SELECT count(*) FROM (SELECT telephone_normalise FROM client "
+        "WHERE telephone_normalise IS NOT NULL "
+        "GROUP BY telephone_normalise HAVING count(*) > 1) AS doublons"
+    )).scalar()
+    if doublons:
+        raise RuntimeError(
+            f"{doublons} numéro(s) partagé(s) par plusieurs clients : "
+            "lancez 'flask db upgrade 4e8f0b7a9d21' (colonne telephone_normalise), "
+            "puis 'python dedup_clients.py', puis relancez 'flask db upgrade'."
+        )
+    op.drop_index('ix_client_telephone_normalise', table_name='client')
+    op.create_index('ix_client_telephone_normalise', 'client', ['telephone_normalise'], unique=True)
+    # Les recherches par téléphone passent désormais par telephone_normalise
+    op.drop_index('ix_client_numero_telephone', table_name='client')
+
+
+def downgrade():
+    op.create_index('ix_client_numero_telephone', 'client', ['numero_telephone'], unique=False)
+    op.drop_index('ix_client_telephone_normalise', table_name='client')
+    op.create_index('ix_client_telephone_normalise', 'client', ['telephone_normalise'], unique=False)
@@ -0,0 +1,38 @@
+"""Référence unique par fourniture (références vides ramenées à NULL)
+
+Revision ID: a4d92e6f1c58
+Revises: f1c4a7e93b26
+Create Date: 2026-10-18 18:04:51.377102
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4d92e6f1c58'
+down_revision = 'f1c4a7e93b26'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    connexion = op.get_bind()
+    # Plusieurs fournitures sans référence restent possibles : NULL n'entre pas dans l'unicité
+    connexion.execute(sa.text("UPDATE fourniture SET reference = NULL WHERE trim(reference) = ''"))
+    doublons = connexion.execute(sa.text(
+        "SELECT count(*) FROM (SELECT reference FROM fourniture "
+        "WHERE reference IS NOT NULL "
+        "GROUP BY reference HAVING count(*) > 1) AS doublons"
+    )).scalar()
+    if doublons:
+        raise RuntimeError(
+            f"{doublons} référence(s) partagée(s) par plusieurs fournitures : "
+            "lancez 'flask db upgrade f1c4a7e93b26' (journal des mouvements de stock), "
+            "puis 'python dedup_fournitures.py', puis relancez 'flask db upgrade'."
+        )
+    op.create_index('ix_fourniture_reference', 'fourniture', ['reference'], unique=True)
+
+
+def downgrade():
+    op.drop_index('ix_fourniture_reference', table_name='fourniture')
@@ -0,0 +1,29 @@
+"""Table version_donnees : version du catalogue partagée entre les workers
+
+Revision ID: b25d7f3e8c90
+Revises: 9a6c3e15b7f4
+Create Date: 2026-10-18 12:34:50.218876
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b25d7f3e8c90'
+down_revision = '9a6c3e15b7f4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    version_donnees = op.create_table('version_donnees',
+    sa.Column('nom', sa.String(length=50), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('nom')
+    )
+    op.bulk_insert(version_donnees, [{'nom': 'catalogue', 'version': 0}])
+
+
+def downgrade():
+    op.drop_table('version_donnees')
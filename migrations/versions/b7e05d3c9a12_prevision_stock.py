@@ -0,0 +1,31 @@
+"""Prévisions de rupture de stock précalculées par fourniture
+
+Revision ID: b7e05d3c9a12
+Revises: a4d92e6f1c58
+Create Date: 2026-10-18 18:41:26.908734
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e05d3c9a12'
+down_revision = 'a4d92e6f1c58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('prevision_stock',
+    sa.Column('fourniture_id', sa.Integer(), nullable=False),
+    sa.Column('consommation_jour', sa.Float(), nullable=False),
+    sa.Column('consommation_fenetre', sa.Integer(), nullable=False),
+    sa.Column('date_calcul', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['fourniture_id'], ['fourniture.id'], ),
+    sa.PrimaryKeyConstraint('fourniture_id')
+    )
+
+
+def downgrade():
+    op.drop_table('prevision_stock')
@@ -0,0 +1,32 @@
+"""Révisions de prix appliquées au catalogue
+
+Revision ID: c3f81b6d2e47
+Revises: b7e05d3c9a12
+Create Date: 2026-10-18 19:12:03.551289
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3f81b6d2e47'
+down_revision = 'b7e05d3c9a12'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('revision_prix',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('nom', sa.String(length=100), nullable=False),
+    sa.Column('description', sa.String(length=200), nullable=True),
+    sa.Column('nb_prestations', sa.Integer(), nullable=False),
+    sa.Column('date', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('nom')
+    )
+
+
+def downgrade():
+    op.drop_table('revision_prix')
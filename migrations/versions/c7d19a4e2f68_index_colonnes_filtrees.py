@@ -0,0 +1,42 @@
+"""Index sur les colonnes filtrées par les vues semaine, jour et calendrier
+
+Revision ID: c7d19a4e2f68
+Revises: 8b41e6d2c5a3
+Create Date: 2026-10-18 10:41:05.107732
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7d19a4e2f68'
+down_revision = '8b41e6d2c5a3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_ticket_date_echeance', 'ticket', ['date_echeance'], unique=False)
+    op.create_index('ix_ticket_client_id', 'ticket', ['client_id'], unique=False)
+    op.create_index('ix_retouche_ticket_statut', 'retouche', ['ticket_id', 'statut'], unique=False)
+    op.create_index('ix_retouche_client_id', 'retouche', ['client_id'], unique=False)
+    op.create_index('ix_client_numero_telephone', 'client', ['numero_telephone'], unique=False)
+    op.create_index('ix_planning_shift_date_employe', 'planning_shift', ['date', 'employe_id'], unique=False)
+    op.create_index('ix_planning_shift_employe_date', 'planning_shift', ['employe_id', 'date'], unique=False)
+    op.create_index('ix_presence_employe_employe_date', 'presence_employe', ['employe_id', 'date'], unique=False)
+    op.create_index('ix_conge_employe_employe_dates', 'conge_employe', ['employe_id', 'date_debut', 'date_fin'], unique=False)
+    op.create_index('ix_conge_employe_dates', 'conge_employe', ['date_debut', 'date_fin'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_conge_employe_dates', table_name='conge_employe')
+    op.drop_index('ix_conge_employe_employe_dates', table_name='conge_employe')
+    op.drop_index('ix_presence_employe_employe_date', table_name='presence_employe')
+    op.drop_index('ix_planning_shift_employe_date', table_name='planning_shift')
+    op.drop_index('ix_planning_shift_date_employe', table_name='planning_shift')
+    op.drop_index('ix_client_numero_telephone', table_name='client')
+    op.drop_index('ix_retouche_client_id', table_name='retouche')
+    op.drop_index('ix_retouche_ticket_statut', table_name='retouche')
+    op.drop_index('ix_ticket_client_id', table_name='ticket')
+    op.drop_index('ix_ticket_date_echeance', table_name='ticket')
@@ -0,0 +1,89 @@
+"""Présences stockées par période (date_debut, date_fin) au lieu d'une ligne par jour
+
+Revision ID: d3a8f61c2b57
+Revises: b25d7f3e8c90
+Create Date: 2026-10-18 15:20:41.604213
+
+"""
+from datetime import timedelta
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd3a8f61c2b57'
+down_revision = 'b25d7f3e8c90'
+branch_labels = None
+depends_on = None
+
+
+presence_employe = sa.table('presence_employe',
+    sa.column('id', sa.Integer),
+    sa.column('employe_id', sa.Integer),
+    sa.column('date', sa.Date),
+    sa.column('date_debut', sa.Date),
+    sa.column('date_fin', sa.Date),
+    sa.column('present', sa.Boolean),
+)
+
+
+def upgrade():
+    with op.batch_alter_table('presence_employe') as batch_op:
+        batch_op.add_column(sa.Column('date_debut', sa.Date(), nullable=True))
+        batch_op.add_column(sa.Column('date_fin', sa.Date(), nullable=True))
+
+    # Regroupe les jours consécutifs de chaque employé en une seule période.
+    # Les lignes 'present = false' ne sont affichées nulle part : elles ne sont pas reprises.
+    connexion = op.get_bind()
+    jours = connexion.execute(
+        sa.select(presence_employe.c.employe_id, presence_employe.c.date)
+        .where(presence_employe.c.present.is_(True))
+        .distinct()
+        .order_by(presence_employe.c.employe_id, presence_employe.c.date)
+    ).all()
+    periodes = []
+    for employe_id, jour in jours:
+        if periodes and periodes[-1]['employe_id'] == employe_id and periodes[-1]['date_fin'] + timedelta(days=1) == jour:
+            periodes[-1]['date_fin'] = jour
+        else:
+            periodes.append({'employe_id': employe_id, 'date': jour, 'date_debut': jour, 'date_fin': jour, 'present': True})
+    connexion.execute(presence_employe.delete())
+    if periodes:
+        connexion.execute(presence_employe.insert(), periodes)
+
+    with op.batch_alter_table('presence_employe') as batch_op:
+        batch_op.drop_index('ix_presence_employe_employe_date')
+        batch_op.drop_column('date')
+        batch_op.alter_column('date_debut', existing_type=sa.Date(), nullable=False)
+        batch_op.alter_column('date_fin', existing_type=sa.Date(), nullable=False)
+        batch_op.create_index('ix_presence_employe_employe_dates', ['employe_id', 'date_debut', 'date_fin'], unique=False)
+        batch_op.create_index('ix_presence_employe_dates', ['date_debut', 'date_fin'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('presence_employe') as batch_op:
+        batch_op.add_column(sa.Column('date', sa.Date(), nullable=True))
+
+    # Redécoupe chaque période en une ligne par jour
+    connexion = op.get_bind()
+    periodes = connexion.execute(
+        sa.select(presence_employe.c.employe_id, presence_employe.c.date_debut,
+                  presence_employe.c.date_fin, presence_employe.c.present)
+    ).all()
+    jours = [
+        {'employe_id': employe_id, 'date': debut + timedelta(days=n), 'date_debut': debut,
+         'date_fin': fin, 'present': present}
+        for employe_id, debut, fin, present in periodes
+        for n in range((fin - debut).days + 1)
+    ]
+    connexion.execute(presence_employe.delete())
+    if jours:
+        connexion.execute(presence_employe.insert(), jours)
+
+    with op.batch_alter_table('presence_employe') as batch_op:
+        batch_op.drop_index('ix_presence_employe_dates')
+        batch_op.drop_index('ix_presence_employe_employe_dates')
+        batch_op.drop_column('date_fin')
+        batch_op.drop_column('date_debut')
+        batch_op.alter_column('date', existing_type=sa.Date(), nullable=False)
+        batch_op.create_index('ix_presence_employe_employe_date', ['employe_id', 'date'], unique=False)
@@ -0,0 +1,65 @@
+"""Totaux HT/TVA/TTC et taux de TVA stockés sur le ticket
+
+Revision ID: d5a27c9e4f83
+Revises: c3f81b6d2e47
+Create Date: 2026-10-18 19:48:37.120466
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5a27c9e4f83'
+down_revision = 'c3f81b6d2e47'
+branch_labels = None
+depends_on = None
+
+
+# Taux en vigueur jusqu'ici (TVA_RATE) : les tickets existants le gardent
+TAUX_TVA = 0.20
+
+ticket = sa.table('ticket',
+    sa.column('id', sa.Integer),
+    sa.column('taux_tva', sa.Float),
+    sa.column('total_ht', sa.Float),
+    sa.column('montant_tva', sa.Float),
+    sa.column('total_ttc', sa.Float),
+)
+retouche = sa.table('retouche',
+    sa.column('ticket_id', sa.Integer),
+    sa.column('prix', sa.Float),
+)
+
+
+def upgrade():
+    with op.batch_alter_table('ticket') as batch_op:
+        batch_op.add_column(sa.Column('taux_tva', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('total_ht', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('montant_tva', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('total_ttc', sa.Float(), nullable=True))
+
+    # Une seule requête pour tous les tickets existants
+    total_ht = sa.select(sa.func.coalesce(sa.func.sum(retouche.c.prix), 0.0)).where(
+        retouche.c.ticket_id == ticket.c.id
+    ).scalar_subquery()
+    op.get_bind().execute(ticket.update().values(
+        taux_tva=TAUX_TVA,
+        total_ht=total_ht,
+        montant_tva=total_ht * TAUX_TVA,
+        total_ttc=total_ht * (1 + TAUX_TVA),
+    ))
+
+    with op.batch_alter_table('ticket') as batch_op:
+        batch_op.alter_column('taux_tva', existing_type=sa.Float(), nullable=False)
+        batch_op.alter_column('total_ht', existing_type=sa.Float(), nullable=False)
+        batch_op.alter_column('montant_tva', existing_type=sa.Float(), nullable=False)
+        batch_op.alter_column('total_ttc', existing_type=sa.Float(), nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('ticket') as batch_op:
+        batch_op.drop_column('total_ttc')
+        batch_op.drop_column('montant_tva')
+        batch_op.drop_column('total_ht')
+        batch_op.drop_column('taux_tva')
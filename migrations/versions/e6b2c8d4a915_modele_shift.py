@@ -0,0 +1,44 @@
+"""Shifts récurrents : modèles hebdomadaires et exceptions par jour
+
+Revision ID: e6b2c8d4a915
+Revises: d3a8f61c2b57
+Create Date: 2026-10-18 16:42:13.507319
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6b2c8d4a915'
+down_revision = 'd3a8f61c2b57'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('modele_shift',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('employe_id', sa.Integer(), nullable=False),
+    sa.Column('jours_semaine', sa.String(length=7), nullable=False),
+    sa.Column('heure_debut', sa.Time(), nullable=False),
+    sa.Column('heure_fin', sa.Time(), nullable=False),
+    sa.Column('tache', sa.String(length=100), nullable=True),
+    sa.Column('date_debut', sa.Date(), nullable=False),
+    sa.Column('date_fin', sa.Date(), nullable=True),
+    sa.ForeignKeyConstraint(['employe_id'], ['employe.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('exception_modele_shift',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('modele_id', sa.Integer(), nullable=False),
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.ForeignKeyConstraint(['modele_id'], ['modele_shift.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('modele_id', 'date', name='uq_exception_modele_shift_modele_date')
+    )
+
+
+def downgrade():
+    op.drop_table('exception_modele_shift')
+    op.drop_table('modele_shift')
@@ -0,0 +1,64 @@
+"""Rapports d'activité : date de fin des retouches, index sur la date des tickets, cache des périodes closes
+
+Revision ID: e8b39f1a6d24
+Revises: d5a27c9e4f83
+Create Date: 2026-10-18 20:41:12.508317
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8b39f1a6d24'
+down_revision = 'd5a27c9e4f83'
+branch_labels = None
+depends_on = None
+
+
+ticket = sa.table('ticket',
+    sa.column('id', sa.Integer),
+    sa.column('date_modification', sa.DateTime),
+)
+retouche = sa.table('retouche',
+    sa.column('ticket_id', sa.Integer),
+    sa.column('statut', sa.String),
+    sa.column('date_terminee', sa.DateTime),
+)
+
+
+def upgrade():
+    with op.batch_alter_table('retouche') as batch_op:
+        batch_op.add_column(sa.Column('date_terminee', sa.DateTime(), nullable=True))
+    op.create_index('ix_retouche_date_terminee', 'retouche', ['date_terminee'], unique=False)
+    op.create_index('ix_ticket_date_creation', 'ticket', ['date_creation'], unique=False)
+
+    # Retouches déjà terminées : la date de fin n'a pas été notée, la dernière modification
+    # du ticket en est la meilleure approximation
+    date_modification = sa.select(ticket.c.date_modification).where(
+        ticket.c.id == retouche.c.ticket_id
+    ).scalar_subquery()
+    op.get_bind().execute(
+        retouche.update().where(retouche.c.statut == 'Terminée').values(date_terminee=date_modification)
+    )
+
+    op.create_table('rapport_periode',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('granularite', sa.String(length=10), nullable=False),
+    sa.Column('debut', sa.Date(), nullable=False),
+    sa.Column('fin', sa.Date(), nullable=False),
+    sa.Column('donnees', sa.Text(), nullable=False),
+    sa.Column('date_calcul', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('granularite', 'debut', name='uq_rapport_periode_granularite_debut')
+    )
+    op.create_index('ix_rapport_periode_debut_fin', 'rapport_periode', ['debut', 'fin'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_rapport_periode_debut_fin', table_name='rapport_periode')
+    op.drop_table('rapport_periode')
+    op.drop_index('ix_ticket_date_creation', table_name='ticket')
+    op.drop_index('ix_retouche_date_terminee', table_name='retouche')
+    with op.batch_alter_table('retouche') as batch_op:
+        batch_op.drop_column('date_terminee')
@@ -0,0 +1,58 @@
+"""Journal des mouvements de stock, Fourniture.quantite devient son solde courant
+
+Revision ID: f1c4a7e93b26
+Revises: e6b2c8d4a915
+Create Date: 2026-10-18 17:35:08.214960
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1c4a7e93b26'
+down_revision = 'e6b2c8d4a915'
+branch_labels = None
+depends_on = None
+
+
+fourniture = sa.table('fourniture',
+    sa.column('id', sa.Integer),
+    sa.column('quantite', sa.Integer),
+)
+
+
+def upgrade():
+    mouvement_stock = op.create_table('mouvement_stock',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('fourniture_id', sa.Integer(), nullable=False),
+    sa.Column('type', sa.String(length=20), nullable=False),
+    sa.Column('delta', sa.Integer(), nullable=False),
+    sa.Column('date', sa.DateTime(), nullable=False),
+    sa.Column('ticket_id', sa.Integer(), nullable=True),
+    sa.Column('commentaire', sa.String(length=200), nullable=True),
+    sa.ForeignKeyConstraint(['fourniture_id'], ['fourniture.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_mouvement_stock_fourniture_date', 'mouvement_stock', ['fourniture_id', 'date'], unique=False)
+    op.create_index('ix_mouvement_stock_ticket', 'mouvement_stock', ['ticket_id'], unique=False)
+
+    # Le stock actuel devient le premier mouvement de chaque fourniture : solde du journal = quantite
+    connexion = op.get_bind()
+    maintenant = datetime.utcnow()
+    soldes = [
+        {'fourniture_id': fourniture_id, 'type': 'ajustement', 'delta': quantite, 'date': maintenant,
+         'commentaire': 'Solde initial'}
+        for fourniture_id, quantite in connexion.execute(
+            sa.select(fourniture.c.id, fourniture.c.quantite).where(fourniture.c.quantite != 0)
+        )
+    ]
+    if soldes:
+        connexion.execute(mouvement_stock.insert(), soldes)
+
+
+def downgrade():
+    op.drop_index('ix_mouvement_stock_ticket', table_name='mouvement_stock')
+    op.drop_index('ix_mouvement_stock_fourniture_date', table_name='mouvement_stock')
+    op.drop_table('mouvement_stock')
@@ -1,9 +1,15 @@
 # --- IMPORTS INITIAUX ET CONFIGURATION FLASK ---
 import os
+import time as chrono
+import threading
 import urllib.parse
+from collections import defaultdict
 from datetime import datetime, date, timedelta, time
-from flask import Flask, render_template, request, redirect, url_for, jsonify, flash
+from flask import (Flask, render_template, request, redirect, url_for, jsonify, flash, g,
+                   has_request_context, before_render_template, template_rendered)
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 from flask_migrate import Migrate
 from dotenv import load_dotenv
 
@@ -31,9 +37,24 @@ app.config['PAULA_COUTURE_EMAIL'] = "paula.couture@ymail.com"
 app.config['PAULA_COUTURE_SIRET'] = "789 369 584"
 app.config['TVA_RATE'] = 0.20 
 
+# -- Horaires de l'atelier, pour vérifier que l'accueil est couvert
+app.config['JOURS_OUVERTURE'] = (1, 2, 3, 4, 5)  # Du mardi au samedi (lundi = 0)
+app.config['HEURE_OUVERTURE'] = time(9, 0)
+app.config['HEURE_FERMETURE'] = time(19, 0)
+app.config['TACHE_ACCUEIL'] = 'Accueil'
+
+# -- Prévision des ruptures de stock (voir forecast_stock.py)
+app.config['PREVISION_FENETRE_JOURS'] = 90     # Consommation observée sur les 90 derniers jours
+app.config['PREVISION_ALERTE_JOURS'] = 14      # Alerte si la rupture est prévue dans moins de 14 jours
+app.config['PREVISION_COUVERTURE_JOURS'] = 30  # Quantité à commander pour tenir 30 jours
+
 # On lit les secrets depuis les variables d'environnement
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY') or 'remplacez-moi-par-une-cle-secrete-unique-et-longue'
 
+# -- Mesure des performances (désactivée par défaut, INSTRUMENTATION=1 pour l'activer)
+app.config['INSTRUMENTATION'] = os.environ.get('INSTRUMENTATION') == '1'
+app.config['SEUIL_REQUETE_LENTE_MS'] = float(os.environ.get('SEUIL_REQUETE_LENTE_MS') or 500)
+
 # --- INITIALISATION DES EXTENSIONS ---
 db = SQLAlchemy(app)
 migrate = Migrate(app, db)
@@ -48,6 +69,147 @@ def inject_config():
 def inject_timedelta():
     return dict(timedelta=timedelta)
 
+# --- INSTRUMENTATION (nombre de requêtes SQL et temps de réponse par route) ---
+# Les mesures sont gardées en mémoire, par processus : avec plusieurs workers gunicorn,
+# chaque appel à /_metrics ne montre que le worker qui a répondu.
+SEUILS_DUREE = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+SEUILS_NB_SQL = (1, 2, 5, 10, 20, 50, 100)
+
+class Histogramme:
+    """Histogramme cumulatif au format Prometheus (seuils 'le', somme et nombre)"""
+    def __init__(self, seuils):
+        self.seuils = seuils
+        self.compteurs = [0] * len(seuils)
+        self.somme = 0.0
+        self.nombre = 0
+
+    def observer(self, valeur):
+        for i, seuil in enumerate(self.seuils):
+            if valeur <= seuil:
+                self.compteurs[i] += 1
+        self.somme += valeur
+        self.nombre += 1
+
+    def lignes(self, nom, etiquettes):
+        for seuil, compteur in zip(self.seuils, self.compteurs):
+            yield f'{nom}_bucket{{{etiquettes},le="{seuil}"}} {compteur}'
+        yield f'{nom}_bucket{{{etiquettes},le="+Inf"}} {self.nombre}'
+        yield f'{nom}_sum{{{etiquettes}}} {self.somme:.6f}'
+        yield f'{nom}_count{{{etiquettes}}} {self.nombre}'
+
+class MesuresRoutes:
+    """Mesures agrégées par route, partagées entre les threads d'un worker"""
+    def __init__(self):
+        self.verrou = threading.Lock()
+        self.duree = defaultdict(lambda: Histogramme(SEUILS_DUREE))
+        self.nb_sql = defaultdict(lambda: Histogramme(SEUILS_NB_SQL))
+        self.duree_sql = defaultdict(float)
+        self.duree_templates = defaultdict(float)
+
+    def enregistrer(self, route, duree, nb_sql, duree_sql, duree_templates):
+        with self.verrou:
+            self.duree[route].observer(duree)
+            self.nb_sql[route].observer(nb_sql)
+            self.duree_sql[route] += duree_sql
+            self.duree_templates[route] += duree_templates
+
+    def format_prometheus(self):
+        with self.verrou:
+            lignes = [
+                '# HELP atelier_requete_duree_secondes Temps de réponse total par route',
+                '# TYPE atelier_requete_duree_secondes histogram',
+            ]
+            for route, histo in sorted(self.duree.items()):
+                lignes.extend(histo.lignes('atelier_requete_duree_secondes', f'route="{route}"'))
+            lignes += [
+                '# HELP atelier_requete_sql_nombre Nombre de requêtes SQL par appel',
+                '# TYPE atelier_requete_sql_nombre histogram',
+            ]
+            for route, histo in sorted(self.nb_sql.items()):
+                lignes.extend(histo.lignes('atelier_requete_sql_nombre', f'route="{route}"'))
+            lignes += [
+                '# HELP atelier_sql_secondes_total Temps cumulé passé dans la base par route',
+                '# TYPE atelier_sql_secondes_total counter',
+            ]
+            lignes += [f'atelier_sql_secondes_total{{route="{route}"}} {total:.6f}'
+                       for route, total in sorted(self.duree_sql.items())]
+            lignes += [
+                '# HELP atelier_template_secondes_total Temps cumulé de rendu des templates par route',
+                '# TYPE atelier_template_secondes_total counter',
+            ]
+            lignes += [f'atelier_template_secondes_total{{route="{route}"}} {total:.6f}'
+                       for route, total in sorted(self.duree_templates.items())]
+        return '\n'.join(lignes) + '\n'
+
+mesures_routes = MesuresRoutes()
+
+def mesure_en_cours():
+    """Renvoie la mesure de la requête HTTP en cours, ou None hors requête ou si elle n'est pas suivie"""
+    if not has_request_context():
+        return None
+    return g.get('mesure')
+
+def debut_sql(conn, cursor, statement, parameters, context, executemany):
+    mesure = mesure_en_cours()
+    if mesure is not None:
+        mesure['debut_sql'] = chrono.perf_counter()
+
+def fin_sql(conn, cursor, statement, parameters, context, executemany):
+    mesure = mesure_en_cours()
+    if mesure is None or mesure['debut_sql'] is None:
+        return
+    duree = chrono.perf_counter() - mesure['debut_sql']
+    mesure['debut_sql'] = None
+    mesure['nb_sql'] += 1
+    mesure['duree_sql'] += duree
+    mesure['requetes'][statement] += duree
+
+def debut_template(sender, template, context, **extra):
+    mesure = mesure_en_cours()
+    if mesure is not None:
+        mesure['debuts_template'].append(chrono.perf_counter())
+
+def fin_template(sender, template, context, **extra):
+    mesure = mesure_en_cours()
+    if mesure is not None and mesure['debuts_template']:
+        mesure['duree_templates'] += chrono.perf_counter() - mesure['debuts_template'].pop()
+
+def debut_mesure():
+    if request.endpoint in (None, 'static', 'metriques'):
+        return
+    g.mesure = {
+        'debut': chrono.perf_counter(), 'debut_sql': None, 'nb_sql': 0, 'duree_sql': 0.0,
+        'duree_templates': 0.0, 'debuts_template': [], 'requetes': defaultdict(float),
+    }
+
+def fin_mesure(reponse):
+    mesure = g.pop('mesure', None)
+    if mesure is None:
+        return reponse
+    duree = chrono.perf_counter() - mesure['debut']
+    mesures_routes.enregistrer(request.endpoint, duree, mesure['nb_sql'],
+                               mesure['duree_sql'], mesure['duree_templates'])
+    if duree * 1000 >= app.config['SEUIL_REQUETE_LENTE_MS']:
+        plus_lentes = sorted(mesure['requetes'].items(), key=lambda r: r[1], reverse=True)[:3]
+        detail = ''.join(f"\n  {d * 1000:.1f} ms : {' '.join(sql.split())[:300]}" for sql, d in plus_lentes)
+        app.logger.warning(
+            "Requête lente %s %s : %.0f ms (SQL : %d requête(s), %.0f ms ; templates : %.0f ms)%s",
+            request.method, request.path, duree * 1000, mesure['nb_sql'],
+            mesure['duree_sql'] * 1000, mesure['duree_templates'] * 1000, detail)
+    return reponse
+
+def metriques():
+    return mesures_routes.format_prometheus(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+if app.config['INSTRUMENTATION']:
+    event.listen(Engine, 'before_cursor_execute', debut_sql)
+    event.listen(Engine, 'after_cursor_execute', fin_sql)
+    before_render_template.connect(debut_template, app)
+    template_rendered.connect(fin_template, app)
+    app.before_request(debut_mesure)
+    app.after_request(fin_mesure)
+    app.add_url_rule('/_metrics', 'metriques', metriques)
+
 # --- IMPORT DES ROUTES ---
 from mon_atelier import routes
 
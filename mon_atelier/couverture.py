@@ -0,0 +1,166 @@
+# --- MOTEUR DE COUVERTURE DU PLANNING DES EMPLOYÉS ---
+# Indépendant de Flask et de la base : routes.py lui passe des tuples déjà chargés.
+# Tous les intervalles sont des datetime, fin exclue.
+from datetime import datetime, timedelta
+
+
+class ArbreIntervalles:
+    """Arbre d'intervalles centré, construit une fois puis interrogé en O(log n + k).
+    Chaque élément est un tuple (debut, fin, valeur) avec debut < fin."""
+
+    __slots__ = ('centre', 'par_debut', 'par_fin', 'gauche', 'droite')
+
+    def __init__(self, intervalles):
+        intervalles = [i for i in intervalles if i[0] < i[1]]
+        self.gauche = self.droite = None
+        self.par_debut = self.par_fin = []
+        self.centre = None
+        if not intervalles:
+            return
+        # Le centre est le début médian : l'intervalle correspondant reste dans ce nœud, la récursion avance toujours
+        debuts = sorted(i[0] for i in intervalles)
+        self.centre = debuts[len(debuts) // 2]
+        a_gauche, a_droite, ici = [], [], []
+        for intervalle in intervalles:
+            if intervalle[1] <= self.centre:
+                a_gauche.append(intervalle)
+            elif intervalle[0] > self.centre:
+                a_droite.append(intervalle)
+            else:
+                ici.append(intervalle)
+        # Les intervalles du nœud contiennent le centre : triés par début croissant et par fin décroissante
+        self.par_debut = sorted(ici, key=lambda i: i[0])
+        self.par_fin = sorted(ici, key=lambda i: i[1], reverse=True)
+        if a_gauche:
+            self.gauche = ArbreIntervalles(a_gauche)
+        if a_droite:
+            self.droite = ArbreIntervalles(a_droite)
+
+    def au_moment(self, moment):
+        """Valeurs des intervalles qui contiennent moment"""
+        return self.chevauchant(moment, moment + timedelta(microseconds=1))
+
+    def chevauchant(self, debut, fin):
+        """Valeurs des intervalles qui chevauchent [debut, fin["""
+        resultats = []
+        noeuds = [self]
+        while noeuds:
+            noeud = noeuds.pop()
+            if noeud.centre is None:
+                continue
+            if fin <= noeud.centre:
+                # Seuls les intervalles du nœud qui commencent avant fin chevauchent
+                for intervalle in noeud.par_debut:
+                    if intervalle[0] >= fin:
+                        break
+                    resultats.append(intervalle[2])
+                if noeud.gauche:
+                    noeuds.append(noeud.gauche)
+            elif debut > noeud.centre:
+                # Seuls les intervalles du nœud qui finissent après debut chevauchent
+                for intervalle in noeud.par_fin:
+                    if intervalle[1] <= debut:
+                        break
+                    resultats.append(intervalle[2])
+                if noeud.droite:
+                    noeuds.append(noeud.droite)
+            else:
+                resultats.extend(i[2] for i in noeud.par_debut)
+                if noeud.gauche:
+                    noeuds.append(noeud.gauche)
+                if noeud.droite:
+                    noeuds.append(noeud.droite)
+        return resultats
+
+
+def debut_du_jour(jour):
+    return datetime.combine(jour, datetime.min.time())
+
+
+class Couverture:
+    """Disponibilités, conflits et créneaux non couverts à partir des shifts, présences et congés.
+
+    shifts    : tuples (shift_id, employe_id, debut, fin, tache) en datetime, shift_id unique et hachable
+    presences : tuples (employe_id, date_debut, date_fin), dates incluses (journées entières)
+    conges    : tuples (conge_id, employe_id, date_debut, date_fin), dates incluses
+    """
+
+    def __init__(self, shifts, presences, conges, tache_accueil='Accueil'):
+        shifts = list(shifts)
+        self.tache_accueil = tache_accueil.casefold()
+        self.shifts = ArbreIntervalles(
+            (debut, fin, (shift_id, employe_id, debut, fin, tache))
+            for shift_id, employe_id, debut, fin, tache in shifts
+        )
+        self.accueil = ArbreIntervalles(
+            (debut, fin, (shift_id, employe_id, debut, fin, tache))
+            for shift_id, employe_id, debut, fin, tache in shifts
+            if (tache or '').strip().casefold() == self.tache_accueil
+        )
+        self.presences = ArbreIntervalles(
+            (debut_du_jour(date_debut), debut_du_jour(date_fin + timedelta(days=1)), employe_id)
+            for employe_id, date_debut, date_fin in presences
+        )
+        self.conges = ArbreIntervalles(
+            (debut_du_jour(date_debut), debut_du_jour(date_fin + timedelta(days=1)),
+             (conge_id, employe_id, date_debut, date_fin))
+            for conge_id, employe_id, date_debut, date_fin in conges
+        )
+
+    def en_conge(self, employe_id, debut, fin):
+        """Vrai si l'employé a un congé qui chevauche [debut, fin["""
+        return any(conge[1] == employe_id for conge in self.conges.chevauchant(debut, fin))
+
+    def disponibles(self, moment):
+        """Employés disponibles à l'instant donné : en shift ou présents ce jour-là, et pas en congé"""
+        en_conge = {conge[1] for conge in self.conges.au_moment(moment)}
+        sur_place = {shift[1] for shift in self.shifts.au_moment(moment)}
+        sur_place.update(self.presences.au_moment(moment))
+        return sorted(sur_place - en_conge)
+
+    def conflits(self, debut, fin):
+        """Shifts de [debut, fin[ qui chevauchent un autre shift du même employé ou tombent sur un congé"""
+        conflits = []
+        paires_vues = set()
+        for shift in sorted(self.shifts.chevauchant(debut, fin), key=lambda s: s[2]):
+            shift_id, employe_id, shift_debut, shift_fin, _ = shift
+            for autre in self.shifts.chevauchant(shift_debut, shift_fin):
+                # Chaque paire n'est signalée qu'une fois, depuis le shift qui commence le premier
+                paire = frozenset((shift_id, autre[0]))
+                if autre[1] == employe_id and autre[0] != shift_id and paire not in paires_vues:
+                    paires_vues.add(paire)
+                    conflits.append({'type': 'chevauchement', 'employe_id': employe_id,
+                                     'shift_id': shift_id, 'autre_shift_id': autre[0],
+                                     'debut': max(shift_debut, autre[2]), 'fin': min(shift_fin, autre[3])})
+            for conge in self.conges.chevauchant(shift_debut, shift_fin):
+                if conge[1] == employe_id:
+                    conflits.append({'type': 'conge', 'employe_id': employe_id, 'shift_id': shift_id,
+                                     'conge_id': conge[0], 'debut': shift_debut, 'fin': shift_fin})
+        return conflits
+
+    def creneaux_non_couverts(self, debut, fin, jours_ouverture, heure_ouverture, heure_fermeture):
+        """Créneaux des heures d'ouverture de [debut, fin[ sans personne à l'accueil.
+        Un shift d'accueil tombé pendant un congé de l'employé ne couvre rien.
+        jours_ouverture contient les numéros de jours ouverts (lundi = 0)."""
+        creneaux = []
+        jour = debut.date()
+        while debut_du_jour(jour) < fin:
+            if jour.weekday() in jours_ouverture:
+                ouverture = max(datetime.combine(jour, heure_ouverture), debut)
+                fermeture = min(datetime.combine(jour, heure_fermeture), fin)
+                if ouverture < fermeture:
+                    # Balayage des shifts d'accueil du jour, triés par début
+                    couvert_jusqua = ouverture
+                    for _, employe_id, shift_debut, shift_fin, _ in sorted(
+                            self.accueil.chevauchant(ouverture, fermeture), key=lambda s: s[2]):
+                        if self.en_conge(employe_id, shift_debut, shift_fin):
+                            continue
+                        if shift_debut > couvert_jusqua:
+                            creneaux.append((couvert_jusqua, min(shift_debut, fermeture)))
+                        couvert_jusqua = max(couvert_jusqua, shift_fin)
+                        if couvert_jusqua >= fermeture:
+                            break
+                    if couvert_jusqua < fermeture:
+                        creneaux.append((couvert_jusqua, fermeture))
+            jour += timedelta(days=1)
+        return creneaux
@@ -1,11 +1,19 @@
 from mon_atelier import app, db
+from mon_atelier.couverture import Couverture
 from datetime import date, datetime, timedelta, time
 from flask import render_template
-from flask import request, redirect, url_for, jsonify, flash, session
+from flask import request, redirect, url_for, jsonify, flash, session, abort, Response, stream_with_context
+import csv
+import io
 import locale
+import math
+import json
+import unicodedata
 import urllib.parse
 from babel.dates import format_date
-from collections import Counter, defaultdict
+from collections import Counter, defaultdict, namedtuple
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
 
 # --- MODÈLES DE BASE DE DONNÉES ---
 retouche_fournitures = db.Table('retouche_fournitures',
@@ -16,9 +24,54 @@ retouche_fournitures = db.Table('retouche_fournitures',
 class Fourniture(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     nom = db.Column(db.String(100), nullable=False)
-    reference = db.Column(db.String(50), nullable=True) # CORRECTION : unique=False pour permettre plusieurs champs vides
+    reference = db.Column(db.String(50), nullable=True, unique=True, index=True)  # Vide = NULL, plusieurs fournitures sans référence possibles
     couleur = db.Column(db.String(50), nullable=True)
-    quantite = db.Column(db.Integer, default=0)
+    quantite = db.Column(db.Integer, default=0)  # Solde courant du journal MouvementStock
+
+    # Prévision lue dans PrevisionStock (charger avec joinedload(Fourniture.prevision)),
+    # appliquée à la quantité courante : elle reste juste entre deux calculs.
+    @property
+    def jours_avant_rupture(self):
+        """Jours de stock au rythme de consommation récent, None si la fourniture n'est pas consommée"""
+        if self.prevision is None or not self.prevision.consommation_jour:
+            return None
+        return max(self.quantite or 0, 0) / self.prevision.consommation_jour
+
+    @property
+    def date_rupture(self):
+        jours = self.jours_avant_rupture
+        return None if jours is None else date.today() + timedelta(days=int(jours))
+
+    @property
+    def en_alerte(self):
+        jours = self.jours_avant_rupture
+        return jours is not None and jours <= app.config['PREVISION_ALERTE_JOURS']
+
+    @property
+    def quantite_a_commander(self):
+        """Quantité à commander pour couvrir PREVISION_COUVERTURE_JOURS de consommation"""
+        if self.prevision is None:
+            return 0
+        besoin = math.ceil(self.prevision.consommation_jour * app.config['PREVISION_COUVERTURE_JOURS'])
+        return max(besoin - max(self.quantite or 0, 0), 0)
+
+class MouvementStock(db.Model):
+    # Journal des mouvements de stock : on n'y fait que des ajouts, jamais de modification.
+    # Fourniture.quantite est tenu à jour dans la même transaction (voir mouvementer_stock),
+    # les lectures de l'inventaire n'ont donc jamais à additionner le journal.
+    id = db.Column(db.Integer, primary_key=True)
+    fourniture_id = db.Column(db.Integer, db.ForeignKey('fourniture.id'), nullable=False)
+    type = db.Column(db.String(20), nullable=False)  # 'vente', 'ajustement', 'import', 'annulation'
+    delta = db.Column(db.Integer, nullable=False)
+    date = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    ticket_id = db.Column(db.Integer, nullable=True)  # Sans clé étrangère : le journal survit à la suppression du ticket
+    commentaire = db.Column(db.String(200), nullable=True)
+    fourniture = db.relationship('Fourniture', backref=db.backref('mouvements', lazy='dynamic'))
+
+    __table_args__ = (
+        db.Index('ix_mouvement_stock_fourniture_date', 'fourniture_id', 'date'),
+        db.Index('ix_mouvement_stock_ticket', 'ticket_id'),
+    )
 
 class DetailRetouche(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -41,12 +94,23 @@ class Employe(db.Model):
         return f'<Employe {self.nom}>'
 
 class PresenceEmploye(db.Model):
+    # Une ligne par période de présence continue (bornes incluses), comme CongeEmploye
     id = db.Column(db.Integer, primary_key=True)
     employe_id = db.Column(db.Integer, db.ForeignKey('employe.id'), nullable=False)
-    date = db.Column(db.Date, nullable=False)
+    date_debut = db.Column(db.Date, nullable=False)
+    date_fin = db.Column(db.Date, nullable=False)
     present = db.Column(db.Boolean, default=True)
     employe = db.relationship('Employe', backref='presences')
 
+    __table_args__ = (
+        db.Index('ix_presence_employe_employe_dates', 'employe_id', 'date_debut', 'date_fin'),
+        db.Index('ix_presence_employe_dates', 'date_debut', 'date_fin'),
+    )
+
+    def jours(self):
+        """Renvoie les dates couvertes par la période"""
+        return [self.date_debut + timedelta(days=n) for n in range((self.date_fin - self.date_debut).days + 1)]
+
 class CongeEmploye(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     employe_id = db.Column(db.Integer, db.ForeignKey('employe.id'), nullable=False)
@@ -55,6 +119,11 @@ class CongeEmploye(db.Model):
     motif = db.Column(db.String(100), nullable=True)
     employe = db.relationship('Employe', backref='conges')
 
+    __table_args__ = (
+        db.Index('ix_conge_employe_employe_dates', 'employe_id', 'date_debut', 'date_fin'),
+        db.Index('ix_conge_employe_dates', 'date_debut', 'date_fin'),
+    )
+
 class PlanningShift(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     date = db.Column(db.Date, nullable=False)
@@ -63,9 +132,47 @@ class PlanningShift(db.Model):
     tache = db.Column(db.String(100), nullable=True) # Par ex: 'Accueil', 'Atelier', 'Caisse'
     employe_id = db.Column(db.Integer, db.ForeignKey('employe.id'), nullable=False)
 
+    __table_args__ = (
+        db.Index('ix_planning_shift_date_employe', 'date', 'employe_id'),
+        db.Index('ix_planning_shift_employe_date', 'employe_id', 'date'),
+    )
+
     def __repr__(self):
         return f'<PlanningShift {self.employe.nom} le {self.date}>'
-    
+
+class ModeleShift(db.Model):
+    # Shift récurrent chaque semaine (ex : du mardi au samedi, 9h-12h, Atelier).
+    # Il n'est jamais recopié en base jour par jour : ses occurrences sont calculées
+    # à la demande pour la période affichée (voir occurrences_shifts).
+    id = db.Column(db.Integer, primary_key=True)
+    employe_id = db.Column(db.Integer, db.ForeignKey('employe.id'), nullable=False)
+    jours_semaine = db.Column(db.String(7), nullable=False)  # Numéros des jours, lundi = 0 (ex : '12345')
+    heure_debut = db.Column(db.Time, nullable=False)
+    heure_fin = db.Column(db.Time, nullable=False)
+    tache = db.Column(db.String(100), nullable=True)
+    date_debut = db.Column(db.Date, nullable=False)
+    date_fin = db.Column(db.Date, nullable=True)  # Dernier jour inclus, None = sans fin
+    employe = db.relationship('Employe', backref=db.backref('modeles_shifts', cascade="all, delete-orphan"))
+    exceptions = db.relationship('ExceptionModeleShift', backref='modele', cascade="all, delete-orphan")
+
+    def jours(self):
+        return {int(j) for j in self.jours_semaine}
+
+    def a_lieu_le(self, jour):
+        """Vrai si le modèle a une occurrence ce jour-là (hors exceptions)"""
+        return (jour.weekday() in self.jours() and jour >= self.date_debut
+                and (self.date_fin is None or jour <= self.date_fin))
+
+class ExceptionModeleShift(db.Model):
+    # Jour où l'occurrence d'un modèle n'a pas lieu : supprimée, ou remplacée par un shift ponctuel
+    id = db.Column(db.Integer, primary_key=True)
+    modele_id = db.Column(db.Integer, db.ForeignKey('modele_shift.id'), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint('modele_id', 'date', name='uq_exception_modele_shift_modele_date'),
+    )
+
 class Categorie(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     nom = db.Column(db.String(100), nullable=False, unique=True)
@@ -87,86 +194,957 @@ class Client(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     nom = db.Column(db.String(100), nullable=False)
     numero_telephone = db.Column(db.String(20), nullable=True, unique=False)
+    # Colonnes de recherche calculées à l'écriture (minuscules sans accents, numéro au format +33...)
+    # Un numéro normalisé identifie un seul client : c'est la clé de recherche par téléphone.
+    nom_recherche = db.Column(db.String(100), nullable=True, index=True)
+    telephone_normalise = db.Column(db.String(20), nullable=True, index=True, unique=True)
     retouches = db.relationship('Retouche', backref='client', lazy='dynamic', cascade="all, delete-orphan")
     tickets = db.relationship('Ticket', backref='client', lazy=True)
 
+    @db.validates('nom')
+    def valider_nom(self, key, nom):
+        self.nom_recherche = normaliser_nom(nom)
+        return nom
+
+    @db.validates('numero_telephone')
+    def valider_numero_telephone(self, key, numero_telephone):
+        self.telephone_normalise = normaliser_telephone(numero_telephone)
+        return numero_telephone
+
     def __repr__(self):
         return f'<Client {self.nom} - {self.numero_telephone}>'
     
 class Retouche(db.Model):
-    client_id = db.Column(db.Integer, db.ForeignKey('client.id'), nullable=False)
+    client_id = db.Column(db.Integer, db.ForeignKey('client.id'), nullable=False, index=True)
     ticket_id = db.Column(db.Integer, db.ForeignKey('ticket.id'), nullable=False)
     id = db.Column(db.Integer, primary_key=True)
     prix = db.Column(db.Float, nullable=True)
     description = db.Column(db.Text, nullable=True)
     statut = db.Column(db.String(20), default='En cours')
+    date_terminee = db.Column(db.DateTime, nullable=True, index=True)  # Passage à 'Terminée', pour le délai de réalisation
     essayage_boutique = db.Column(db.Boolean, default=False)
     detail_retouche_id = db.Column(db.Integer, db.ForeignKey('detail_retouche.id'), nullable=True)
     detail = db.relationship('DetailRetouche', backref='retouches')
 
+    __table_args__ = (
+        db.Index('ix_retouche_ticket_statut', 'ticket_id', 'statut'),
+    )
+
+    @db.validates('statut')
+    def valider_statut(self, key, statut):
+        if statut == 'Terminée' and self.statut != 'Terminée':
+            self.date_terminee = datetime.utcnow()
+        elif statut != 'Terminée':
+            self.date_terminee = None
+        return statut
+
     def __repr__(self):
         return f'<Retouche {self.id} pour ticket {self.ticket_id}>'
 
 # --- MODÈLE TICKET ---
 class Ticket(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    client_id = db.Column(db.Integer, db.ForeignKey('client.id'), nullable=False)
-    date_creation = db.Column(db.DateTime, default=datetime.utcnow)
-    date_echeance = db.Column(db.Date, nullable=True)
+    client_id = db.Column(db.Integer, db.ForeignKey('client.id'), nullable=False, index=True)
+    date_creation = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    date_echeance = db.Column(db.Date, nullable=True, index=True)
     statut = db.Column(db.String(20), default='En cours')
     commentaire = db.Column(db.Text, nullable=True)
     paye = db.Column(db.Boolean, default=False, nullable=False)
+    date_modification = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+    # Totaux tenus à jour à chaque changement de retouche (voir synchroniser_totaux_tickets),
+    # au taux de TVA en vigueur à la création du ticket
+    taux_tva = db.Column(db.Float, default=lambda: app.config['TVA_RATE'], nullable=False)
+    total_ht = db.Column(db.Float, default=0.0, nullable=False)
+    montant_tva = db.Column(db.Float, default=0.0, nullable=False)
+    total_ttc = db.Column(db.Float, default=0.0, nullable=False)
     retouches = db.relationship('Retouche', backref='ticket', cascade="all, delete-orphan")
 
     def __repr__(self):
         return f'<Ticket {self.id} pour client {self.client_id}>'
 
+@event.listens_for(db.session, 'after_flush')
+def marquer_tickets_modifies(session, flush_context):
+    """Met à jour Ticket.date_modification quand une de ses retouches est créée, modifiée ou supprimée"""
+    ticket_ids = {
+        obj.ticket_id
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted)
+        if isinstance(obj, Retouche) and obj.ticket_id
+        and (obj not in session.dirty or session.is_modified(obj))
+    }
+    if ticket_ids:
+        session.connection().execute(
+            Ticket.__table__.update()
+            .where(Ticket.__table__.c.id.in_(ticket_ids))
+            .values(date_modification=datetime.utcnow())
+        )
+
+
+# --- RÉSUMÉ MATÉRIALISÉ DU CALENDRIER DES RETOUCHES ---
+class ChargeJournaliere(db.Model):
+    """Une ligne par (date d'échéance, client) : nombre de retouches et quantités par prestation"""
+    id = db.Column(db.Integer, primary_key=True)
+    date = db.Column(db.Date, nullable=False)
+    client_id = db.Column(db.Integer, db.ForeignKey('client.id'), nullable=False)
+    ticket_id = db.Column(db.Integer, nullable=True)  # Premier ticket du jour pour ce client
+    nb_retouches = db.Column(db.Integer, default=0, nullable=False)
+    nb_en_cours = db.Column(db.Integer, default=0, nullable=False)
+    prestations = db.Column(db.Text, nullable=True)  # JSON : {detail_retouche_id: quantité}
+    date_modification = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    client = db.relationship('Client')
+
+    __table_args__ = (
+        db.UniqueConstraint('date', 'client_id', name='uq_charge_journaliere_date_client'),
+    )
+
+    def quantites_prestations(self):
+        return {int(detail_id): quantite for detail_id, quantite in json.loads(self.prestations or '{}').items()}
+
+    def __repr__(self):
+        return f'<ChargeJournaliere {self.date} client {self.client_id}>'
+
+def calculer_charges(connection, cles=None):
+    """
+    Recalcule depuis les tickets et retouches les lignes de ChargeJournaliere.
+    Si cles est fourni (ensemble de (date, client_id)), seules ces lignes sont calculées.
+    """
+    ticket = Ticket.__table__
+    retouche = Retouche.__table__
+    requete = db.select(
+        ticket.c.date_echeance,
+        ticket.c.client_id,
+        retouche.c.detail_retouche_id,
+        db.func.min(ticket.c.id),
+        db.func.count(retouche.c.id),
+        db.func.sum(db.case((retouche.c.statut == 'Terminée', 0), else_=1))
+    ).select_from(
+        ticket.join(retouche, retouche.c.ticket_id == ticket.c.id)
+    ).where(ticket.c.date_echeance.isnot(None))
+    if cles is not None:
+        if not cles:
+            return {}
+        requete = requete.where(db.or_(*[
+            db.and_(ticket.c.date_echeance == jour, ticket.c.client_id == client_id)
+            for jour, client_id in cles
+        ]))
+    requete = requete.group_by(ticket.c.date_echeance, ticket.c.client_id, retouche.c.detail_retouche_id)
+
+    charges = {}
+    for jour, client_id, detail_id, ticket_id, quantite, en_cours in connection.execute(requete):
+        charge = charges.setdefault((jour, client_id), {
+            'ticket_id': ticket_id, 'nb_retouches': 0, 'nb_en_cours': 0, 'prestations': {}
+        })
+        charge['ticket_id'] = min(charge['ticket_id'], ticket_id)
+        charge['nb_retouches'] += quantite
+        charge['nb_en_cours'] += en_cours or 0
+        if detail_id is not None:
+            charge['prestations'][str(detail_id)] = quantite
+    return charges
+
+def ecrire_charges(connection, cles, charges):
+    """Remplace les lignes de ChargeJournaliere des clés données ; une clé vide garde une ligne à zéro"""
+    table = ChargeJournaliere.__table__
+    maintenant = datetime.utcnow()
+    for jour, client_id in cles:
+        connection.execute(table.delete().where(table.c.date == jour, table.c.client_id == client_id))
+    lignes = []
+    for jour, client_id in cles:
+        charge = charges.get((jour, client_id), {'ticket_id': None, 'nb_retouches': 0, 'nb_en_cours': 0, 'prestations': {}})
+        lignes.append({
+            'date': jour,
+            'client_id': client_id,
+            'ticket_id': charge['ticket_id'],
+            'nb_retouches': charge['nb_retouches'],
+            'nb_en_cours': charge['nb_en_cours'],
+            'prestations': json.dumps(charge['prestations']),
+            'date_modification': maintenant
+        })
+    if lignes:
+        connection.execute(table.insert(), lignes)
+
+def reconstruire_charges():
+    """Reconstruit entièrement la table ChargeJournaliere (à lancer après une migration ou en cas de doute)"""
+    connection = db.session.connection()
+    charges = calculer_charges(connection)
+    connection.execute(ChargeJournaliere.__table__.delete())
+    ecrire_charges(connection, list(charges), charges)
+    db.session.commit()
+    return len(charges)
+
+@event.listens_for(db.session, 'after_flush')
+def maintenir_charges(session, flush_context):
+    """Recalcule les lignes de ChargeJournaliere touchées par les tickets et retouches du flush"""
+    cles = set()
+    ticket_ids = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Ticket):
+            dates = [obj.date_echeance] + list(db.inspect(obj).attrs.date_echeance.history.deleted or [])
+            clients = [obj.client_id] + list(db.inspect(obj).attrs.client_id.history.deleted or [])
+            cles.update((jour, client_id) for jour in dates for client_id in clients)
+        elif isinstance(obj, Retouche):
+            ticket_ids.add(obj.ticket_id)
+            ticket_ids.update(db.inspect(obj).attrs.ticket_id.history.deleted or [])
+    ticket_ids.discard(None)
+    connection = session.connection()
+    if ticket_ids:
+        ticket = Ticket.__table__
+        cles.update(connection.execute(
+            db.select(ticket.c.date_echeance, ticket.c.client_id).where(ticket.c.id.in_(ticket_ids))
+        ).all())
+    synchroniser_charges(cles, connection)
+
+def synchroniser_charges(cles, connection=None):
+    """Recalcule les lignes de ChargeJournaliere des clés (date, client_id) données"""
+    connection = connection or db.session.connection()
+    cles = {(jour, client_id) for jour, client_id in cles if jour is not None and client_id is not None}
+    if cles:
+        ecrire_charges(connection, cles, calculer_charges(connection, cles))
+
+# --- TOTAUX DES TICKETS ---
+@event.listens_for(db.session, 'after_flush')
+def maintenir_totaux_tickets(session, flush_context):
+    """Recalcule les totaux des tickets dont une retouche a été ajoutée, modifiée ou supprimée dans le flush"""
+    ticket_ids = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Retouche) and (obj not in session.dirty or session.is_modified(obj)):
+            ticket_ids.add(obj.ticket_id)
+            ticket_ids.update(db.inspect(obj).attrs.ticket_id.history.deleted or [])
+    ticket_ids.discard(None)
+    synchroniser_totaux_tickets(ticket_ids, session.connection())
+
+def synchroniser_totaux_tickets(ticket_ids, connection=None):
+    """Recalcule total_ht, montant_tva et total_ttc des tickets donnés, chacun à son propre taux de TVA"""
+    if not ticket_ids:
+        return
+    connection = connection or db.session.connection()
+    ticket = Ticket.__table__
+    retouche = Retouche.__table__
+    total_ht = db.select(db.func.coalesce(db.func.sum(retouche.c.prix), 0.0)).where(
+        retouche.c.ticket_id == ticket.c.id
+    ).scalar_subquery()
+    connection.execute(ticket.update().where(ticket.c.id.in_(ticket_ids)).values(
+        total_ht=total_ht,
+        montant_tva=total_ht * ticket.c.taux_tva,
+        total_ttc=total_ht * (1 + ticket.c.taux_tva),
+    ))
+
+def categories_par_prestation():
+    """Associe chaque DetailRetouche.id au nom de sa catégorie"""
+    return {d['id']: d['sous_categorie']['categorie']['nom'] for d in charger_catalogue()['details'].values()}
+
+# --- CACHE DU CATALOGUE DES PRESTATIONS ---
+class VersionDonnees(db.Model):
+    """Compteurs de version partagés entre les workers (ex: 'catalogue')"""
+    nom = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, default=0, nullable=False)
+
+class RevisionPrix(db.Model):
+    """Révision de prix appliquée au catalogue : son nom unique empêche de l'appliquer deux fois"""
+    id = db.Column(db.Integer, primary_key=True)
+    nom = db.Column(db.String(100), nullable=False, unique=True)
+    description = db.Column(db.String(200), nullable=True)
+    nb_prestations = db.Column(db.Integer, default=0, nullable=False)
+    date = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+# Copie du catalogue propre à chaque worker, rechargée quand la version en base change
+_catalogue_en_cache = {'version': None}
+
+def version_catalogue():
+    return db.session.query(VersionDonnees.version).filter_by(nom='catalogue').scalar() or 0
+
+def invalider_catalogue(connection=None):
+    """Incrémente la version du catalogue : chaque worker rechargera sa copie à la prochaine lecture"""
+    connection = connection or db.session.connection()
+    table = VersionDonnees.__table__
+    resultat = connection.execute(
+        table.update().where(table.c.nom == 'catalogue').values(version=table.c.version + 1))
+    if resultat.rowcount == 0:
+        connection.execute(table.insert().values(nom='catalogue', version=1))
+
+def charger_catalogue():
+    """
+    Catalogue Categorie -> SousCategorie -> DetailRetouche sous forme de dictionnaires.
+    Lu en cache ; une seule requête (la version) tant que le catalogue n'a pas changé.
+    """
+    global _catalogue_en_cache
+    version = version_catalogue()
+    if _catalogue_en_cache['version'] == version:
+        return _catalogue_en_cache
+
+    categories = {c.id: {'id': c.id, 'nom': c.nom, 'sous_categories': []}
+                  for c in Categorie.query.order_by(Categorie.id)}
+    sous_categories = {}
+    for sc in SousCategorie.query.order_by(SousCategorie.id):
+        sous_categories[sc.id] = {'id': sc.id, 'nom': sc.nom, 'categorie_id': sc.categorie_id,
+                                  'categorie': categories[sc.categorie_id], 'details_retouches': []}
+        categories[sc.categorie_id]['sous_categories'].append(sous_categories[sc.id])
+    details = {}
+    for d_id, nom, prix, sc_id in db.session.query(
+            DetailRetouche.id, DetailRetouche.nom, DetailRetouche.prix, DetailRetouche.sous_categorie_id
+    ).order_by(DetailRetouche.id):
+        details[d_id] = {'id': d_id, 'nom': nom, 'prix': prix, 'sous_categorie_id': sc_id,
+                         'sous_categorie': sous_categories[sc_id], 'fournitures': []}
+        sous_categories[sc_id]['details_retouches'].append(details[d_id])
+    for d_id, f_id in db.session.execute(db.select(
+            retouche_fournitures.c.detail_retouche_id, retouche_fournitures.c.fourniture_id)):
+        details[d_id]['fournitures'].append(f_id)
+
+    _catalogue_en_cache = {
+        'version': version,
+        'categories': list(categories.values()),
+        'sous_categories': sous_categories,
+        'details': details
+    }
+    return _catalogue_en_cache
+
+@event.listens_for(db.session, 'after_flush')
+def surveiller_catalogue(session, flush_context):
+    """Toute écriture sur le catalogue (paramètres, prix, fournitures liées) invalide le cache"""
+    if any(isinstance(obj, (Categorie, SousCategorie, DetailRetouche))
+           for obj in list(session.new) + list(session.dirty) + list(session.deleted)):
+        invalider_catalogue(session.connection())
+
+def arbre_catalogue():
+    """Arbre compact catégorie -> sous-catégorie -> prestation (avec fournitures), calculé une fois par version"""
+    catalogue = charger_catalogue()
+    if 'arbre' not in catalogue:
+        catalogue['arbre'] = {
+            'version': catalogue['version'],
+            'categories': [{
+                'id': cat['id'],
+                'nom': cat['nom'],
+                'sous_categories': [{
+                    'id': sc['id'],
+                    'nom': sc['nom'],
+                    'prestations': [
+                        {'id': d['id'], 'nom': d['nom'], 'prix': d['prix'], 'fournitures': d['fournitures']}
+                        for d in sc['details_retouches']
+                    ]
+                } for sc in cat['sous_categories']]
+            } for cat in catalogue['categories']]
+        }
+    return catalogue['arbre']
+
+def reponse_catalogue(donnees, version):
+    """Réponse JSON avec ETag (version du catalogue) pour que le navigateur garde sa copie"""
+    response = jsonify(donnees)
+    response.set_etag(f"catalogue-{version}")
+    response.cache_control.private = True
+    response.cache_control.max_age = 60
+    return response.make_conditional(request)
+
+def reviser_prix(nom, coefficients, ajout=0.0, description=None, simulation=False):
+    """
+    Applique prix = arrondi(prix * coefficient + ajout, 2) aux prestations qui ont un prix,
+    en une requête UPDATE par catégorie ({categorie_id: coefficient}), puis invalide le catalogue.
+    La révision est enregistrée sous son nom : la relancer lève une ValueError.
+    Renvoie {categorie_id: (nb_prestations, total_avant, total_apres)} ; en simulation rien n'est écrit.
+    """
+    connection = db.session.connection()
+    revision = RevisionPrix.__table__
+    deja = connection.execute(db.select(revision.c.date).where(revision.c.nom == nom)).scalar()
+    if deja:
+        raise ValueError(f"La révision « {nom} » a déjà été appliquée le {deja:%d/%m/%Y à %H:%M}.")
+    if not coefficients:
+        return {}
+
+    detail = DetailRetouche.__table__
+    sous_categorie = SousCategorie.__table__
+    a_reviser = db.and_(detail.c.prix.isnot(None), detail.c.prix > 0)
+    def nouveau_prix(coefficient):
+        return db.func.round(db.cast(detail.c.prix * coefficient + ajout, db.Numeric()), 2)
+
+    resume = {categorie_id: (nb, avant, apres) for categorie_id, nb, avant, apres in connection.execute(
+        db.select(
+            sous_categorie.c.categorie_id,
+            db.func.count(detail.c.id),
+            db.func.sum(detail.c.prix),
+            db.func.sum(nouveau_prix(db.case(coefficients, value=sous_categorie.c.categorie_id))),
+        )
+        .select_from(detail.join(sous_categorie, detail.c.sous_categorie_id == sous_categorie.c.id))
+        .where(a_reviser, sous_categorie.c.categorie_id.in_(coefficients))
+        .group_by(sous_categorie.c.categorie_id)
+    )}
+    if simulation:
+        return resume
+
+    connection.execute(revision.insert().values(
+        nom=nom, description=description, nb_prestations=sum(r[0] for r in resume.values()), date=datetime.utcnow()
+    ))
+    connection.execute(
+        detail.update()
+        .where(a_reviser, detail.c.sous_categorie_id.in_(
+            db.select(sous_categorie.c.id).where(sous_categorie.c.categorie_id == db.bindparam('categorie'))
+        ))
+        .values(prix=nouveau_prix(db.bindparam('coefficient', type_=db.Float))),
+        [{'categorie': categorie_id, 'coefficient': coefficient} for categorie_id, coefficient in coefficients.items()]
+    )
+    invalider_catalogue(connection)
+    return resume
+
+# --- MOUVEMENTS DE STOCK ---
+# Le stock n'est jamais lu puis réécrit en Python : chaque variation est appliquée par la base
+# (quantite = quantite + delta), ce qui reste exact avec plusieurs workers qui vendent en même temps.
+# Chaque variation appliquée est inscrite dans le journal MouvementStock, dans la même transaction.
+
+def verrouiller_fournitures(connection, fourniture_ids):
+    """Sur PostgreSQL, verrouille les lignes dans l'ordre des ids : deux ventes concurrentes ne peuvent pas s'interbloquer"""
+    if connection.dialect.name == 'postgresql' and fourniture_ids:
+        fourniture = Fourniture.__table__
+        connection.execute(
+            db.select(fourniture.c.id).where(fourniture.c.id.in_(sorted(fourniture_ids)))
+            .order_by(fourniture.c.id).with_for_update()
+        ).all()
+
+def journaliser_stock(connection, type_mouvement, delta, condition, parametres, ticket_id=None, commentaire=None):
+    """Inscrit un mouvement par fourniture existante qui remplit la condition, avant la mise à jour du solde"""
+    fourniture = Fourniture.__table__
+    mouvement = MouvementStock.__table__
+    selection = db.select(
+        fourniture.c.id,
+        db.literal(type_mouvement, db.String),
+        delta,
+        db.literal(datetime.utcnow(), db.DateTime),
+        db.literal(ticket_id, db.Integer),
+        db.literal(commentaire, db.String),
+    ).where(fourniture.c.id == db.bindparam('f_id'), condition)
+    connection.execute(mouvement.insert().from_select(
+        ['fourniture_id', 'type', 'delta', 'date', 'ticket_id', 'commentaire'], selection
+    ), parametres)
+
+def mouvementer_stock(variations, type_mouvement, connection=None, sans_negatif=False, ticket_id=None, commentaire=None):
+    """
+    Applique les variations {fourniture_id: delta} en deux requêtes groupées (journal puis solde).
+    Avec sans_negatif, une sortie n'est appliquée que si le stock la couvre (sinon la ligne reste inchangée).
+    """
+    connection = connection or db.session.connection()
+    parametres = [{'f_id': f_id, 'delta': delta} for f_id, delta in sorted(variations.items()) if delta]
+    if not parametres:
+        return
+    verrouiller_fournitures(connection, [p['f_id'] for p in parametres])
+    fourniture = Fourniture.__table__
+    stock = db.func.coalesce(fourniture.c.quantite, 0)
+    delta = db.bindparam('delta', type_=db.Integer)
+    condition = db.or_(delta >= 0, stock + delta >= 0) if sans_negatif else db.true()
+    journaliser_stock(connection, type_mouvement, delta, condition, parametres, ticket_id, commentaire)
+    connection.execute(
+        fourniture.update().where(fourniture.c.id == db.bindparam('f_id'), condition).values(quantite=stock + delta),
+        parametres
+    )
+
+def fixer_stock(quantites, type_mouvement, connection=None, commentaire=None):
+    """
+    Ramène chaque fourniture à la quantité donnée {fourniture_id: quantite} (inventaire, import) :
+    l'écart avec le solde courant est inscrit au journal, calculé par la base.
+    """
+    connection = connection or db.session.connection()
+    parametres = [{'f_id': f_id, 'quantite': quantite} for f_id, quantite in sorted(quantites.items())
+                  if quantite is not None]
+    if not parametres:
+        return
+    verrouiller_fournitures(connection, [p['f_id'] for p in parametres])
+    fourniture = Fourniture.__table__
+    stock = db.func.coalesce(fourniture.c.quantite, 0)
+    quantite = db.bindparam('quantite', type_=db.Integer)
+    journaliser_stock(connection, type_mouvement, quantite - stock, stock != quantite, parametres,
+                      commentaire=commentaire)
+    connection.execute(
+        fourniture.update().where(fourniture.c.id == db.bindparam('f_id')).values(quantite=quantite),
+        parametres
+    )
+
+def annuler_vente(ticket_id, connection=None):
+    """Remet en stock ce que le ticket a consommé, d'après ses mouvements au journal (sans effet si déjà annulé)"""
+    connection = connection or db.session.connection()
+    mouvement = MouvementStock.__table__
+    soldes = connection.execute(
+        db.select(mouvement.c.fourniture_id, db.func.sum(mouvement.c.delta))
+        .where(mouvement.c.ticket_id == ticket_id, mouvement.c.type.in_(('vente', 'annulation')))
+        .group_by(mouvement.c.fourniture_id)
+    ).all()
+    mouvementer_stock({f_id: -solde for f_id, solde in soldes}, 'annulation', connection, ticket_id=ticket_id)
+
+def annuler_retouche(retouche, connection=None):
+    """
+    Remet en stock une unité de chaque fourniture de la prestation d'une retouche supprimée seule
+    (mouvement 'annulation' sur son ticket), sans rendre plus que ce que le ticket a consommé.
+    """
+    if not retouche.detail_retouche_id:
+        return
+    connection = connection or db.session.connection()
+    mouvement = MouvementStock.__table__
+    liens = retouche_fournitures
+    soldes = connection.execute(
+        db.select(liens.c.fourniture_id, db.func.coalesce(db.func.sum(mouvement.c.delta), 0))
+        .select_from(liens.outerjoin(mouvement, db.and_(
+            mouvement.c.fourniture_id == liens.c.fourniture_id,
+            mouvement.c.ticket_id == retouche.ticket_id,
+            mouvement.c.type.in_(('vente', 'annulation')),
+        )))
+        .where(liens.c.detail_retouche_id == retouche.detail_retouche_id)
+        .group_by(liens.c.fourniture_id)
+    ).all()
+    mouvementer_stock({f_id: 1 for f_id, solde in soldes if solde < 0}, 'annulation', connection,
+                      ticket_id=retouche.ticket_id)
+
+def fournitures_par_reference(references, connection=None):
+    """Lignes (id, reference, nom, couleur, quantite) des fournitures existantes, par référence"""
+    connection = connection or db.session.connection()
+    fourniture = Fourniture.__table__
+    return {ligne.reference: ligne for ligne in connection.execute(
+        db.select(fourniture.c.id, fourniture.c.reference, fourniture.c.nom, fourniture.c.couleur, fourniture.c.quantite)
+        .where(fourniture.c.reference.in_(list(references)))
+    )}
+
+def importer_fournitures(lignes, connection=None, commentaire=None):
+    """
+    Insère ou met à jour par référence un lot de fournitures {'reference', 'nom', 'couleur', 'quantite'}
+    en une requête INSERT ... ON CONFLICT, puis aligne les quantités via le journal (mouvements 'import') ;
+    quantite None garde le stock existant (une nouvelle référence commence à 0).
+    Pour une même référence, la dernière ligne du lot l'emporte ; une référence trop longue lève ValueError
+    (jamais tronquée : elle se confondrait avec une autre référence de même début).
+    """
+    connection = connection or db.session.connection()
+    lignes = list({ligne['reference']: ligne for ligne in lignes}.values())
+    if not lignes:
+        return
+    fourniture = Fourniture.__table__
+    longueur = fourniture.c.reference.type.length
+    trop_longues = [l['reference'] for l in lignes if len(l['reference']) > longueur]
+    if trop_longues:
+        raise ValueError(f"Référence(s) de plus de {longueur} caractères : {', '.join(trop_longues[:5])}")
+    dialecte = postgresql if connection.dialect.name == 'postgresql' else sqlite
+    requete = dialecte.insert(fourniture)
+    connection.execute(
+        requete.on_conflict_do_update(
+            index_elements=[fourniture.c.reference],
+            set_={'nom': requete.excluded.nom, 'couleur': requete.excluded.couleur},
+        ),
+        [{'reference': l['reference'], 'nom': l['nom'], 'couleur': l['couleur'], 'quantite': 0} for l in lignes]
+    )
+    ids = {reference: ligne.id for reference, ligne in
+           fournitures_par_reference((l['reference'] for l in lignes), connection).items()}
+    fixer_stock({ids[l['reference']]: l['quantite'] for l in lignes}, 'import', connection, commentaire=commentaire)
+
+# --- PRÉVISION DES RUPTURES DE STOCK ---
+class PrevisionStock(db.Model):
+    """Rythme de consommation récent de chaque fourniture, recalculé par calculer_previsions_stock"""
+    fourniture_id = db.Column(db.Integer, db.ForeignKey('fourniture.id'), primary_key=True)
+    consommation_jour = db.Column(db.Float, nullable=False, default=0)  # Unités consommées par jour
+    consommation_fenetre = db.Column(db.Integer, nullable=False, default=0)  # Unités consommées sur la fenêtre
+    date_calcul = db.Column(db.DateTime, nullable=False)
+    fourniture = db.relationship('Fourniture', backref=db.backref('prevision', uselist=False))
+
+def calculer_previsions_stock(connection=None):
+    """
+    Recalcule PrevisionStock depuis les retouches des PREVISION_FENETRE_JOURS derniers jours :
+    chaque retouche consomme une unité de chaque fourniture liée à sa prestation (retouche_fournitures).
+    Une seule requête groupée, puis une ligne par fourniture. Renvoie le nombre de fournitures consommées.
+    """
+    connection = connection or db.session.connection()
+    maintenant = datetime.utcnow()
+    debut = maintenant - timedelta(days=app.config['PREVISION_FENETRE_JOURS'])
+    ticket = Ticket.__table__
+    retouche = Retouche.__table__
+    # Atelier plus jeune que la fenêtre : le rythme est calculé sur les jours réellement observés
+    premier_ticket = connection.execute(db.select(db.func.min(ticket.c.date_creation))).scalar()
+    jours_observes = max((maintenant - max(premier_ticket or maintenant, debut)).days, 1)
+    consommations = dict(connection.execute(
+        db.select(retouche_fournitures.c.fourniture_id, db.func.count(retouche.c.id))
+        .select_from(retouche.join(ticket, retouche.c.ticket_id == ticket.c.id)
+                     .join(retouche_fournitures,
+                           retouche_fournitures.c.detail_retouche_id == retouche.c.detail_retouche_id))
+        .where(ticket.c.date_creation >= debut)
+        .group_by(retouche_fournitures.c.fourniture_id)
+    ).all())
+    fourniture_ids = connection.execute(db.select(Fourniture.__table__.c.id)).scalars().all()
+    table = PrevisionStock.__table__
+    connection.execute(table.delete())
+    if fourniture_ids:
+        connection.execute(table.insert(), [{
+            'fourniture_id': f_id,
+            'consommation_jour': consommations.get(f_id, 0) / jours_observes,
+            'consommation_fenetre': consommations.get(f_id, 0),
+            'date_calcul': maintenant,
+        } for f_id in fourniture_ids])
+    return len(consommations)
+
+def fournitures_avec_previsions():
+    """Fournitures triées par nom, avec leur prévision chargée dans la même requête"""
+    return Fourniture.query.options(db.joinedload(Fourniture.prevision)).order_by(Fourniture.nom).all()
+
+# --- RAPPORTS D'ACTIVITÉ ---
+# Chiffre d'affaires, payé / impayé, volume par catégorie et prestation, délai de réalisation :
+# tout est agrégé par la base, en GROUP BY sur ticket.date_creation et retouche.date_terminee (indexées).
+# Une période terminée avant aujourd'hui (UTC) ne bouge plus : ses indicateurs sont gardés dans
+# RapportPeriode et relus tels quels, seule la période en cours est recalculée à chaque affichage.
+GRANULARITES = ('jour', 'semaine', 'mois')
+
+class RapportPeriode(db.Model):
+    """Indicateurs d'une période close (jour, semaine ou mois), en JSON, calculés par calculer_indicateurs"""
+    id = db.Column(db.Integer, primary_key=True)
+    granularite = db.Column(db.String(10), nullable=False)
+    debut = db.Column(db.Date, nullable=False)
+    fin = db.Column(db.Date, nullable=False)  # Exclue
+    donnees = db.Column(db.Text, nullable=False)
+    date_calcul = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint('granularite', 'debut', name='uq_rapport_periode_granularite_debut'),
+        db.Index('ix_rapport_periode_debut_fin', 'debut', 'fin'),
+    )
+
+def bornes_periode(jour, granularite):
+    """(début, fin exclue) du jour, de la semaine (lundi) ou du mois qui contient jour"""
+    if granularite == 'jour':
+        return jour, jour + timedelta(days=1)
+    if granularite == 'semaine':
+        lundi = jour - timedelta(days=jour.weekday())
+        return lundi, lundi + timedelta(days=7)
+    premier = jour.replace(day=1)
+    return premier, (premier + timedelta(days=32)).replace(day=1)
+
+def periodes_entre(debut, fin, granularite):
+    """Débuts des périodes qui recouvrent [debut, fin["""
+    periodes = []
+    jour = bornes_periode(debut, granularite)[0]
+    while jour < fin:
+        periodes.append(jour)
+        jour = bornes_periode(jour, granularite)[1]
+    return periodes
+
+def periode_sql(colonne, granularite, dialecte):
+    """Début de période (date) d'une colonne DateTime, calculé par la base"""
+    if dialecte == 'postgresql':
+        champ = {'jour': 'day', 'semaine': 'week', 'mois': 'month'}[granularite]
+        return db.cast(db.func.date_trunc(champ, colonne), db.Date)
+    modificateurs = {'jour': (), 'semaine': ('-6 days', 'weekday 1'), 'mois': ('start of month',)}[granularite]
+    return db.type_coerce(db.func.date(colonne, *modificateurs), db.Date)
+
+def jours_entre(debut, fin, dialecte):
+    """Durée en jours (décimale) entre deux colonnes DateTime"""
+    if dialecte == 'postgresql':
+        return db.func.extract('epoch', fin - debut) / 86400.0
+    return db.func.julianday(fin) - db.func.julianday(debut)
+
+def indicateurs_vides():
+    return {
+        'nb_tickets': 0, 'total_ht': 0.0, 'total_ttc': 0.0,
+        'nb_payes': 0, 'total_paye_ttc': 0.0, 'total_impaye_ttc': 0.0,
+        'nb_retouches': 0, 'categories': {}, 'prestations': {},
+        'nb_terminees': 0, 'jours_realisation': 0.0, 'nb_terminees_en_retard': 0,
+    }
+
+def calculer_indicateurs(debut, fin, granularite, connection=None):
+    """
+    Indicateurs de chaque période qui recouvre [debut, fin[, en trois requêtes groupées :
+    tickets (chiffre d'affaires, payé / impayé), retouches par prestation, retouches terminées.
+    """
+    connection = connection or db.session.connection()
+    dialecte = connection.dialect.name
+    ticket = Ticket.__table__
+    retouche = Retouche.__table__
+    debut = bornes_periode(debut, granularite)[0]
+    debut_dt, fin_dt = datetime.combine(debut, time()), datetime.combine(fin, time())
+    indicateurs = {periode: indicateurs_vides() for periode in periodes_entre(debut, fin, granularite)}
+
+    # Chiffre d'affaires, d'après les totaux stockés sur les tickets, par date de création
+    periode = periode_sql(ticket.c.date_creation, granularite, dialecte)
+    for jour, nb, ht, ttc, nb_payes, paye_ttc in connection.execute(
+        db.select(
+            periode, db.func.count(ticket.c.id), db.func.sum(ticket.c.total_ht), db.func.sum(ticket.c.total_ttc),
+            db.func.sum(db.case((ticket.c.paye, 1), else_=0)),
+            db.func.sum(db.case((ticket.c.paye, ticket.c.total_ttc), else_=0.0)),
+        )
+        .where(ticket.c.date_creation >= debut_dt, ticket.c.date_creation < fin_dt)
+        .group_by(periode)
+    ):
+        i = indicateurs[jour]
+        i.update(nb_tickets=nb, total_ht=round(ht or 0, 2), total_ttc=round(ttc or 0, 2),
+                 nb_payes=nb_payes or 0, total_paye_ttc=round(paye_ttc or 0, 2),
+                 total_impaye_ttc=round((ttc or 0) - (paye_ttc or 0), 2))
+
+    # Volume et montant HT par catégorie et par prestation (les retouches sans prestation sont à part)
+    detail = DetailRetouche.__table__
+    sous_categorie = SousCategorie.__table__
+    categorie = Categorie.__table__
+    for jour, nom_categorie, nom_prestation, nb, montant in connection.execute(
+        db.select(periode, categorie.c.nom, detail.c.nom, db.func.count(retouche.c.id), db.func.sum(retouche.c.prix))
+        .select_from(
+            retouche.join(ticket, retouche.c.ticket_id == ticket.c.id)
+            .outerjoin(detail, retouche.c.detail_retouche_id == detail.c.id)
+            .outerjoin(sous_categorie, detail.c.sous_categorie_id == sous_categorie.c.id)
+            .outerjoin(categorie, sous_categorie.c.categorie_id == categorie.c.id)
+        )
+        .where(ticket.c.date_creation >= debut_dt, ticket.c.date_creation < fin_dt)
+        .group_by(periode, categorie.c.nom, detail.c.nom)
+    ):
+        i = indicateurs[jour]
+        nom_categorie = nom_categorie or 'Sans catégorie'
+        cle = f"{nom_categorie} / {nom_prestation or 'Retouche libre'}"
+        i['nb_retouches'] += nb
+        for volumes, nom in ((i['categories'], nom_categorie), (i['prestations'], cle)):
+            volume = volumes.setdefault(nom, {'nb': 0, 'total_ht': 0.0})
+            volume['nb'] += nb
+            volume['total_ht'] = round(volume['total_ht'] + (montant or 0), 2)
+
+    # Délai de réalisation (création du ticket -> retouche terminée), par date de fin de la retouche
+    periode_fin = periode_sql(retouche.c.date_terminee, granularite, dialecte)
+    jour_fin = periode_sql(retouche.c.date_terminee, 'jour', dialecte)
+    for jour, nb, jours, en_retard in connection.execute(
+        db.select(
+            periode_fin, db.func.count(retouche.c.id),
+            db.func.sum(jours_entre(ticket.c.date_creation, retouche.c.date_terminee, dialecte)),
+            db.func.sum(db.case((jour_fin > ticket.c.date_echeance, 1), else_=0)),
+        )
+        .select_from(retouche.join(ticket, retouche.c.ticket_id == ticket.c.id))
+        .where(retouche.c.date_terminee >= debut_dt, retouche.c.date_terminee < fin_dt)
+        .group_by(periode_fin)
+    ):
+        indicateurs[jour].update(nb_terminees=nb, jours_realisation=round(jours or 0, 3),
+                                 nb_terminees_en_retard=en_retard or 0)
+    return indicateurs
+
+def rapport_activite(debut, fin, granularite, connection=None):
+    """
+    Indicateurs par période de [debut, fin[ : les périodes closes sont lues dans RapportPeriode
+    (et calculées puis enregistrées si elles manquent), la période en cours est toujours recalculée.
+    """
+    connection = connection or db.session.connection()
+    aujourd_hui = datetime.utcnow().date()
+    periodes = periodes_entre(debut, fin, granularite)
+    if not periodes:
+        return []
+    table = RapportPeriode.__table__
+    indicateurs = {jour: json.loads(donnees) for jour, donnees in connection.execute(
+        db.select(table.c.debut, table.c.donnees)
+        .where(table.c.granularite == granularite, table.c.debut >= periodes[0], table.c.debut <= periodes[-1])
+    )}
+    manquantes = [jour for jour in periodes if jour not in indicateurs]
+    if manquantes:
+        calculees = calculer_indicateurs(manquantes[0], bornes_periode(manquantes[-1], granularite)[1],
+                                         granularite, connection)
+        closes = [jour for jour in manquantes if bornes_periode(jour, granularite)[1] <= aujourd_hui]
+        if closes:
+            # Deux workers peuvent calculer la même période : le premier enregistré l'emporte
+            dialecte = postgresql if connection.dialect.name == 'postgresql' else sqlite
+            maintenant = datetime.utcnow()
+            connection.execute(dialecte.insert(table).on_conflict_do_nothing(), [{
+                'granularite': granularite, 'debut': jour, 'fin': bornes_periode(jour, granularite)[1],
+                'donnees': json.dumps(calculees[jour]), 'date_calcul': maintenant,
+            } for jour in closes])
+        indicateurs.update((jour, calculees[jour]) for jour in manquantes)
+    return [dict(indicateurs[jour], debut=jour, fin=bornes_periode(jour, granularite)[1]) for jour in periodes]
+
+def totaliser_rapport(periodes):
+    """Cumul des périodes d'un rapport, avec les délais moyens et les volumes triés du plus grand au plus petit"""
+    total = indicateurs_vides()
+    for p in periodes:
+        for cle in ('nb_tickets', 'nb_payes', 'nb_retouches', 'nb_terminees', 'nb_terminees_en_retard'):
+            total[cle] += p[cle]
+        for cle in ('total_ht', 'total_ttc', 'total_paye_ttc', 'total_impaye_ttc', 'jours_realisation'):
+            total[cle] = round(total[cle] + p[cle], 3)
+        for cle in ('categories', 'prestations'):
+            for nom, volume in p[cle].items():
+                cumul = total[cle].setdefault(nom, {'nb': 0, 'total_ht': 0.0})
+                cumul['nb'] += volume['nb']
+                cumul['total_ht'] = round(cumul['total_ht'] + volume['total_ht'], 2)
+    for cle in ('categories', 'prestations'):
+        total[cle] = dict(sorted(total[cle].items(), key=lambda v: v[1]['nb'], reverse=True))
+    for p in list(periodes) + [total]:
+        p['delai_moyen_jours'] = round(p['jours_realisation'] / p['nb_terminees'], 1) if p['nb_terminees'] else None
+    return total
+
+def retouches_en_retard(connection=None):
+    """Retouches non terminées dont l'échéance est passée, et le nombre de tickets concernés (toujours en direct)"""
+    connection = connection or db.session.connection()
+    ticket = Ticket.__table__
+    retouche = Retouche.__table__
+    nb_retouches, nb_tickets = connection.execute(
+        db.select(db.func.count(retouche.c.id), db.func.count(db.distinct(ticket.c.id)))
+        .select_from(retouche.join(ticket, retouche.c.ticket_id == ticket.c.id))
+        .where(ticket.c.date_echeance < date.today(), retouche.c.statut != 'Terminée')
+    ).one()
+    return {'nb_retouches': nb_retouches, 'nb_tickets': nb_tickets}
+
+@event.listens_for(db.session, 'after_flush')
+def invalider_rapports(session, flush_context):
+    """Efface les rapports en cache des périodes closes touchées par un ticket ou une retouche modifié"""
+    instants = set()
+    ticket_ids = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if obj in session.dirty and not session.is_modified(obj):
+            continue
+        if isinstance(obj, Ticket) and obj not in session.new:
+            instants.add(obj.date_creation)
+        elif isinstance(obj, Retouche):
+            ticket_ids.add(obj.ticket_id)
+            ticket_ids.update(db.inspect(obj).attrs.ticket_id.history.deleted or [])
+            instants.add(obj.date_terminee)
+            instants.update(db.inspect(obj).attrs.date_terminee.history.deleted or [])
+    ticket_ids.discard(None)
+    connection = session.connection()
+    if ticket_ids:
+        ticket = Ticket.__table__
+        instants.update(connection.execute(
+            db.select(ticket.c.date_creation).where(ticket.c.id.in_(ticket_ids))
+        ).scalars())
+    aujourd_hui = datetime.utcnow().date()
+    jours = {instant.date() for instant in instants if instant is not None and instant.date() < aujourd_hui}
+    if jours:
+        table = RapportPeriode.__table__
+        connection.execute(table.delete().where(
+            db.or_(*(db.and_(table.c.debut <= jour, table.c.fin > jour) for jour in jours))))
+
+# --- EXPORT COMPTABLE ---
+# Tous les tickets d'une période avec leurs lignes (HT, TVA, TTC), pour le comptable.
+# Les lignes sont lues par paquets (yield_per : curseur côté serveur sous PostgreSQL) et écrites
+# en CSV par morceaux : la mémoire reste constante quelle que soit la longueur de l'export.
+FORMATS_EXPORT = ('excel', 'csv')
+DEBUTS_FORMULE = ('=', '+', '-', '@', '\t', '\r')  # Texte qu'un tableur exécuterait comme une formule
+LIGNES_PAR_MORCEAU = 500
+
+ENTETES_EXPORT = ('Ticket', 'Date', 'Échéance', 'Client', 'Payé', 'Catégorie', 'Prestation', 'Description',
+                  'HT', 'Taux TVA (%)', 'TVA', 'TTC', 'Total ticket HT', 'Total ticket TVA', 'Total ticket TTC')
+
+def lignes_export_comptable(debut, fin, connection=None):
+    """
+    Une ligne par retouche des tickets créés entre debut et fin (exclue), triée par date puis ticket ;
+    un ticket sans retouche garde une ligne vide. TVA et TTC de la ligne au taux du ticket.
+    """
+    connection = connection or db.session.connection()
+    ticket = Ticket.__table__
+    retouche = Retouche.__table__
+    client = Client.__table__
+    detail = DetailRetouche.__table__
+    sous_categorie = SousCategorie.__table__
+    categorie = Categorie.__table__
+    requete = (
+        db.select(
+            ticket.c.id, ticket.c.date_creation, ticket.c.date_echeance, client.c.nom, ticket.c.paye,
+            categorie.c.nom, detail.c.nom, retouche.c.description, retouche.c.id, retouche.c.prix,
+            ticket.c.taux_tva, ticket.c.total_ht, ticket.c.montant_tva, ticket.c.total_ttc,
+        )
+        .select_from(
+            ticket.join(client, ticket.c.client_id == client.c.id)
+            .outerjoin(retouche, retouche.c.ticket_id == ticket.c.id)
+            .outerjoin(detail, retouche.c.detail_retouche_id == detail.c.id)
+            .outerjoin(sous_categorie, detail.c.sous_categorie_id == sous_categorie.c.id)
+            .outerjoin(categorie, sous_categorie.c.categorie_id == categorie.c.id)
+        )
+        .where(ticket.c.date_creation >= datetime.combine(debut, time()),
+               ticket.c.date_creation < datetime.combine(fin, time()))
+        .order_by(ticket.c.date_creation, ticket.c.id, retouche.c.id)
+        .execution_options(yield_per=LIGNES_PAR_MORCEAU)
+    )
+    for (ticket_id, creation, echeance, nom_client, paye, nom_categorie, nom_prestation, description,
+         retouche_id, prix, taux_tva, total_ht, montant_tva, total_ttc) in connection.execute(requete):
+        ht = (prix or 0.0) if retouche_id else None
+        tva = round(ht * taux_tva, 2) if ht is not None else None
+        yield (ticket_id, creation, echeance, nom_client, paye, nom_categorie, nom_prestation, description,
+               ht, taux_tva * 100, tva, round(ht + tva, 2) if ht is not None else None,
+               total_ht, montant_tva, total_ttc)
+
+def export_comptable_csv(debut, fin, format_export='excel', connection=None):
+    """
+    Produit l'export en morceaux de texte CSV. 'excel' : séparateur ';', virgule décimale, dates JJ/MM/AAAA
+    et BOM UTF-8 pour qu'Excel ouvre le fichier tel quel ; 'csv' : séparateur ',', point décimal, dates ISO.
+    Dans les deux formats, un texte saisi (client, prestation, description) qui commence comme une formule
+    est précédé d'une apostrophe, pour qu'un tableur l'affiche au lieu de l'exécuter.
+    """
+    excel = format_export == 'excel'
+
+    def texte(valeur):
+        if not valeur:
+            return ''
+        return "'" + valeur if valeur.startswith(DEBUTS_FORMULE) else valeur
+
+    def montant(valeur):
+        if valeur is None:
+            return ''
+        texte = f"{valeur:.2f}"
+        return texte.replace('.', ',') if excel else texte
+
+    def jour(valeur):
+        if valeur is None:
+            return ''
+        return valeur.strftime('%d/%m/%Y') if excel else valeur.strftime('%Y-%m-%d')
+
+    tampon = io.StringIO()
+    writer = csv.writer(tampon, delimiter=';' if excel else ',')
+    if excel:
+        tampon.write('\ufeff')
+    writer.writerow(ENTETES_EXPORT)
+    for n, (ticket_id, creation, echeance, nom_client, paye, nom_categorie, nom_prestation, description,
+            ht, taux, tva, ttc, total_ht, montant_tva, total_ttc) in enumerate(
+            lignes_export_comptable(debut, fin, connection), 1):
+        writer.writerow((
+            ticket_id, jour(creation), jour(echeance), texte(nom_client), 'oui' if paye else 'non',
+            texte(nom_categorie), texte(nom_prestation), texte(description),
+            montant(ht), montant(taux), montant(tva), montant(ttc),
+            montant(total_ht), montant(montant_tva), montant(total_ttc),
+        ))
+        if n % LIGNES_PAR_MORCEAU == 0:
+            yield tampon.getvalue()
+            tampon.seek(0)
+            tampon.truncate()
+    yield tampon.getvalue()
 
 # --- CRÉATION INITIALE DE LA BASE DE DONNÉES ---
 
 # --- FONCTIONS HELPER ---
 
-def generer_lien_sms(numero_telephone, message):
-    """Génère un lien SMS compatible avec les applications SMS"""
+def normaliser_nom(nom):
+    """Met un nom en minuscules sans accents pour la recherche par préfixe"""
+    if not nom:
+        return None
+    sans_accents = unicodedata.normalize('NFKD', nom).encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(sans_accents.lower().split())
+
+def normaliser_telephone(numero_telephone):
+    """Ramène un numéro (même partiel) au format international : '06 12 ...' -> '+33612...'"""
     if not numero_telephone:
         return None
-    
-    # Nettoyer le numéro (enlever les espaces et caractères spéciaux)
-    numero_clean = ''.join(filter(str.isdigit, numero_telephone))
-    
-    # Formatter le numéro pour les liens SMS
-    if numero_clean.startswith('33'):
-        numero_sms = '+' + numero_clean
-    elif numero_clean.startswith('0'):
-        numero_sms = '+33' + numero_clean[1:]
-    else:
-        numero_sms = numero_clean  # Garder le numéro tel quel si format inconnu
+    chiffres = ''.join(filter(str.isdigit, numero_telephone))
+    if not chiffres:
+        return None
+    if numero_telephone.strip().startswith('+'):
+        return '+' + chiffres
+    if chiffres.startswith('00'):
+        return '+' + chiffres[2:]
+    if chiffres.startswith('33'):
+        return '+' + chiffres
+    if chiffres.startswith('0'):
+        return '+33' + chiffres[1:]
+    return chiffres  # Format inconnu : on garde les chiffres tels quels
+
+def filtre_prefixe(colonne, prefixe):
+    """Condition 'commence par' exprimée en plage, pour profiter de l'index de la colonne"""
+    return db.and_(colonne >= prefixe, colonne < prefixe + '\uffff')
+
+def generer_lien_sms(telephone_normalise, message):
+    """Génère un lien SMS compatible avec les applications SMS à partir de Client.telephone_normalise"""
+    if not telephone_normalise:
+        return None
     
     # Encoder le message pour l'URL (plus conservateur)
     message_encode = urllib.parse.quote_plus(message)
     
     # Essayer différents formats de lien SMS selon le navigateur/OS
     # Format Android/Chrome
-    lien_sms = f"sms:{numero_sms}?body={message_encode}"
+    lien_sms = f"sms:{telephone_normalise}?body={message_encode}"
     
     return lien_sms
 
-def generer_liens_sms_multiples(numero_telephone, message):
+def generer_liens_sms_multiples(telephone_normalise, message):
     """Génère plusieurs formats de liens SMS pour compatibilité"""
-    if not numero_telephone:
+    if not telephone_normalise:
         return {}
     
-    numero_clean = ''.join(filter(str.isdigit, numero_telephone))
-    
-    if numero_clean.startswith('33'):
-        numero_international = '+' + numero_clean
-        numero_national = '0' + numero_clean[2:]
-    elif numero_clean.startswith('0'):
-        numero_international = '+33' + numero_clean[1:]
-        numero_national = numero_clean
+    numero_international = telephone_normalise
+    if telephone_normalise.startswith('+33'):
+        numero_national = '0' + telephone_normalise[3:]
     else:
-        numero_international = numero_clean
-        numero_national = numero_clean
+        numero_national = telephone_normalise
     
     message_encode = urllib.parse.quote_plus(message)
     
@@ -177,6 +1155,285 @@ def generer_liens_sms_multiples(numero_telephone, message):
         'numero_display': numero_national
     }
 
+def fusionner_clients_doublons(simulation=False):
+    """
+    Fusionne les clients qui partagent le même numéro normalisé : on garde le plus ancien,
+    on y rattache tickets et retouches des doublons, puis on supprime les doublons.
+    Renvoie la liste des groupes [(client_conserve_id, [doublons_ids])].
+    """
+    doublons = db.session.query(Client.telephone_normalise).filter(
+        Client.telephone_normalise.isnot(None)
+    ).group_by(Client.telephone_normalise).having(db.func.count(Client.id) > 1).subquery()
+    lignes = db.session.query(Client.telephone_normalise, Client.id).join(
+        doublons, Client.telephone_normalise == doublons.c.telephone_normalise
+    ).order_by(Client.telephone_normalise, Client.id).all()
+
+    groupes = {}
+    for telephone, client_id in lignes:
+        groupes.setdefault(telephone, []).append(client_id)
+    fusions = [(ids[0], ids[1:]) for ids in groupes.values()]
+    if simulation or not fusions:
+        return fusions
+
+    conserve_par_ancien = {ancien: conserve for conserve, anciens in fusions for ancien in anciens}
+    connection = db.session.connection()
+    ticket = Ticket.__table__
+    charge = ChargeJournaliere.__table__
+    # Jours du calendrier à recalculer pour les clients conservés
+    cles = {(jour, conserve_par_ancien[ancien]) for jour, ancien in connection.execute(
+        db.select(ticket.c.date_echeance, ticket.c.client_id).where(ticket.c.client_id.in_(conserve_par_ancien))
+    )}
+    for table in (Retouche.__table__, ticket):
+        connection.execute(
+            table.update().where(table.c.client_id == db.bindparam('ancien')).values(client_id=db.bindparam('conserve')),
+            [{'ancien': ancien, 'conserve': conserve} for ancien, conserve in conserve_par_ancien.items()]
+        )
+    connection.execute(charge.delete().where(charge.c.client_id.in_(conserve_par_ancien)))
+    connection.execute(Client.__table__.delete().where(Client.__table__.c.id.in_(conserve_par_ancien)))
+    synchroniser_charges(cles, connection)
+    db.session.commit()
+    return fusions
+
+def fusionner_fournitures_doublons(simulation=False):
+    """
+    Fusionne les fournitures qui partagent la même référence : on garde la plus ancienne avec sa quantité,
+    on y rattache les prestations et le journal des doublons, puis on supprime les doublons.
+    Le stock des doublons est d'abord ramené à zéro par un mouvement 'ajustement'.
+    Renvoie la liste des groupes [(fourniture_conservee_id, [doublons_ids])].
+    """
+    doublons = db.session.query(Fourniture.reference).filter(
+        Fourniture.reference.isnot(None), Fourniture.reference != ''
+    ).group_by(Fourniture.reference).having(db.func.count(Fourniture.id) > 1).subquery()
+    lignes = db.session.query(Fourniture.reference, Fourniture.id).join(
+        doublons, Fourniture.reference == doublons.c.reference
+    ).order_by(Fourniture.reference, Fourniture.id).all()
+
+    groupes = {}
+    for reference, fourniture_id in lignes:
+        groupes.setdefault(reference, []).append(fourniture_id)
+    fusions = [(ids[0], ids[1:]) for ids in groupes.values()]
+    if simulation or not fusions:
+        return fusions
+
+    conserve_par_ancien = {ancien: conserve for conserve, anciens in fusions for ancien in anciens}
+    connection = db.session.connection()
+    fixer_stock({ancien: 0 for ancien in conserve_par_ancien}, 'ajustement', connection,
+                commentaire="Fusion des doublons de référence")
+    # Prestations liées : un lien déjà présent sur la fourniture conservée n'est pas recopié
+    liens = retouche_fournitures
+    existants = set(connection.execute(
+        db.select(liens.c.detail_retouche_id, liens.c.fourniture_id)
+        .where(liens.c.fourniture_id.in_(set(conserve_par_ancien) | set(conserve_par_ancien.values())))
+    ).all())
+    nouveaux = {(detail_id, conserve_par_ancien[f_id]) for detail_id, f_id in existants if f_id in conserve_par_ancien}
+    nouveaux -= existants
+    connection.execute(liens.delete().where(liens.c.fourniture_id.in_(conserve_par_ancien)))
+    if nouveaux:
+        connection.execute(liens.insert(), [
+            {'detail_retouche_id': detail_id, 'fourniture_id': f_id} for detail_id, f_id in sorted(nouveaux)
+        ])
+    mouvement = MouvementStock.__table__
+    connection.execute(
+        mouvement.update().where(mouvement.c.fourniture_id == db.bindparam('ancien'))
+        .values(fourniture_id=db.bindparam('conserve')),
+        [{'ancien': ancien, 'conserve': conserve} for ancien, conserve in conserve_par_ancien.items()]
+    )
+    # Lancé avant 'flask db upgrade' (voir DEPLOYMENT.md), la table des prévisions n'existe pas encore
+    prevision = PrevisionStock.__table__
+    if db.inspect(connection).has_table(prevision.name):
+        connection.execute(prevision.delete().where(prevision.c.fourniture_id.in_(conserve_par_ancien)))
+    connection.execute(Fourniture.__table__.delete().where(Fourniture.__table__.c.id.in_(conserve_par_ancien)))
+    invalider_catalogue(connection)
+    db.session.commit()
+    return fusions
+
+def retirer_presences(employe_id, debut, fin):
+    """Retire les jours [debut, fin] des présences de l'employé : les périodes qui
+    chevauchent sont raccourcies, coupées en deux ou supprimées"""
+    chevauchantes = PresenceEmploye.query.filter(
+        PresenceEmploye.employe_id == employe_id,
+        PresenceEmploye.date_debut <= fin,
+        PresenceEmploye.date_fin >= debut,
+    ).all()
+    for presence in chevauchantes:
+        if presence.date_debut < debut and presence.date_fin > fin:
+            # La période englobe les jours retirés : on garde la partie après dans une nouvelle ligne
+            db.session.add(PresenceEmploye(employe_id=presence.employe_id, date_debut=fin + timedelta(days=1),
+                                           date_fin=presence.date_fin, present=presence.present))
+            presence.date_fin = debut - timedelta(days=1)
+        elif presence.date_debut < debut:
+            presence.date_fin = debut - timedelta(days=1)
+        elif presence.date_fin > fin:
+            presence.date_debut = fin + timedelta(days=1)
+        else:
+            db.session.delete(presence)
+
+def ajouter_presence(employe_id, debut, fin):
+    """Enregistre la présence de l'employé sur [debut, fin] et la fusionne avec les périodes voisines"""
+    retirer_presences(employe_id, debut, fin)
+    db.session.flush()
+    # Après le retrait, seules les périodes qui touchent [debut, fin] peuvent encore la jouxter
+    voisines = PresenceEmploye.query.filter(
+        PresenceEmploye.employe_id == employe_id,
+        PresenceEmploye.present.is_(True),
+        PresenceEmploye.date_debut <= fin + timedelta(days=1),
+        PresenceEmploye.date_fin >= debut - timedelta(days=1),
+    ).all()
+    for voisine in voisines:
+        debut = min(debut, voisine.date_debut)
+        fin = max(fin, voisine.date_fin)
+        db.session.delete(voisine)
+    presence = PresenceEmploye(employe_id=employe_id, date_debut=debut, date_fin=fin, present=True)
+    db.session.add(presence)
+    return presence
+
+def lire_date_iso(valeur):
+    """Convertit une date ISO envoyée par FullCalendar (ex: '2025-09-29T00:00:00+02:00') en date"""
+    if not valeur:
+        return None
+    try:
+        return date.fromisoformat(valeur[:10])
+    except ValueError:
+        return None
+
+def plage_calendrier():
+    """Retourne la plage (debut, fin) demandée par FullCalendar, la fin étant exclusive"""
+    return lire_date_iso(request.args.get('start')), lire_date_iso(request.args.get('end'))
+
+def filtre_plage(requete, colonne_debut, colonne_fin=None, plage=None):
+    """Limite la requête à la plage (debut, fin exclusive), par défaut la plage visible de FullCalendar.
+    Pour une période, colonne_fin est sa dernière date incluse ; sinon colonne_debut est la date de l'élément"""
+    debut, fin = plage if plage is not None else plage_calendrier()
+    if debut:
+        requete = requete.filter((colonne_fin if colonne_fin is not None else colonne_debut) >= debut)
+    if fin:
+        requete = requete.filter(colonne_debut < fin)
+    return requete
+
+def periodes_avec_employe(modele, employe_id=None, plage=None):
+    """Présences ou congés (selon modele) de la plage, avec le nom et la couleur de l'employé,
+    en une seule requête : renvoie des tuples (periode, nom, couleur)"""
+    requete = db.session.query(modele, Employe.nom, Employe.couleur).join(Employe, modele.employe_id == Employe.id)
+    if modele is PresenceEmploye:
+        requete = requete.filter(PresenceEmploye.present.is_(True))
+    if employe_id:
+        requete = requete.filter(modele.employe_id == employe_id)
+    return filtre_plage(requete, modele.date_debut, modele.date_fin, plage).order_by(Employe.nom, modele.date_debut)
+
+def evenement_periode(debut, fin, titre, couleur, **proprietes):
+    """Événement FullCalendar sur des journées entières, du jour debut au jour fin inclus
+    (FullCalendar attend une fin exclusive)"""
+    return {
+        'title': titre,
+        'start': debut.isoformat(),
+        'end': (fin + timedelta(days=1)).isoformat(),
+        'color': couleur,
+        **proprietes
+    }
+
+# --- SHIFTS PONCTUELS ET RÉCURRENTS ---
+# Occurrence d'un shift pour l'affichage : shift_id pour un shift ponctuel, modele_id pour
+# l'occurrence calculée d'un modèle récurrent
+OccurrenceShift = namedtuple('OccurrenceShift',
+                             'shift_id modele_id employe_id date heure_debut heure_fin tache couleur')
+
+def occurrences_shifts(debut, fin, employe_id=None):
+    """Shifts des jours [debut, fin] (inclus) : shifts ponctuels et occurrences des modèles
+    récurrents, sauf exceptions. Trois requêtes, quelle que soit la longueur de la plage."""
+    ponctuels = db.session.query(
+        PlanningShift.id, PlanningShift.employe_id, PlanningShift.date, PlanningShift.heure_debut,
+        PlanningShift.heure_fin, PlanningShift.tache, Employe.couleur,
+    ).outerjoin(Employe, PlanningShift.employe_id == Employe.id).filter(
+        PlanningShift.date >= debut, PlanningShift.date <= fin)
+    modeles = db.session.query(ModeleShift, Employe.couleur).outerjoin(
+        Employe, ModeleShift.employe_id == Employe.id).filter(
+        ModeleShift.date_debut <= fin,
+        db.or_(ModeleShift.date_fin.is_(None), ModeleShift.date_fin >= debut))
+    if employe_id:
+        ponctuels = ponctuels.filter(PlanningShift.employe_id == employe_id)
+        modeles = modeles.filter(ModeleShift.employe_id == employe_id)
+
+    occurrences = [OccurrenceShift(shift_id, None, emp_id, jour, heure_debut, heure_fin, tache, couleur)
+                   for shift_id, emp_id, jour, heure_debut, heure_fin, tache, couleur in ponctuels]
+    modeles = modeles.all()
+    if modeles:
+        annulees = set(db.session.query(ExceptionModeleShift.modele_id, ExceptionModeleShift.date).filter(
+            ExceptionModeleShift.modele_id.in_([modele.id for modele, _ in modeles]),
+            ExceptionModeleShift.date >= debut, ExceptionModeleShift.date <= fin))
+        for modele, couleur in modeles:
+            jour = max(debut, modele.date_debut)
+            dernier_jour = min(fin, modele.date_fin) if modele.date_fin else fin
+            jours = modele.jours()
+            while jour <= dernier_jour:
+                if jour.weekday() in jours and (modele.id, jour) not in annulees:
+                    occurrences.append(OccurrenceShift(None, modele.id, modele.employe_id, jour, modele.heure_debut,
+                                                       modele.heure_fin, modele.tache, couleur))
+                jour += timedelta(days=1)
+    occurrences.sort(key=lambda o: (o.date, o.heure_debut))
+    return occurrences
+
+def plage_shifts():
+    """Jours [debut, fin] (inclus) demandés par FullCalendar. Les modèles récurrents n'ont pas
+    de fin : sans start/end, on se limite à la semaine qui commence aujourd'hui."""
+    debut, fin = plage_calendrier()
+    debut = debut or date.today()
+    fin = fin - timedelta(days=1) if fin else debut + timedelta(days=6)
+    return debut, fin
+
+def exclure_occurrence(modele_id, jour):
+    """Enregistre que l'occurrence du modèle n'a pas lieu ce jour-là"""
+    if not ExceptionModeleShift.query.filter_by(modele_id=modele_id, date=jour).first():
+        db.session.add(ExceptionModeleShift(modele_id=modele_id, date=jour))
+
+# --- COUVERTURE DU PLANNING (conflits, disponibilités, accueil non couvert) ---
+def charger_couverture(debut, fin):
+    """Construit le moteur de couverture à partir des shifts, présences et congés des jours [debut, fin].
+    Un jour de marge est chargé de chaque côté pour les shifts qui débordent de la plage."""
+    shifts = occurrences_shifts(debut - timedelta(days=1), fin + timedelta(days=1))
+    presences = db.session.query(
+        PresenceEmploye.employe_id, PresenceEmploye.date_debut, PresenceEmploye.date_fin,
+    ).filter(PresenceEmploye.present.is_(True), PresenceEmploye.date_debut <= fin, PresenceEmploye.date_fin >= debut)
+    conges = db.session.query(
+        CongeEmploye.id, CongeEmploye.employe_id, CongeEmploye.date_debut, CongeEmploye.date_fin,
+    ).filter(CongeEmploye.date_debut <= fin, CongeEmploye.date_fin >= debut)
+    # Les occurrences de modèles n'ont pas d'id : on les identifie par (modèle, jour)
+    return Couverture(
+        [(o.shift_id or f"modele-{o.modele_id}-{o.date.isoformat()}", o.employe_id,
+          datetime.combine(o.date, o.heure_debut), datetime.combine(o.date, o.heure_fin), o.tache)
+         for o in shifts],
+        presences.all(),
+        conges.all(),
+        tache_accueil=app.config['TACHE_ACCUEIL'],
+    )
+
+def analyser_couverture(debut, fin):
+    """Conflits et créneaux d'accueil non couverts des jours [debut, fin]"""
+    couverture = charger_couverture(debut, fin)
+    debut_plage = datetime.combine(debut, time())
+    fin_plage = datetime.combine(fin + timedelta(days=1), time())
+    return {
+        'conflits': couverture.conflits(debut_plage, fin_plage),
+        'non_couverts': couverture.creneaux_non_couverts(
+            debut_plage, fin_plage, app.config['JOURS_OUVERTURE'],
+            app.config['HEURE_OUVERTURE'], app.config['HEURE_FERMETURE']),
+    }
+
+def alertes_couverture(analyse, noms_employes):
+    """Messages lisibles pour le bandeau de l'accueil"""
+    def jour(moment):
+        return format_date(moment, format='EEEE d MMMM', locale='fr_FR')
+    alertes = []
+    for conflit in analyse['conflits']:
+        nom = noms_employes.get(conflit['employe_id'], 'Employé inconnu')
+        horaire = f"{conflit['debut']:%H:%M}–{conflit['fin']:%H:%M}"
+        if conflit['type'] == 'chevauchement':
+            alertes.append(f"{nom} a deux shifts qui se chevauchent le {jour(conflit['debut'])} ({horaire}).")
+        else:
+            alertes.append(f"{nom} a un shift pendant son congé le {jour(conflit['debut'])} ({horaire}).")
+    for debut, fin in analyse['non_couverts']:
+        alertes.append(f"Personne à l'accueil le {jour(debut)} de {debut:%H:%M} à {fin:%H:%M}.")
+    return alertes
+
 # --- PAGES WEB (LES ROUTES) ---
 
 @app.route("/")
@@ -188,10 +1445,8 @@ def index():
     start_week = start_of_current_week + timedelta(weeks=semaine)
     end_week = start_week + timedelta(days=4)
     employes = Employe.query.order_by(Employe.nom).all()
-    shifts_semaine = PlanningShift.query.filter(
-        PlanningShift.date >= start_week, 
-        PlanningShift.date <= end_week
-    ).all()
+    # Shifts ponctuels et occurrences des modèles récurrents de la semaine
+    shifts_semaine = occurrences_shifts(start_week, end_week)
     schedule_data = {emp.id: {} for emp in employes}
     for shift in shifts_semaine:
         if shift.employe_id in schedule_data:
@@ -202,13 +1457,17 @@ def index():
     jours_fr = ['Mardi', 'Mercredi', 'Jeudi', 'Vendredi', 'Samedi']
     # Ajout des congés si utilisés dans le template
     conges = CongeEmploye.query.filter(CongeEmploye.date_debut <= end_week, CongeEmploye.date_fin >= start_week).all()
+    # Bandeau : conflits et accueil non couvert sur la semaine affichée
+    alertes_planning = alertes_couverture(analyser_couverture(start_week, end_week),
+                                          {emp.id: emp.nom for emp in employes})
     return render_template('index.html', 
                            employes=employes,
                            schedule_data=schedule_data,
                            week_dates=week_dates,
                            jours_fr=jours_fr,
                            semaine=semaine,
-                           conges=conges)
+                           conges=conges,
+                           alertes_planning=alertes_planning)
 
 # --- Route de gestion globale présence/congé ---
 @app.route('/gestion_presence_conge', methods=['GET', 'POST'])
@@ -228,25 +1487,39 @@ def gestion_presence_conge():
 @app.route('/planning/shift/ajouter', methods=['POST'])
 def ajouter_shift():
     from datetime import datetime, time
-    employe_id = 1
+    employe_id = request.form.get('employe_id', type=int)
     date_str = request.form.get('date')
     heure_debut_str = request.form.get('heure_debut')
     heure_fin_str = request.form.get('heure_fin')
     tache = request.form.get('tache')
     # Vérification des champs obligatoires
-    if not all([employe_id, date_str, heure_debut_str, heure_fin_str]):
+    if not all([employe_id, date_str, heure_debut_str, heure_fin_str]) or not Employe.query.get(employe_id):
+        flash("Choisissez un employé, une date et des horaires.", 'danger')
         return redirect(request.referrer or url_for('index'))
     date_obj = datetime.strptime(date_str, '%Y-%m-%d').date()
     heure_debut_obj = time.fromisoformat(heure_debut_str)
     heure_fin_obj = time.fromisoformat(heure_fin_str)
-    nouveau_shift = PlanningShift(
-        employe_id=employe_id,
-        date=date_obj,
-        heure_debut=heure_debut_obj,
-        heure_fin=heure_fin_obj,
-        tache=tache
-    )
-    db.session.add(nouveau_shift)
+    if request.form.get('repetition'):
+        # Shift récurrent : un seul modèle, déroulé à l'affichage
+        jours = sorted(set(request.form.getlist('jours_semaine')) & set('0123456')) or [str(date_obj.weekday())]
+        date_fin_str = request.form.get('date_fin_repetition')
+        db.session.add(ModeleShift(
+            employe_id=employe_id,
+            jours_semaine=''.join(jours),
+            heure_debut=heure_debut_obj,
+            heure_fin=heure_fin_obj,
+            tache=tache,
+            date_debut=date_obj,
+            date_fin=datetime.strptime(date_fin_str, '%Y-%m-%d').date() if date_fin_str else None
+        ))
+    else:
+        db.session.add(PlanningShift(
+            employe_id=employe_id,
+            date=date_obj,
+            heure_debut=heure_debut_obj,
+            heure_fin=heure_fin_obj,
+            tache=tache
+        ))
     db.session.commit()
     return redirect(request.referrer or url_for('index'))
 
@@ -260,9 +1533,11 @@ def ajouter_retouche():
 
         # --- NOUVELLE LOGIQUE POUR GÉRER LE CLIENT ---
         client = None
-        # On ne cherche le client par son numéro que si un numéro est fourni
-        if numero_telephone_form:
-            client = Client.query.filter_by(numero_telephone=numero_telephone_form).first()
+        # On ne cherche le client par son numéro que si le numéro contient des chiffres
+        # (sinon telephone_normalise=None correspondrait à n'importe quel client sans téléphone)
+        telephone = normaliser_telephone(numero_telephone_form)
+        if telephone is not None:
+            client = Client.query.filter_by(telephone_normalise=telephone).first()
 
         if not client:
             # Si aucun client n'est trouvé (ou si aucun numéro n'a été donné), on en crée un nouveau.
@@ -283,17 +1558,10 @@ def ajouter_retouche():
         commentaire = request.form.get('commentaire')
         est_paye = request.form.get('paye') == 'on'
 
-        total_ht = 0.0
-        retouches_creees = []
-
-        # Création du ticket (date_echeance = date_obj)
-        nouveau_ticket = Ticket(client_id=client.id, date_echeance=date_obj, commentaire=commentaire, paye=est_paye)
-        db.session.add(nouveau_ticket)
-        db.session.flush()  # Pour obtenir l'ID du ticket
-
+        # Lecture des lignes du formulaire
+        lignes = []
         for i in range(len(detail_ids)):
-            detail_id = detail_ids[i]
-            detail = DetailRetouche.query.get(detail_id) if detail_id else None
+            detail_id = int(detail_ids[i]) if detail_ids[i] else None
             prix_val = prixs[i] if i < len(prixs) else None
             prix_retouche = None
             try:
@@ -301,34 +1569,51 @@ def ajouter_retouche():
                     prix_retouche = float(prix_val)
             except (ValueError, TypeError):
                 pass
-            if prix_retouche is None:
-                prix_retouche = detail.prix if detail else 0.0
-
             description = descriptions[i] if i < len(descriptions) else ""
             quantite = int(quantites[i]) if i < len(quantites) and quantites[i] else 1
+            if quantite < 1:
+                # Le min="1" du formulaire n'est qu'une indication : une quantité négative rendrait du stock
+                continue
+            lignes.append((detail_id, prix_retouche, description, quantite))
 
-            for _ in range(quantite):
-                if detail:
-                    for fourniture in detail.fournitures:
-                        fourniture.quantite -= 1
-                nouvelle_retouche = Retouche(
-                    client_id=client.id,
-                    ticket_id=nouveau_ticket.id,
-                    prix=prix_retouche,
-                    description=description,
-                    detail_retouche_id=detail.id if detail else None,
-                    essayage_boutique=essayage_boutique
-                )
-                db.session.add(nouvelle_retouche)
-                retouches_creees.append(nouvelle_retouche)
-                if prix_retouche:
-                    total_ht += prix_retouche
-        db.session.commit()
+        # Prestations du ticket (prix, fournitures liées) lues dans le catalogue en cache
+        details = charger_catalogue()['details']
 
-        # Calcul de la TVA et du total
-        tva_rate = app.config['TVA_RATE']
-        montant_tva = total_ht * tva_rate
-        total_ttc = total_ht + montant_tva
+        # Création du ticket (date_echeance = date_obj)
+        nouveau_ticket = Ticket(client_id=client.id, date_echeance=date_obj, commentaire=commentaire, paye=est_paye)
+        db.session.add(nouveau_ticket)
+        db.session.flush()  # Pour obtenir l'ID du ticket
+
+        retouches_creees = []
+        consommation = Counter()  # fourniture_id -> quantité consommée
+        for detail_id, prix_retouche, description, quantite in lignes:
+            detail = details.get(detail_id)
+            if prix_retouche is None:
+                prix_retouche = detail['prix'] if detail else 0.0
+            if detail:
+                for fourniture_id in detail['fournitures']:
+                    consommation[fourniture_id] += quantite
+            retouches_creees.extend({
+                'client_id': client.id,
+                'ticket_id': nouveau_ticket.id,
+                'prix': prix_retouche,
+                'description': description,
+                'detail_retouche_id': detail['id'] if detail else None,
+                'essayage_boutique': essayage_boutique,
+                'statut': 'En cours',
+                'detail': detail
+            } for _ in range(quantite))
+
+        # Insertion groupée des retouches et décrément du stock en une requête par lot
+        if retouches_creees:
+            db.session.execute(db.insert(Retouche), [
+                {cle: valeur for cle, valeur in r.items() if cle != 'detail'} for r in retouches_creees
+            ])
+        mouvementer_stock({f_id: -n for f_id, n in consommation.items()}, 'vente', ticket_id=nouveau_ticket.id)
+        # L'insertion groupée ne passe pas par le flush : on resynchronise le résumé du calendrier et les totaux
+        synchroniser_charges({(date_obj, client.id)})
+        synchroniser_totaux_tickets({nouveau_ticket.id})
+        db.session.commit()
 
         now = datetime.now()
         date_formatee = format_date(now, format='full', locale='fr_FR')
@@ -336,21 +1621,19 @@ def ajouter_retouche():
                        client=client,
                        ticket=nouveau_ticket,
                        retouches=retouches_creees,
-                       total_ht=total_ht,
-                       montant_tva=montant_tva,
-                       total_ttc=total_ttc,
-                       tva_rate=tva_rate,
+                       total_ht=nouveau_ticket.total_ht,
+                       montant_tva=nouveau_ticket.montant_tva,
+                       total_ttc=nouveau_ticket.total_ttc,
+                       tva_rate=nouveau_ticket.taux_tva,
                        numero_ticket=nouveau_ticket.id,
                        now=now,
                        date_formatee=date_formatee)
     else:
-        # Le code pour la méthode GET
-        clients = Client.query.all()
-        categories = Categorie.query.all()
+        # Le code pour la méthode GET (les clients sont proposés via /api/clients/search)
+        categories = charger_catalogue()['categories']
         date_selectionnee = request.args.get('date') 
         return render_template('ajouter_retouche.html', 
                                categories=categories, 
-                               clients=clients,
                                date_selectionnee=date_selectionnee)
 
 # --- ROUTES MANQUANTES RÉINTÉGRÉES ET MISES À JOUR ---
@@ -364,23 +1647,22 @@ def planning():
     start_week = start_of_current_week + timedelta(weeks=semaine)
     end_week = start_week + timedelta(days=4)
 
-    # Récupérer tous les tickets avec leurs retouches de la semaine
-    tickets = Ticket.query.filter(
-        Ticket.date_echeance >= start_week,
-        Ticket.date_echeance <= end_week
-    ).all()
-    
-    # Extraire toutes les retouches de ces tickets
-    retouches = []
-    for ticket in tickets:
-        retouches.extend(ticket.retouches)
+    # Lecture du résumé ChargeJournaliere de la semaine (un parcours d'index sur la date)
+    charges = db.session.query(ChargeJournaliere, Client.nom).join(
+        Client, ChargeJournaliere.client_id == Client.id
+    ).filter(
+        ChargeJournaliere.date >= start_week,
+        ChargeJournaliere.date <= end_week,
+        ChargeJournaliere.nb_retouches > 0
+    ).order_by(ChargeJournaliere.date, ChargeJournaliere.client_id).all()
+    noms_prestations = {d_id: d['nom'] for d_id, d in charger_catalogue()['details'].items()}
 
-    # Groupement par client puis par jour
     # Regrouper toutes les retouches de la semaine par client et par type de retouche (additionner les quantités)
     planning_resume = defaultdict(lambda: defaultdict(int))  # {client: {nom_retouche: quantite_totale}}
-    for r in retouches:
-        if r.client and r.detail:
-            planning_resume[r.client.nom][r.detail.nom] += 1
+    for charge, client_nom in charges:
+        for detail_id, quantite in charge.quantites_prestations().items():
+            if detail_id in noms_prestations:
+                planning_resume[client_nom][noms_prestations[detail_id]] += quantite
 
     # On veut une seule case par client, donc on prépare une liste de tuples (client, liste de dicts retouches)
     planning_resume_list = []
@@ -422,8 +1704,8 @@ def modifier_retouche(id):
             client = Client.query.get(client_id)
             if client:
                 retouche.client_id = client.id
-        elif numero_telephone:
-            client = Client.query.filter_by(numero_telephone=numero_telephone).first()
+        elif normaliser_telephone(numero_telephone) is not None:
+            client = Client.query.filter_by(telephone_normalise=normaliser_telephone(numero_telephone)).first()
             if client:
                 retouche.client_id = client.id
 
@@ -444,59 +1726,92 @@ def modifier_retouche(id):
         return redirect(url_for('detail_retouche', id=retouche.id))
 
     # Pour GET, on prépare les données pour les menus déroulants
-    categories = Categorie.query.all()
+    categories = charger_catalogue()['categories']
     return render_template('modifier_retouche.html', retouche=retouche, categories=categories)
 
 # --- ROUTES API POUR LES MENUS DÉROULANTS DYNAMIQUES ---
 
 @app.route('/api/sous_categories/<int:categorie_id>')
 def api_get_sous_categories(categorie_id):
-    sous_categories = SousCategorie.query.filter_by(categorie_id=categorie_id).all()
-    return jsonify([{'id': sc.id, 'nom': sc.nom} for sc in sous_categories])
+    catalogue = charger_catalogue()
+    sous_categories = [sc for sc in catalogue['sous_categories'].values() if sc['categorie_id'] == categorie_id]
+    return reponse_catalogue([{'id': sc['id'], 'nom': sc['nom']} for sc in sous_categories], catalogue['version'])
 
 @app.route('/api/details_retouche/<int:sous_categorie_id>')
 def api_get_details_retouche(sous_categorie_id):
-    details = DetailRetouche.query.filter_by(sous_categorie_id=sous_categorie_id).all()
-    return jsonify([{'id': d.id, 'nom': d.nom, 'prix': d.prix} for d in details])
+    catalogue = charger_catalogue()
+    sous_categorie = catalogue['sous_categories'].get(sous_categorie_id)
+    details = sous_categorie['details_retouches'] if sous_categorie else []
+    return reponse_catalogue([{'id': d['id'], 'nom': d['nom'], 'prix': d['prix']} for d in details], catalogue['version'])
+
+@app.route('/api/catalogue')
+def api_catalogue():
+    """Tout le catalogue en un seul document, pour que les formulaires remplissent leurs menus localement"""
+    arbre = arbre_catalogue()
+    return reponse_catalogue(arbre, arbre['version'])
+
+# --- API D'AUTOCOMPLÉTION DES CLIENTS ---
+
+@app.route('/api/clients/search')
+def api_recherche_clients():
+    """Clients dont le nom ou le numéro commence par q (les N premiers, par ordre alphabétique)"""
+    q = (request.args.get('q') or '').strip()
+    limite = min(request.args.get('limit', 10, type=int), 50)
+    conditions = []
+    nom = normaliser_nom(q)
+    if nom:
+        conditions.append(filtre_prefixe(Client.nom_recherche, nom))
+    telephone = normaliser_telephone(q)
+    if telephone:
+        conditions.append(filtre_prefixe(Client.telephone_normalise, telephone))
+    if not conditions:
+        return jsonify([])
+    clients = db.session.query(Client.id, Client.nom, Client.numero_telephone).filter(
+        db.or_(*conditions)
+    ).order_by(Client.nom_recherche).limit(limite).all()
+    return jsonify([
+        {'id': client_id, 'nom': nom, 'numero_telephone': numero_telephone}
+        for client_id, nom, numero_telephone in clients
+    ])
 
 @app.route('/aujourdhui')
 def vue_aujourdhui():
     today = date.today()
     tomorrow = today + timedelta(days=1)
     
-    # Récupérer les tickets du jour, puis leurs retouches
-    tickets_du_jour = Ticket.query.filter(
-        Ticket.date_echeance >= today, 
+    # Une seule requête : retouches du jour avec client et prestation déjà joints
+    lignes = db.session.query(
+        Retouche.id, Retouche.statut, Retouche.description,
+        Client.nom, DetailRetouche.nom, Categorie.nom
+    ).join(Ticket, Retouche.ticket_id == Ticket.id
+    ).join(Client, Retouche.client_id == Client.id
+    ).outerjoin(DetailRetouche, Retouche.detail_retouche_id == DetailRetouche.id
+    ).outerjoin(SousCategorie, DetailRetouche.sous_categorie_id == SousCategorie.id
+    ).outerjoin(Categorie, SousCategorie.categorie_id == Categorie.id
+    ).filter(
+        Ticket.date_echeance >= today,
         Ticket.date_echeance < tomorrow
-    ).all()
-    
-    retouches_du_jour = []
-    for ticket in tickets_du_jour:
-        retouches_du_jour.extend(ticket.retouches)
+    ).order_by(Ticket.id, Retouche.id).all()
 
     retouches_par_client = {}
-    for retouche in retouches_du_jour:
-        nom_client = retouche.client.nom
-        if nom_client not in retouches_par_client:
-            retouches_par_client[nom_client] = []
-        
-        # LA CORRECTION EST ICI : On crée un dictionnaire propre pour le JavaScript
+    for retouche_id, statut, description, nom_client, detail_nom, categorie_nom in lignes:
+        # On crée un dictionnaire propre pour le JavaScript
         retouche_data = {
-            'id': retouche.id,
-            'statut': retouche.statut,
-            'description': retouche.description,
+            'id': retouche_id,
+            'statut': statut,
+            'description': description,
             'detail': None
         }
-        if retouche.detail:
+        if detail_nom:
             retouche_data['detail'] = {
-                'nom': retouche.detail.nom,
+                'nom': detail_nom,
                 'sous_categorie': {
                     'categorie': {
-                        'nom': retouche.detail.sous_categorie.categorie.nom
+                        'nom': categorie_nom
                     }
                 }
             }
-        retouches_par_client[nom_client].append(retouche_data)
+        retouches_par_client.setdefault(nom_client, []).append(retouche_data)
 
     return render_template('aujourdhui.html', 
                            retouches_par_client=retouches_par_client, 
@@ -524,7 +1839,7 @@ def update_status(retouche_id):
                     "0479688584"
                 )
                 
-                lien_sms = generer_lien_sms(retouche.client.numero_telephone, message_body)
+                lien_sms = generer_lien_sms(retouche.client.telephone_normalise, message_body)
                 
                 if lien_sms:
                     # Stocker le lien SMS dans la session ou le passer autrement
@@ -547,9 +1862,9 @@ def update_status(retouche_id):
 
 @app.route('/parametres')
 def parametres():
-    categories = Categorie.query.order_by(Categorie.nom).all()
+    categories = sorted(charger_catalogue()['categories'], key=lambda cat: cat['nom'])
     employes = Employe.query.order_by(Employe.nom).all()
-    fournitures = Fourniture.query.order_by(Fourniture.nom).all()
+    fournitures = fournitures_avec_previsions()
     return render_template('parametres.html', categories=categories, employes=employes, fournitures=fournitures)
 
 @app.route('/parametres/categorie/ajouter', methods=['POST'])
@@ -693,20 +2008,11 @@ def modifier_detail_retouche(detail_id):
     # 2. Obtenir l'ensemble des IDs des fournitures soumises par le formulaire
     ids_soumis = {int(id) for id in request.form.getlist('fournitures')}
     
-    # 3. Trouver les fournitures à retirer (celles qui étaient là mais ne le sont plus)
-    ids_a_retirer = ids_actuels - ids_soumis
-    if ids_a_retirer:
-        fournitures_a_retirer = Fourniture.query.filter(Fourniture.id.in_(ids_a_retirer)).all()
-        for f in fournitures_a_retirer:
-            f.quantite += 1 # On "remet" l'article en stock
-            
-    # 4. Trouver les fournitures à ajouter (celles qui n'étaient pas là mais le sont maintenant)
-    ids_a_ajouter = ids_soumis - ids_actuels
-    if ids_a_ajouter:
-        fournitures_a_ajouter = Fourniture.query.filter(Fourniture.id.in_(ids_a_ajouter)).all()
-        for f in fournitures_a_ajouter:
-            if f.quantite > 0:
-                f.quantite -= 1 # On "consomme" l'article du stock
+    # 3. Les fournitures retirées sont "remises" en stock (+1)
+    # 4. Les fournitures ajoutées sont "consommées" (-1), seulement s'il en reste
+    variations = {f_id: 1 for f_id in ids_actuels - ids_soumis}
+    variations.update({f_id: -1 for f_id in ids_soumis - ids_actuels})
+    mouvementer_stock(variations, 'ajustement', sans_negatif=True, commentaire=f"Prestation {detail.nom}")
 
     # 5. Mettre à jour la liste des fournitures pour la retouche
     detail.fournitures = Fourniture.query.filter(Fourniture.id.in_(ids_soumis)).all()
@@ -718,27 +2024,115 @@ def modifier_detail_retouche(detail_id):
 @app.route('/parametres/fourniture/ajouter', methods=['POST'])
 def ajouter_fourniture():
     nom = request.form.get('nom')
-    reference = request.form.get('reference')
+    reference = (request.form.get('reference') or '').strip() or None
     quantite = request.form.get('quantite', 0, type=int)
+    if reference and Fourniture.query.filter_by(reference=reference).first():
+        flash(f'La référence "{reference}" est déjà utilisée par une autre fourniture.', 'danger')
+        return redirect(url_for('parametres'))
     if nom:
-        nouvelle_fourniture = Fourniture(nom=nom, reference=reference, quantite=quantite)
+        nouvelle_fourniture = Fourniture(nom=nom, reference=reference, quantite=0)
         db.session.add(nouvelle_fourniture)
+        db.session.flush()
+        mouvementer_stock({nouvelle_fourniture.id: quantite}, 'ajustement', commentaire="Stock initial")
         db.session.commit()
     return redirect(url_for('parametres'))
 
 @app.route('/parametres/fourniture/modifier/<int:id>', methods=['POST'])
 def modifier_fourniture(id):
     fourniture = Fourniture.query.get_or_404(id)
+    reference = (request.form.get('reference') or '').strip() or None
+    if reference and Fourniture.query.filter(Fourniture.reference == reference, Fourniture.id != id).first():
+        flash(f'La référence "{reference}" est déjà utilisée par une autre fourniture.', 'danger')
+        return redirect(url_for('parametres'))
     fourniture.nom = request.form.get('nom')
-    fourniture.reference = request.form.get('reference')
-    fourniture.quantite = request.form.get('quantite', type=int)
+    fourniture.reference = reference
+    fixer_stock({fourniture.id: request.form.get('quantite', type=int)}, 'ajustement', commentaire="Inventaire manuel")
     db.session.commit()
     return redirect(url_for('parametres'))
 
 @app.route('/inventaire')
 def inventaire():
-    fournitures = Fourniture.query.order_by(Fourniture.nom).all()
-    return render_template('inventaire.html', fournitures=fournitures)
+    fournitures = fournitures_avec_previsions()
+    date_calcul = next((f.prevision.date_calcul for f in fournitures if f.prevision), None)
+    alertes = sorted((f for f in fournitures if f.en_alerte), key=lambda f: f.jours_avant_rupture)
+    return render_template('inventaire.html', fournitures=fournitures, alertes=alertes, date_calcul=date_calcul)
+
+@app.route('/inventaire/previsions', methods=['POST'])
+def recalculer_previsions():
+    calculer_previsions_stock()
+    db.session.commit()
+    flash('Les prévisions de rupture ont été recalculées.', 'success')
+    return redirect(url_for('inventaire'))
+
+# --- ROUTES DES RAPPORTS D'ACTIVITÉ ---
+MAX_PERIODES_RAPPORT = 1000
+
+def lire_parametres_rapport():
+    """
+    (granularite, debut, fin exclue, erreur) d'après ?granularite=jour|semaine|mois&debut=&fin= (fin incluse).
+    Par défaut : par mois, du 1er janvier d'il y a deux ans à aujourd'hui.
+    """
+    aujourd_hui = date.today()
+    granularite = request.args.get('granularite') or 'mois'
+    debut = lire_date_iso(request.args.get('debut')) or date(aujourd_hui.year - 2, 1, 1)
+    fin = (lire_date_iso(request.args.get('fin')) or aujourd_hui) + timedelta(days=1)
+    erreur = None
+    if granularite not in GRANULARITES:
+        erreur = 'Granularité invalide (jour, semaine ou mois).'
+    elif fin <= debut:
+        erreur = 'La date de fin précède la date de début.'
+    elif len(periodes_entre(debut, fin, granularite)) > MAX_PERIODES_RAPPORT:
+        erreur = f'Rapport limité à {MAX_PERIODES_RAPPORT} périodes : choisissez une granularité plus large.'
+    return granularite, debut, fin, erreur
+
+@app.route('/rapports')
+def rapports():
+    granularite, debut, fin, erreur = lire_parametres_rapport()
+    if erreur:
+        flash(erreur, 'danger')
+        return redirect(url_for('rapports'))
+    periodes = rapport_activite(debut, fin, granularite)
+    db.session.commit()  # Périodes closes calculées pour la première fois
+    total = totaliser_rapport(periodes)
+    return render_template('rapports.html', periodes=periodes, total=total, retards=retouches_en_retard(),
+                           granularite=granularite, debut=debut, fin=fin - timedelta(days=1))
+
+@app.route('/api/rapports')
+def api_rapports():
+    """Mêmes indicateurs que /rapports en JSON, une entrée par période plus le cumul"""
+    granularite, debut, fin, erreur = lire_parametres_rapport()
+    if erreur:
+        return jsonify({'success': False, 'message': erreur}), 400
+    periodes = rapport_activite(debut, fin, granularite)
+    db.session.commit()
+    total = totaliser_rapport(periodes)
+    return jsonify({
+        'granularite': granularite,
+        'periodes': [dict(p, debut=p['debut'].isoformat(), fin=p['fin'].isoformat()) for p in periodes],
+        'total': total,
+        'en_retard': retouches_en_retard(),
+    })
+
+@app.route('/export/comptable')
+def export_comptable():
+    """
+    Tickets et lignes (HT, TVA, TTC) créés entre debut et fin incluse, en CSV envoyé au fur et à mesure.
+    ?debut=&fin= (par défaut l'année en cours) &format=excel|csv
+    """
+    aujourd_hui = date.today()
+    debut = lire_date_iso(request.args.get('debut')) or date(aujourd_hui.year, 1, 1)
+    fin = lire_date_iso(request.args.get('fin')) or aujourd_hui
+    format_export = request.args.get('format') or 'excel'
+    if format_export not in FORMATS_EXPORT:
+        return jsonify({'success': False, 'message': 'Format invalide (excel ou csv).'}), 400
+    if fin < debut:
+        return jsonify({'success': False, 'message': 'La date de fin précède la date de début.'}), 400
+    nom_fichier = f"export-comptable-{debut.isoformat()}-{fin.isoformat()}.csv"
+    return Response(
+        stream_with_context(export_comptable_csv(debut, fin + timedelta(days=1), format_export)),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename="{nom_fichier}"'},
+    )
 
 @app.route('/ajouter_presence_conge', methods=['POST'])
 def ajouter_presence_conge():
@@ -755,34 +2149,24 @@ def ajouter_presence_conge():
         return jsonify({'success': False, 'error': 'Employé introuvable.'})
     date_debut = datetime.strptime(date_debut_str, '%Y-%m-%d').date()
     date_fin = datetime.strptime(date_fin_str, '%Y-%m-%d').date()
-    # Supprimer présence/congé existant sur la période pour cet employé
-    for d in (date_debut + timedelta(days=n) for n in range((date_fin-date_debut).days+1)):
-        PresenceEmploye.query.filter_by(employe_id=employe_id, date=d).delete()
-        CongeEmploye.query.filter(CongeEmploye.employe_id==employe_id, CongeEmploye.date_debut<=d, CongeEmploye.date_fin>=d).delete()
+    if type_ not in ('presence', 'conge'):
+        return jsonify({'success': False, 'error': 'Type inconnu.'})
+    if date_fin < date_debut:
+        return jsonify({'success': False, 'error': 'La date de fin précède la date de début.'})
+    # Supprimer les congés existants sur la période pour cet employé (une seule requête)
+    CongeEmploye.query.filter(CongeEmploye.employe_id == employe_id,
+                              CongeEmploye.date_debut <= date_fin,
+                              CongeEmploye.date_fin >= date_debut).delete(synchronize_session=False)
     event = None
     if type_ == 'presence':
-        # Ajouter une présence pour chaque jour de la période
-        for d in (date_debut + timedelta(days=n) for n in range((date_fin-date_debut).days+1)):
-            db.session.add(PresenceEmploye(employe_id=employe_id, date=d, present=True))
-        event = {
-            'title': 'Présent',
-            'start': date_debut_str,
-            'end': (date_fin + timedelta(days=1)).strftime('%Y-%m-%d'),
-            'color': employe.couleur or '#48c774',
-            'allDay': True
-        }
+        # Une seule ligne pour toute la période, fusionnée avec les présences voisines
+        ajouter_presence(employe.id, date_debut, date_fin)
+        event = evenement_periode(date_debut, date_fin, 'Présent', employe.couleur or '#48c774')
     elif type_ == 'conge':
+        retirer_presences(employe.id, date_debut, date_fin)
         conge = CongeEmploye(employe_id=employe_id, date_debut=date_debut, date_fin=date_fin, motif=motif)
         db.session.add(conge)
-        event = {
-            'title': motif or 'Congé',
-            'start': date_debut_str,
-            'end': (date_fin + timedelta(days=1)).strftime('%Y-%m-%d'),
-            'color': '#f14668',
-            'allDay': True
-        }
-    else:
-        return jsonify({'success': False, 'error': 'Type inconnu.'})
+        event = evenement_periode(date_debut, date_fin, motif or 'Congé', '#f14668')
     db.session.commit()
     return jsonify({'success': True, 'event': event})
 
@@ -790,49 +2174,48 @@ def ajouter_presence_conge():
 @app.route('/calendrier_annuel/<int:employe_id>')
 def calendrier_annuel(employe_id):
     employe = Employe.query.get_or_404(employe_id)
-    
-    # Récupérer les données de présence pour l'année
-    shifts = PlanningShift.query.filter_by(employe_id=employe_id).all()
-    presences = PresenceEmploye.query.filter_by(employe_id=employe_id, present=True).all()
-    conges = CongeEmploye.query.filter_by(employe_id=employe_id).all()
-    
+    # Les événements sont chargés par FullCalendar, mois par mois, via api_calendrier_annuel_events
+    return render_template('calendrier_annuel.html', employe=employe)
+
+@app.route('/api/calendrier_annuel/<int:employe_id>/events')
+def api_calendrier_annuel_events(employe_id):
+    """Flux FullCalendar du calendrier d'un employé (shifts, présences, congés), limité à la plage start/end"""
+    employe = Employe.query.get_or_404(employe_id)
+    debut, fin = plage_calendrier()
+    couleur = employe.couleur or '#3788d8'
+
+    shifts = occurrences_shifts(*plage_shifts(), employe_id=employe_id)
+
     events = []
-    
+
     # Formater les shifts (présence avec tâche)
     for shift in shifts:
         events.append({
             'title': shift.tache or 'Présence',
             'start': shift.date.isoformat(),
-            'backgroundColor': employe.couleur or '#3788d8',
-            'borderColor': employe.couleur or '#3788d8'
+            'color': couleur
         })
 
-    # Formater les présences simples (sans écraser les shifts)
+    # Formater les présences simples (sans écraser les shifts) : une période est
+    # découpée autour des jours qui ont déjà un shift, dans la limite de la plage visible
     shift_dates = {s.date for s in shifts}
-    for presence in presences:
-        if presence.date not in shift_dates:
-            events.append({
-                'title': 'Présent',
-                'start': presence.date.isoformat(),
-                'backgroundColor': employe.couleur or '#3788d8',
-                'borderColor': employe.couleur or '#3788d8'
-            })
-        
-    # Formater les congés
-    for conge in conges:
-        end_date = conge.date_fin + timedelta(days=1)
-        events.append({
-            'title': conge.motif or 'Congé',
-            'start': conge.date_debut.isoformat(),
-            'end': end_date.isoformat(),
-            'display': 'background',
-            'backgroundColor': '#ff9f89',
-            'borderColor': '#ff9f89'
-        })
+    for presence, _, _ in periodes_avec_employe(PresenceEmploye, employe_id):
+        jours_libres = [d for d in presence.jours()
+                        if d not in shift_dates and (not debut or d >= debut) and (not fin or d < fin)]
+        debut_run = None
+        for i, d in enumerate(jours_libres):
+            if debut_run is None:
+                debut_run = d
+            if i + 1 == len(jours_libres) or jours_libres[i + 1] != d + timedelta(days=1):
+                events.append(evenement_periode(debut_run, d, 'Présent', couleur))
+                debut_run = None
 
-    print(events)
+    # Formater les congés
+    for conge, _, _ in periodes_avec_employe(CongeEmploye, employe_id):
+        events.append(evenement_periode(conge.date_debut, conge.date_fin, conge.motif or 'Congé',
+                                        '#ff9f89', display='background'))
 
-    return render_template('calendrier_annuel.html', employe=employe, events=events)
+    return jsonify(events)
 
 # --- FONCTION POUR ALIMENTER LA BASE DE DONNÉES (VERSION FINALE ET COMPLÈTE) ---
 def seed_data():
@@ -948,30 +2331,26 @@ def seed_data():
 
 @app.route('/modifier_planning_employe', methods=['GET', 'POST'])
 def modifier_planning_employe():
-    from datetime import timedelta, datetime
     # Afficher le planning de tous les employés sur le même calendrier
+    # (événements chargés par FullCalendar via api_modifier_planning_events)
     employes = Employe.query.order_by(Employe.nom).all()
+    return render_template('modifier_planning_employe.html', employes=employes)
+
+@app.route('/api/modifier_planning_employe/events')
+def api_modifier_planning_events():
+    """Flux FullCalendar des présences et congés modifiables, limité à la plage start/end
+    (et à un employé avec ?employe_id=) : une requête par type, employé joint"""
+    employe_id = request.args.get('employe_id', type=int)
     events = []
-    for employe in employes:
-        presences = PresenceEmploye.query.filter_by(employe_id=employe.id, present=True).all()
-        conges = CongeEmploye.query.filter_by(employe_id=employe.id).all()
-        for p in presences:
-            events.append({
-                'title': f"{employe.nom} (Présent)",
-                'start': p.date.strftime('%Y-%m-%d'),
-                'end': p.date.strftime('%Y-%m-%d'),
-                'color': employe.couleur or '#48c774',
-                'allDay': True
-            })
-        for c in conges:
-            events.append({
-                'title': f"{employe.nom} (Congé : {c.motif})" if c.motif else f"{employe.nom} (Congé)",
-                'start': c.date_debut.strftime('%Y-%m-%d'),
-                'end': (c.date_fin + timedelta(days=1)).strftime('%Y-%m-%d'),
-                'color': '#ff69b4',  # Rose pour les congés
-                'allDay': True
-            })
-    return render_template('modifier_planning_employe.html', employes=employes, events=events)
+    for p, nom, couleur in periodes_avec_employe(PresenceEmploye, employe_id):
+        events.append(evenement_periode(p.date_debut, p.date_fin, f"{nom} (Présent)", couleur or '#48c774',
+                                        id=p.id, type='presence', employe_id=p.employe_id))
+    for c, nom, couleur in periodes_avec_employe(CongeEmploye, employe_id):
+        titre = f"{nom} (Congé : {c.motif})" if c.motif else f"{nom} (Congé)"
+        # Rose pour les congés
+        events.append(evenement_periode(c.date_debut, c.date_fin, titre, '#ff69b4',
+                                        id=c.id, type='conge', motif=c.motif or '', employe_id=c.employe_id))
+    return jsonify(events)
 
 
 
@@ -987,25 +2366,12 @@ def calendrier_mensuel(employe_id):
     from calendar import monthrange
     premier_jour = date(annee, mois, 1)
     dernier_jour = date(annee, mois, monthrange(annee, mois)[1])
-    presences = PresenceEmploye.query.filter_by(employe_id=employe_id).filter(
-        PresenceEmploye.date >= premier_jour, PresenceEmploye.date <= dernier_jour).all()
-    conges = CongeEmploye.query.filter_by(employe_id=employe_id).filter(
-        CongeEmploye.date_fin >= premier_jour, CongeEmploye.date_debut <= dernier_jour).all()
+    plage = (premier_jour, dernier_jour + timedelta(days=1))
     events = []
-    for p in presences:
-        events.append({
-            'title': 'Présent',
-            'start': p.date.strftime('%Y-%m-%d'),
-            'end': p.date.strftime('%Y-%m-%d'),
-            'color': '#48c774'
-        })
-    for c in conges:
-        events.append({
-            'title': c.motif or 'Congé',
-            'start': c.date_debut.strftime('%Y-%m-%d'),
-            'end': (c.date_fin + timedelta(days=1)).strftime('%Y-%m-%d'),
-            'color': '#f14668'
-        })
+    for p, _, _ in periodes_avec_employe(PresenceEmploye, employe_id, plage):
+        events.append(evenement_periode(p.date_debut, p.date_fin, 'Présent', '#48c774'))
+    for c, _, _ in periodes_avec_employe(CongeEmploye, employe_id, plage):
+        events.append(evenement_periode(c.date_debut, c.date_fin, c.motif or 'Congé', '#f14668'))
     return render_template('calendrier_mensuel.html', employe=employe, events=events, mois=mois, annee=annee)
 
 # --- LANCEMENT DE L'APPLICATION ---
@@ -1022,67 +2388,35 @@ if __name__ == '__main__':
 
 @app.route('/api/events_employe')
 def api_events_employe():
-    from datetime import timedelta
-    employe_id = request.args.get('employe_id')
+    employe_id = request.args.get('employe_id', type=int)
     if not employe_id:
         return jsonify([])
-    employe = Employe.query.get(employe_id)
-    if not employe:
-        return jsonify([])
-    presences = PresenceEmploye.query.filter_by(employe_id=employe_id, present=True).all()
-    conges = CongeEmploye.query.filter_by(employe_id=employe_id).all()
+    # La couleur de l'employé vient de la jointure : un employé inconnu ne renvoie aucun événement
     events = []
-    for p in presences:
-        events.append({
-            'title': 'Présent',
-            'start': p.date.strftime('%Y-%m-%d'),
-            'end': p.date.strftime('%Y-%m-%d'),
-            'color': employe.couleur or '#48c774',
-            'allDay': True
-        })
-    for c in conges:
-        events.append({
-            'title': c.motif or 'Congé',
-            'start': c.date_debut.strftime('%Y-%m-%d'),
-            'end': (c.date_fin + timedelta(days=1)).strftime('%Y-%m-%d'),
-            'color': '#f14668',
-            'allDay': True
-        })
+    for p, _, couleur in periodes_avec_employe(PresenceEmploye, employe_id):
+        events.append(evenement_periode(p.date_debut, p.date_fin, 'Présent', couleur or '#48c774'))
+    for c, _, _ in periodes_avec_employe(CongeEmploye, employe_id):
+        events.append(evenement_periode(c.date_debut, c.date_fin, c.motif or 'Congé', '#f14668'))
     return jsonify(events)
 
 @app.route('/planning-employe', endpoint='planning_employe')
 def planning_employe():
-    # Récupérer tous les employés
-    employes = Employe.query.all()
-    # Récupérer toutes les présences
-    presences = PresenceEmploye.query.filter_by(present=True).all()
-    # Récupérer tous les congés
-    conges = CongeEmploye.query.all()
+    # Les événements sont chargés par FullCalendar via api_planning_employe_events
+    return render_template('planning_employe.html')
 
+@app.route('/api/planning_employe/events')
+def api_planning_employe_events():
+    """Flux FullCalendar des présences et congés de tous les employés, limité à la plage start/end"""
     events = []
-    # Ajouter les présences (un jour = un event)
-    for presence in presences:
-        events.append({
-            'title': f"Présent - {presence.employe.nom}",
-            'start': presence.date.strftime('%Y-%m-%d'),
-            'end': presence.date.strftime('%Y-%m-%d'),
-            'color': presence.employe.couleur or '#7ed957',
-            'allDay': True,
-            'type': 'presence',
-            'employe': presence.employe.nom
-        })
+    # Ajouter les présences (période continue = event)
+    for presence, nom, couleur in periodes_avec_employe(PresenceEmploye):
+        events.append(evenement_periode(presence.date_debut, presence.date_fin, f"Présent - {nom}",
+                                        couleur or '#7ed957', type='presence', employe=nom))
     # Ajouter les congés (période = event)
-    for conge in conges:
-        events.append({
-            'title': f"Congé - {conge.employe.nom}",
-            'start': conge.date_debut.strftime('%Y-%m-%d'),
-            'end': (conge.date_fin + timedelta(days=1)).strftime('%Y-%m-%d'),  # FullCalendar exclut le dernier jour
-            'color': '#ff7675',
-            'allDay': True,
-            'type': 'conge',
-            'employe': conge.employe.nom
-        })
-    return render_template('planning_employe.html', events=events)
+    for conge, nom, _ in periodes_avec_employe(CongeEmploye):
+        events.append(evenement_periode(conge.date_debut, conge.date_fin, f"Congé - {nom}",
+                                        '#ff7675', type='conge', employe=nom))
+    return jsonify(events)
 
 @app.route('/planning/retouches')
 def planning_retouches_mensuel():
@@ -1091,69 +2425,88 @@ def planning_retouches_mensuel():
 
 @app.route('/api/retouche_events')
 def api_retouche_events():
-    # On récupère tous les tickets et leurs retouches associées
-    tous_les_tickets = Ticket.query.options(db.joinedload(Ticket.retouches).joinedload(Retouche.detail).joinedload(DetailRetouche.sous_categorie).joinedload(SousCategorie.categorie)).all()
-    # Regrouper par (date, client)
-    events_dict = {}  # (date, client_id) -> { 'client': nom, 'categories': set(), 'ticket_id': id, 'is_all_terminated': bool }
-    for ticket in tous_les_tickets:
-        if not ticket.retouches or not ticket.date_echeance:
-            continue
-        client = ticket.client
-        date = ticket.date_echeance
-        key = (date, client.id)
-        if key not in events_dict:
-            events_dict[key] = {
-                'client': client.nom,
-                'categories_count': {},  # nom_categorie -> quantité
-                'ticket_id': ticket.id,
-                'is_all_terminated': True
-            }
-        # Compter les quantités par catégorie
-        for r in ticket.retouches:
-            if r.detail and r.detail.sous_categorie and r.detail.sous_categorie.categorie:
-                cat_nom = r.detail.sous_categorie.categorie.nom
-                events_dict[key]['categories_count'][cat_nom] = events_dict[key]['categories_count'].get(cat_nom, 0) + 1
-        
-        # Vérifier si toutes les retouches du ticket sont terminées
-        events_dict[key]['is_all_terminated'] = all(r.statut == 'Terminée' for r in ticket.retouches)
+    """
+    Flux FullCalendar des retouches, limité à la plage visible (paramètres start/end).
+    Lu depuis le résumé ChargeJournaliere : un événement par (date, client).
+    Avec ?updated_since=<curseur>, seuls les jours modifiés depuis le curseur sont renvoyés.
+    """
+    debut, fin = plage_calendrier()
+    updated_since = request.args.get('updated_since')
+    # Petit recouvrement pour ne pas rater une transaction validée pendant la requête
+    curseur = datetime.utcnow() - timedelta(seconds=5)
+
+    requete = db.session.query(ChargeJournaliere, Client.nom).join(
+        Client, ChargeJournaliere.client_id == Client.id)
+    if debut:
+        requete = requete.filter(ChargeJournaliere.date >= debut)
+    if fin:
+        requete = requete.filter(ChargeJournaliere.date < fin)
+
+    jours_modifies = None
+    if updated_since:
+        try:
+            depuis = datetime.fromisoformat(updated_since)
+        except ValueError:
+            return jsonify({'success': False, 'message': 'Curseur invalide.'}), 400
+        jours_modifies = sorted({jour for (jour,) in requete.with_entities(ChargeJournaliere.date).filter(
+            ChargeJournaliere.date_modification > depuis).distinct()})
+        requete = requete.filter(ChargeJournaliere.date.in_(jours_modifies))
+
+    lignes = requete.filter(ChargeJournaliere.nb_retouches > 0).order_by(
+        ChargeJournaliere.date, ChargeJournaliere.client_id).all()
 
     # Générer la liste d'événements pour FullCalendar
+    categories = categories_par_prestation()
     events = []
-    from datetime import date
     aujourd_hui = date.today()
-    
-    for (date_echeance, _), data in events_dict.items():
+
+    for charge, client_nom in lignes:
+        # Quantités par catégorie, déduites des quantités par prestation
+        categories_count = Counter()
+        for detail_id, quantite in charge.quantites_prestations().items():
+            if detail_id in categories:
+                categories_count[categories[detail_id]] += quantite
+
         # Format : 1 Pantalon, 2 Jupes, etc. sur des lignes séparées
-        summary_lines = [f"{q} {cat}" for cat, q in data['categories_count'].items()]
-        
+        summary_lines = [f"{q} {cat}" for cat, q in sorted(categories_count.items())]
+
         # Définir la classe CSS en fonction du statut et de la date
-        if data['is_all_terminated']:
+        if charge.nb_en_cours == 0:
             className = 'tache-terminee'
-        elif date_echeance < aujourd_hui and not data['is_all_terminated']:
+        elif charge.date < aujourd_hui:
             className = 'tache-depassee'
         else:
             className = 'tache-a-faire'
-        
+
         # Créer le titre avec le nom du client et la liste des catégories
         if summary_lines:
             # Formater les catégories de manière plus lisible
             categories_text = "\n• " + "\n• ".join(summary_lines)
         else:
             categories_text = "\nAucune retouche"
-        title_with_categories = f"{data['client']}{categories_text}"
-        
+        title_with_categories = f"{client_nom}{categories_text}"
+
         events.append({
             'title': title_with_categories,
-            'start': date_echeance.strftime('%Y-%m-%d'),
-            'url': url_for('modifier_ticket', ticket_id=data['ticket_id']),
+            'start': charge.date.strftime('%Y-%m-%d'),
+            'url': url_for('modifier_ticket', ticket_id=charge.ticket_id),
             'className': className,
             'extendedProps': {
                 'summary': summary_lines,
-                'ticket_id': data['ticket_id'],
-                'client_name': data['client']
+                'ticket_id': charge.ticket_id,
+                'client_name': client_nom
             }
         })
-    return jsonify(events)
+
+    if jours_modifies is not None:
+        return jsonify({
+            'curseur': curseur.isoformat(),
+            'jours': [jour.strftime('%Y-%m-%d') for jour in jours_modifies],
+            'events': events
+        })
+    response = jsonify(events)
+    response.headers['X-Curseur'] = curseur.isoformat()
+    return response
 
 # AJOUT : Nouvelle route API pour mettre à jour le statut d'un ticket
 @app.route('/api/ticket/<int:ticket_id>/update_status', methods=['POST'])
@@ -1180,7 +2533,7 @@ def api_update_ticket_status(ticket_id):
                     "Paula Couture\n"
                     "0479688584"
                 )
-                lien_sms = generer_lien_sms(ticket.client.numero_telephone, message_body)
+                lien_sms = generer_lien_sms(ticket.client.telephone_normalise, message_body)
                 print(f"Lien SMS généré pour {ticket.client.nom}: {lien_sms}")
 
 
@@ -1217,23 +2570,66 @@ def api_update_ticket_status_simple(ticket_id):
     flash(f'Le statut du ticket {ticket.id} a été mis à jour vers "{nouveau_statut}".', 'success')
     return redirect(request.referrer or url_for('planning_retouches_mensuel'))
 
+@app.route('/api/planning/couverture')
+def api_planning_couverture():
+    """Conflits et créneaux d'accueil non couverts entre start et end (dates incluses).
+    Sans paramètres : la semaine en cours, du mardi au samedi."""
+    aujourd_hui = date.today()
+    mardi = aujourd_hui - timedelta(days=(aujourd_hui.weekday() - 1) % 7)
+    debut = lire_date_iso(request.args.get('start')) or mardi
+    fin = lire_date_iso(request.args.get('end')) or debut + timedelta(days=4)
+    if fin < debut:
+        return jsonify({'success': False, 'message': 'La date de fin précède la date de début.'}), 400
+    if (fin - debut).days > 366:
+        return jsonify({'success': False, 'message': 'Plage limitée à un an.'}), 400
+    analyse = analyser_couverture(debut, fin)
+    return jsonify({
+        'conflits': [dict(conflit, debut=conflit['debut'].isoformat(), fin=conflit['fin'].isoformat())
+                     for conflit in analyse['conflits']],
+        'non_couverts': [{'debut': d.isoformat(), 'fin': f.isoformat()} for d, f in analyse['non_couverts']],
+    })
+
+@app.route('/api/planning/disponibles')
+def api_planning_disponibles():
+    """Employés disponibles à un instant (?moment=2025-10-14T10:30, maintenant par défaut)"""
+    try:
+        moment = datetime.fromisoformat(request.args['moment']) if request.args.get('moment') else datetime.now()
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Moment invalide.'}), 400
+    moment = moment.replace(tzinfo=None)
+    ids = charger_couverture(moment.date(), moment.date()).disponibles(moment)
+    employes = Employe.query.filter(Employe.id.in_(ids)).order_by(Employe.nom).all() if ids else []
+    return jsonify({
+        'moment': moment.isoformat(),
+        'employes': [{'id': e.id, 'nom': e.nom, 'couleur': e.couleur} for e in employes],
+    })
+
 @app.route('/api/shifts_events')
 def api_shifts_events():
-    shifts = PlanningShift.query.all()
+    """Flux FullCalendar des shifts de l'accueil, limité à la plage start/end : shifts ponctuels
+    et occurrences des modèles récurrents, avec la couleur de l'employé (jointure, sans lecture par shift)."""
+    debut, fin = plage_shifts()
     events = []
-    for shift in shifts:
-        employe = Employe.query.get(shift.employe_id)
-        events.append({
-            'title': shift.tache or 'Événement',
-            'start': f"{shift.date}T{shift.heure_debut}",
-            'end': f"{shift.date}T{shift.heure_fin}",
-            'color': employe.couleur if employe and employe.couleur else '#a18aff'
-        })
+    for occurrence in occurrences_shifts(debut, fin):
+        event = {
+            'title': occurrence.tache or 'Événement',
+            'start': f"{occurrence.date}T{occurrence.heure_debut}",
+            'end': f"{occurrence.date}T{occurrence.heure_fin}",
+            'color': occurrence.couleur or '#a18aff',
+        }
+        if occurrence.shift_id:
+            event['shift_id'] = occurrence.shift_id
+        else:
+            # Occurrence d'un modèle récurrent : modifiable ou supprimable pour ce jour seulement
+            event['modele_id'] = occurrence.modele_id
+            event['date'] = occurrence.date.isoformat()
+        events.append(event)
     return jsonify(events)
 
 @app.route('/retouche/<int:id>/supprimer', methods=['POST'])
 def supprimer_retouche(id):
     retouche = Retouche.query.get_or_404(id)
+    annuler_retouche(retouche)
     db.session.delete(retouche)
     db.session.commit()
     flash('La retouche a bien été supprimée.', 'success')
@@ -1270,6 +2666,56 @@ def supprimer_shift(shift_id):
     flash('Événement supprimé avec succès.', 'success')
     return redirect(url_for('index'))
 
+def occurrence_ou_404(modele_id, jour_str):
+    """Modèle et jour d'une occurrence existante, sinon 404"""
+    modele = ModeleShift.query.get_or_404(modele_id)
+    jour = lire_date_iso(jour_str)
+    if not jour or not modele.a_lieu_le(jour):
+        abort(404)
+    return modele, jour
+
+# Modifier une seule occurrence d'un shift récurrent : elle devient un shift ponctuel
+@app.route('/shift/modele/<int:modele_id>/<jour>/modifier', methods=['GET', 'POST'])
+def modifier_occurrence_shift(modele_id, jour):
+    modele, jour = occurrence_ou_404(modele_id, jour)
+    if request.method == 'POST':
+        from datetime import datetime, time
+        exclure_occurrence(modele.id, jour)
+        db.session.add(PlanningShift(
+            employe_id=modele.employe_id,
+            date=datetime.strptime(request.form.get('date'), '%Y-%m-%d').date() if request.form.get('date') else jour,
+            heure_debut=time.fromisoformat(request.form.get('heure_debut')) if request.form.get('heure_debut') else modele.heure_debut,
+            heure_fin=time.fromisoformat(request.form.get('heure_fin')) if request.form.get('heure_fin') else modele.heure_fin,
+            tache=request.form.get('tache')
+        ))
+        db.session.commit()
+        flash('Événement modifié pour ce jour.', 'success')
+        return redirect(url_for('index'))
+    occurrence = OccurrenceShift(None, modele.id, modele.employe_id, jour, modele.heure_debut,
+                                 modele.heure_fin, modele.tache, None)
+    return render_template('modifier_shift.html', shift=occurrence)
+
+# Supprimer une seule occurrence d'un shift récurrent
+@app.route('/shift/modele/<int:modele_id>/<jour>/supprimer', methods=['POST'])
+def supprimer_occurrence_shift(modele_id, jour):
+    modele, jour = occurrence_ou_404(modele_id, jour)
+    exclure_occurrence(modele.id, jour)
+    db.session.commit()
+    flash('Événement supprimé pour ce jour.', 'success')
+    return redirect(url_for('index'))
+
+# Arrêter un shift récurrent à partir d'une occurrence (les précédentes sont conservées)
+@app.route('/shift/modele/<int:modele_id>/<jour>/arreter', methods=['POST'])
+def arreter_modele_shift(modele_id, jour):
+    modele, jour = occurrence_ou_404(modele_id, jour)
+    if jour <= modele.date_debut:
+        db.session.delete(modele)
+    else:
+        modele.date_fin = jour - timedelta(days=1)
+    db.session.commit()
+    flash('Répétition arrêtée.', 'success')
+    return redirect(url_for('index'))
+
 # --- API pour modifier le prix d'une prestation ---
 @app.route('/api/prestation/update_price', methods=['POST'])
 def update_prestation_price():
@@ -1309,8 +2755,14 @@ def modifier_presence_conge():
             evt = PresenceEmploye.query.get(int(event_id))
             if not evt:
                 return jsonify({'success': False, 'error': 'Présence introuvable.'})
-            evt.date = datetime.strptime(date_debut, '%Y-%m-%d').date()
-            evt.employe_id = int(employe_id)
+            nouveau_debut = datetime.strptime(date_debut, '%Y-%m-%d').date()
+            nouvelle_fin = datetime.strptime(date_fin, '%Y-%m-%d').date() if date_fin else nouveau_debut
+            if nouvelle_fin < nouveau_debut:
+                return jsonify({'success': False, 'error': 'La date de fin précède la date de début.'})
+            # On retire l'ancienne période puis on réenregistre la nouvelle, fusionnée avec ses voisines
+            db.session.delete(evt)
+            db.session.flush()
+            ajouter_presence(int(employe_id), nouveau_debut, nouvelle_fin)
         db.session.commit()
         return jsonify({'success': True})
     except Exception as e:
@@ -1319,13 +2771,22 @@ def modifier_presence_conge():
 # Route pour supprimer une présence ou un congé
 @app.route('/presence_conge/supprimer', methods=['POST'])
 def supprimer_presence_conge():
-    employe_id = request.form.get('employe_id')
-    date_str = request.form.get('date')
+    donnees = request.get_json(silent=True) or request.form
+    event_id = donnees.get('event_id')
     from datetime import datetime
     try:
-        date_obj = datetime.strptime(date_str, '%Y-%m-%d').date()
-        # Suppression des présences
-        PresenceEmploye.query.filter_by(employe_id=employe_id, date=date_obj).delete()
+        if event_id:
+            # Suppression d'un événement entier du calendrier (période de présence ou congé)
+            modele = CongeEmploye if donnees.get('type') == 'conge' else PresenceEmploye
+            evt = modele.query.get(int(event_id))
+            if evt:
+                db.session.delete(evt)
+            db.session.commit()
+            return jsonify({'success': True})
+        employe_id = int(donnees.get('employe_id'))
+        date_obj = datetime.strptime(donnees.get('date'), '%Y-%m-%d').date()
+        # Suppression de la présence ce jour-là : la période qui le contient est coupée en deux
+        retirer_presences(employe_id, date_obj, date_obj)
         # Suppression des congés
         CongeEmploye.query.filter_by(employe_id=employe_id, date_debut=date_obj, date_fin=date_obj).delete()
         db.session.commit()
@@ -1340,10 +2801,6 @@ def detail_ticket(ticket_id):
     ticket = Ticket.query.get_or_404(ticket_id)
     client = ticket.client
     retouches = ticket.retouches
-    total_ht = sum(r.prix or 0.0 for r in retouches)
-    tva_rate = app.config.get('TVA_RATE', 0.2)
-    montant_tva = total_ht * tva_rate
-    total_ttc = total_ht + montant_tva
     now = datetime.now()
     now_fr = now.strftime('%A %d %B %Y')
     return render_template(
@@ -1351,10 +2808,10 @@ def detail_ticket(ticket_id):
         ticket=ticket,
         client=client,
         retouches=retouches,
-        total_ht=total_ht,
-        montant_tva=montant_tva,
-        total_ttc=total_ttc,
-        tva_rate=tva_rate,
+        total_ht=ticket.total_ht,
+        montant_tva=ticket.montant_tva,
+        total_ttc=ticket.total_ttc,
+        tva_rate=ticket.taux_tva,
         now=now,
         now_fr=now_fr
     )
@@ -1363,7 +2820,7 @@ def detail_ticket(ticket_id):
 @app.route('/ticket/<int:ticket_id>/modifier', methods=['GET', 'POST'])
 def modifier_ticket(ticket_id):
     ticket = Ticket.query.get_or_404(ticket_id)
-    categories = Categorie.query.all()
+    categories = charger_catalogue()['categories']
     if request.method == 'POST':
         # Mise à jour du statut payé du ticket
         paye_checkbox = request.form.get('paye')
@@ -1393,24 +2850,21 @@ def reimprimer_ticket(ticket_id):
     ticket = Ticket.query.get_or_404(ticket_id)
     retouches = ticket.retouches
     client = ticket.client
-    total_ht = sum(r.prix or 0.0 for r in retouches)
-    tva_rate = app.config.get('TVA_RATE', 0.2)
-    montant_tva = total_ht * tva_rate
-    total_ttc = total_ht + montant_tva
     return render_template('ticket.html', 
                            ticket=ticket,
                            client=client,
                            retouches=retouches,
-                           total_ht=total_ht,
-                           montant_tva=montant_tva,
-                           total_ttc=total_ttc,
-                           tva_rate=tva_rate,
+                           total_ht=ticket.total_ht,
+                           montant_tva=ticket.montant_tva,
+                           total_ttc=ticket.total_ttc,
+                           tva_rate=ticket.taux_tva,
                            numero_ticket=ticket.id,
                            now=datetime.now())
 
 @app.route('/ticket/<int:ticket_id>/supprimer', methods=['POST'])
 def supprimer_ticket(ticket_id):
     ticket = Ticket.query.get_or_404(ticket_id)
+    annuler_vente(ticket.id)
     db.session.delete(ticket)
     db.session.commit()
     flash('Le ticket et toutes ses retouches ont été supprimés.', 'success')
@@ -1434,8 +2888,8 @@ def envoyer_sms(ticket_id):
     )
     
     # Générer plusieurs formats de liens pour compatibilité
-    liens_sms = generer_liens_sms_multiples(ticket.client.numero_telephone, message_body)
-    lien_sms_principal = generer_lien_sms(ticket.client.numero_telephone, message_body)
+    liens_sms = generer_liens_sms_multiples(ticket.client.telephone_normalise, message_body)
+    lien_sms_principal = generer_lien_sms(ticket.client.telephone_normalise, message_body)
     
     return render_template('sms_client.html', 
                          ticket=ticket, 
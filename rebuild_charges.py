@@ -0,0 +1,10 @@
+from mon_atelier import app, db
+from mon_atelier.routes import reconstruire_charges
+
+# Script de reconstruction du résumé du calendrier des retouches (table charge_journaliere).
+# Réparation uniquement : la migration remplit la table et l'application la tient à jour.
+if __name__ == '__main__':
+    with app.app_context():
+        print("Reconstruction de la table charge_journaliere...")
+        nb_lignes = reconstruire_charges()
+        print(f"✅ {nb_lignes} lignes (date, client) recalculées.")
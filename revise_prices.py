@@ -0,0 +1,47 @@
+import argparse
+from mon_atelier import app, db
+from mon_atelier.routes import Categorie, reviser_prix
+
+# Révision groupée des prix du catalogue : pourcentage (et/ou montant fixe) par catégorie,
+# appliqué en une requête UPDATE par catégorie. Chaque révision porte un nom et ne peut être appliquée qu'une fois.
+#
+# Usage :
+#   python revise_prices.py hausse-2027 --pourcentage 3 --simulation
+#   python revise_prices.py hausse-2027 --pourcentage 3 --categorie Robes --categorie Pantalons
+#   python revise_prices.py robes-2027 --pourcentage 5 --ajout 0.50 --categorie Robes
+
+def afficher_resume(resume, noms):
+    for categorie_id, (nb, avant, apres) in sorted(resume.items(), key=lambda r: noms[r[0]]):
+        print(f"- {noms[categorie_id]} : {nb} prestation(s), total {avant:.2f} € -> {float(apres):.2f} €")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Révise les prix des prestations par catégorie.")
+    parser.add_argument('nom', help="nom unique de la révision (ex : hausse-2027)")
+    parser.add_argument('--pourcentage', type=float, default=0.0, help="variation en %% (ex : 3 ou -10)")
+    parser.add_argument('--ajout', type=float, default=0.0, help="montant ajouté après le pourcentage (ex : 0.50)")
+    parser.add_argument('--categorie', action='append', help="catégorie concernée (toutes par défaut), répétable")
+    parser.add_argument('--simulation', action='store_true', help="affiche l'effet sans rien écrire")
+    arguments = parser.parse_args()
+
+    with app.app_context():
+        categories = Categorie.query.all()
+        if arguments.categorie:
+            categories = [c for c in categories if c.nom in arguments.categorie]
+            inconnues = set(arguments.categorie) - {c.nom for c in categories}
+            if inconnues:
+                raise SystemExit(f"Catégorie(s) inconnue(s) : {', '.join(sorted(inconnues))}")
+        noms = {c.id: c.nom for c in categories}
+        coefficient = 1 + arguments.pourcentage / 100
+        description = f"{arguments.pourcentage:+g} %" + (f" {arguments.ajout:+.2f} €" if arguments.ajout else "")
+        try:
+            resume = reviser_prix(arguments.nom, {c.id: coefficient for c in categories}, arguments.ajout,
+                                  description, simulation=arguments.simulation)
+        except ValueError as erreur:
+            raise SystemExit(f"❌ {erreur}")
+        afficher_resume(resume, noms)
+        if arguments.simulation:
+            print(f"Simulation ({description}) : rien n'a été écrit.")
+        else:
+            db.session.commit()
+            print(f"✅ Révision « {arguments.nom} » appliquée ({description}) "
+                  f"à {sum(r[0] for r in resume.values())} prestation(s).")